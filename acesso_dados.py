@@ -0,0 +1,307 @@
+import io
+import os
+from functools import lru_cache
+import pandas as pd
+import geopandas as gpd
+import shapely
+from tabela_classes import taxonomia_de_nomes, categorias_taxonomia
+from instrumentacao import log
+
+# Variáveis de ambiente de cada banco: (host, nome do banco, senha)
+BANCOS = {"anotacoes_sr": ("ANOTACOES_SR_DB_HOST", "ANOTACOES_SR_DB_NAME", "ANOTACOES_SR_DB_PASSWORD"),
+          "gisdb": ("GISREP_GISDB_HOST", "GISDB_NAME", "GISDB_GISREP_PASSWORD"),
+          "gisrep": ("GISREP_GISDB_HOST", "GISREP", "GISDB_GISREP_PASSWORD")}
+
+# Tabela de talhões a valorar e colunas lidas por padrão (a geometria é sempre lida)
+TABELA_AREAS = '"remote_sensing"."fields_valuation"'
+COLUNAS_AREAS = ["id", "interest_area_id"]
+
+# Número de linhas trazidas do servidor por lote
+TAMANHO_LOTE = 50000
+
+
+
+##### Conexões
+
+# Engine (com pool de conexões) de um banco, criada uma única vez por processo
+def engine(banco="anotacoes_sr"):
+    """
+    banco: nome do banco em BANCOS (anotacoes_sr, gisdb, gisrep)
+    """
+
+    # As conexões do pool não podem ser herdadas por processos filhos, por isso a chave inclui o pid
+    return _engine(banco, os.getpid())
+
+
+
+@lru_cache(maxsize=None)
+def _engine(banco, pid):
+    # sqlalchemy e dotenv importados só na primeira conexão (processos que não acessam o banco não pagam a importação)
+    from sqlalchemy import create_engine
+    from dotenv import load_dotenv
+
+    load_dotenv(".env")
+    host, nome, senha = (os.environ.get(variavel) for variavel in BANCOS[banco])
+    usuario = os.environ.get("USER")
+    porta = os.environ.get("PORT")
+
+    return create_engine(f'postgresql://{usuario}:{senha}@{host}:{porta}/{nome}',
+                         pool_size=2, max_overflow=2, pool_pre_ping=True)
+
+
+
+##### Leitura das áreas de interesse
+
+# Monta a cláusula WHERE com os filtros por área de interesse e por retângulo envolvente
+def _filtros(ids=None, bbox=None):
+    condicoes = []
+    parametros = {}
+
+    if ids is not None:
+        condicoes.append('"interest_area_id" = ANY(:ids)')
+        parametros["ids"] = pd.Series(list(ids)).tolist()
+
+    if bbox is not None:
+        condicoes.append('"geom" && ST_MakeEnvelope(:xmin, :ymin, :xmax, :ymax, 4326)')
+        parametros.update(zip(("xmin", "ymin", "xmax", "ymax"), (float(valor) for valor in bbox)))
+
+    where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+    return where, parametros
+
+
+
+# Colunas lidas: interest_area_id sempre entra, pois os lotes são cortados por área
+def _colunas(colunas=None):
+    if colunas is None:
+        return COLUNAS_AREAS
+    return list(dict.fromkeys(["interest_area_id"] + list(colunas)))
+
+
+
+# Converte um lote lido do banco (geometria em WKB) em GeoDataFrame
+def _lote_para_gdf(lote):
+    geometrias = shapely.from_wkb([None if wkb is None else bytes(wkb) for wkb in lote["geom"]])
+    return gpd.GeoDataFrame(lote.drop(columns=["geom"]), geometry=geometrias, crs="EPSG:4326")
+
+
+
+def le_areas_lotes(colunas=None, ids=None, bbox=None, tamanho_lote=TAMANHO_LOTE, banco="anotacoes_sr"):
+    """
+    colunas: colunas da tabela de talhões a ler além da geometria (lista, padrão COLUNAS_AREAS)
+    ids (opcional): interest_area_id das áreas a ler (lista)
+    bbox (opcional): retângulo envolvente (xmin, ymin, xmax, ymax) em EPSG:4326
+    tamanho_lote: número de linhas trazidas do servidor por vez (int)
+    banco: nome do banco em BANCOS
+    Gera GeoDataFrames com áreas de interesse completas (os talhões de uma área nunca ficam em lotes diferentes)
+    """
+
+    from sqlalchemy import text
+
+    colunas = _colunas(colunas)
+    where, parametros = _filtros(ids=ids, bbox=bbox)
+    consulta = text(f"""
+                    SELECT {', '.join(f'"{coluna}"' for coluna in colunas)}, ST_AsBinary("geom") AS "geom"
+                    FROM {TABELA_AREAS}
+                    {where}
+                    ORDER BY "interest_area_id"
+                    """)
+
+    # Cursor do lado do servidor: só tamanho_lote linhas ficam em memória de cada vez
+    with engine(banco).connect().execution_options(stream_results=True, max_row_buffer=tamanho_lote) as conn:
+        resto = None
+        for lote in pd.read_sql(consulta, conn, params=parametros, chunksize=tamanho_lote):
+            # Uma consulta sem nenhuma linha gera um único lote vazio
+            if len(lote) == 0:
+                continue
+            lote = _lote_para_gdf(lote)
+            if resto is not None:
+                lote = pd.concat([resto, lote], ignore_index=True)
+
+            # A última área do lote pode continuar no próximo: fica guardada até ele chegar
+            ultima = lote["interest_area_id"].values[-1]
+            completas = (lote["interest_area_id"] != ultima).values
+            resto = lote[~completas]
+            if completas.any():
+                yield lote[completas].reset_index(drop=True)
+
+        if resto is not None and len(resto) > 0:
+            yield resto.reset_index(drop=True)
+
+
+
+def le_areas(colunas=None, ids=None, bbox=None, tamanho_lote=TAMANHO_LOTE, banco="anotacoes_sr"):
+    """
+    Mesmos parâmetros de le_areas_lotes
+    Retorna um único GeoDataFrame com todas as áreas lidas
+    """
+
+    lotes = list(le_areas_lotes(colunas=colunas, ids=ids, bbox=bbox, tamanho_lote=tamanho_lote, banco=banco))
+    if not lotes:
+        return gpd.GeoDataFrame(columns=_colunas(colunas) + ["geometry"], geometry="geometry", crs="EPSG:4326")
+
+    return pd.concat(lotes, ignore_index=True)
+
+
+
+##### Escrita das valorações no banco
+
+# Colunas de valoração devolvidas ao banco
+COLUNAS_VALORACAO = ["class", "irrigation", "paved_road", "classes_possiveis"]
+
+# Tabela temporária que recebe o COPY de cada lote
+TABELA_TEMPORARIA = "_valoracoes_lote"
+
+# Valores das valorações que não vão para fields_valuation (talhões que não puderam ser valorados ou sem dado no raster)
+VALORES_NULOS = ["ERRO_MODA", "GEOM_INVÁLIDA", "NODATA", "NULL"]
+
+
+
+# Cria a tabela de staging (uma linha por talhão e fonte) caso ela ainda não exista
+def cria_tabela_staging(tabela_staging, colunas=COLUNAS_VALORACAO, banco="anotacoes_sr"):
+    """
+    tabela_staging: nome qualificado da tabela (ex.: '"remote_sensing"."fields_valuation_staging"')
+    colunas: colunas de valoração (lista)
+    banco: nome do banco em BANCOS
+    """
+
+    from sqlalchemy import text
+
+    definicao_colunas = ", ".join(f'"{coluna}" text' for coluna in colunas)
+    with engine(banco).begin() as conn:
+        # O id segue o tipo do id de fields_valuation
+        tipo_id = conn.execute(text(f"""
+                                    SELECT format_type(atttypid, atttypmod)
+                                    FROM pg_attribute
+                                    WHERE attrelid = '{TABELA_AREAS}'::regclass AND attname = 'id'
+                                    """)).scalar()
+        conn.execute(text(f"""
+                          CREATE TABLE IF NOT EXISTS {tabela_staging} (
+                              "id" {tipo_id} NOT NULL,
+                              "fonte" text NOT NULL,
+                              {definicao_colunas},
+                              "updated_at" timestamptz NOT NULL DEFAULT now(),
+                              PRIMARY KEY ("id", "fonte"))
+                          """))
+
+
+
+# Valores aceitos pelas colunas de fields_valuation que são enums (coluna -> lista de rótulos)
+def _rotulos_enum(conn, colunas):
+    from sqlalchemy import text
+
+    registros = conn.execute(text(f"""
+                                  SELECT a.attname, e.enumlabel
+                                  FROM pg_attribute AS a
+                                  JOIN pg_enum AS e ON e.enumtypid = a.atttypid
+                                  WHERE a.attrelid = '{TABELA_AREAS}'::regclass AND a.attname = ANY(:colunas)
+                                  ORDER BY a.attname, e.enumsortorder
+                                  """), {"colunas": list(colunas)}).fetchall()
+    rotulos = {}
+    for coluna, rotulo in registros:
+        rotulos.setdefault(coluna, []).append(rotulo)
+    return rotulos
+
+
+
+# Converte as valorações para os valores de fields_valuation
+def valores_fields_valuation(valoracoes, rotulos=None):
+    """
+    valoracoes: DataFrame com id e as colunas de valoração, com os nomes das classes das fontes
+    rotulos (opcional): dicionário coluna -> valores aceitos pela coluna (enums do banco); os demais valores viram nulos
+    Retorna uma cópia com class na taxonomia harmonizada (tabela_classes.py) e nulos no lugar de VALORES_NULOS
+    """
+
+    valoracoes = valoracoes.copy()
+    for coluna in valoracoes.columns.drop("id"):
+        valores = valoracoes[coluna].astype(object)
+        valores = valores.where(valores.notna() & ~valores.isin(VALORES_NULOS), None)
+
+        # Nomes das fontes (ex: "soja", "formação florestal") na classe harmonizada (ex: ANNUAL_CROPS, NATIVE_VEGETATION)
+        if coluna == "class":
+            valores = pd.Series(categorias_taxonomia(taxonomia_de_nomes(valores)), index=valores.index).astype(object)
+            valores = valores.where(valores.notna() & ~valores.isin(VALORES_NULOS), None)
+
+        if rotulos is not None and coluna in rotulos:
+            fora = valores.notna() & ~valores.isin(rotulos[coluna])
+            if fora.any():
+                log(f"{int(fora.sum())} valores de {coluna} fora do enum do banco gravados como NULL: {sorted(valores[fora].unique())}", "AVISO")
+            valores = valores.where(~fora, None)
+        valoracoes[coluna] = valores
+    return valoracoes
+
+
+
+# Comandos set-based que levam a tabela temporária para o destino
+def _sql_grava(tabela_destino, colunas, staging):
+    colunas_sql = ", ".join(f'"{coluna}"' for coluna in colunas)
+
+    if staging:
+        atualizacao = ", ".join(f'"{coluna}" = EXCLUDED."{coluna}"' for coluna in colunas)
+        return f"""
+                INSERT INTO {tabela_destino} ("id", "fonte", {colunas_sql})
+                SELECT "id", "fonte", {colunas_sql} FROM {TABELA_TEMPORARIA}
+                ON CONFLICT ("id", "fonte") DO UPDATE SET {atualizacao}, "updated_at" = now()
+                """
+
+    atualizacao = ", ".join(f'"{coluna}" = t."{coluna}"' for coluna in colunas)
+    return f"""
+            UPDATE {tabela_destino} AS d
+            SET {atualizacao}
+            FROM {TABELA_TEMPORARIA} AS t
+            WHERE d."id" = t."id"
+            """
+
+
+
+def grava_valoracoes(gdf_valorado, fonte=None, tabela_staging=None, colunas=COLUNAS_VALORACAO, tamanho_lote=TAMANHO_LOTE, banco="anotacoes_sr"):
+    """
+    gdf_valorado: (Geo)DataFrame com a coluna id e as colunas de valoração
+    fonte: fonte das valorações (string); obrigatória quando tabela_staging é informada
+    tabela_staging (opcional): tabela de staging que recebe as valorações como foram geradas (criada se não existir);
+                               sem ela, as colunas de fields_valuation são atualizadas com os valores de valores_fields_valuation
+    colunas: colunas de valoração gravadas (lista; em fields_valuation, todas precisam existir na tabela)
+    tamanho_lote: número de talhões por transação (int)
+    banco: nome do banco em BANCOS
+    Retorna o número de linhas gravadas no destino
+    """
+
+    from sqlalchemy import text
+
+    staging = tabela_staging is not None
+    if staging and fonte is None:
+        raise ValueError("A fonte é obrigatória para gravar na tabela de staging.")
+
+    tabela_destino = tabela_staging if staging else TABELA_AREAS
+    colunas_copia = ["id", "fonte"] + list(colunas) if staging else ["id"] + list(colunas)
+    if staging:
+        cria_tabela_staging(tabela_staging, colunas=colunas, banco=banco)
+
+    valoracoes = pd.DataFrame(gdf_valorado[["id"] + list(colunas)])
+    if staging:
+        valoracoes.insert(1, "fonte", fonte)
+    else:
+        with engine(banco).connect() as conn:
+            valoracoes = valores_fields_valuation(valoracoes, _rotulos_enum(conn, colunas))
+
+    total = 0
+    for inicio in range(0, len(valoracoes), tamanho_lote):
+        lote = valoracoes.iloc[inicio:inicio + tamanho_lote]
+
+        # Lote serializado em CSV (nulos como \N, para não confundir com texto vazio) e enviado de uma vez com COPY
+        buffer = io.StringIO()
+        lote.to_csv(buffer, index=False, header=False, na_rep="\\N")
+        buffer.seek(0)
+
+        # Cada lote é uma transação: tabela temporária, COPY e um único comando para o destino
+        with engine(banco).begin() as conn:
+            conn.execute(text(f"""
+                              CREATE TEMPORARY TABLE {TABELA_TEMPORARIA} ON COMMIT DROP AS
+                              SELECT {', '.join(f'"{coluna}"' for coluna in colunas_copia)}
+                              FROM {tabela_destino}
+                              WITH NO DATA
+                              """))
+            cursor = conn.connection.cursor()
+            cursor.copy_expert(f"""COPY {TABELA_TEMPORARIA} ({', '.join(f'"{coluna}"' for coluna in colunas_copia)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')""", buffer)
+            total += conn.execute(text(_sql_grava(tabela_destino, colunas, staging))).rowcount
+
+    return total
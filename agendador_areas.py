@@ -0,0 +1,103 @@
+import numpy as np
+
+###########################################################################
+# Ordem de processamento das áreas de interesse por localidade espacial
+# Áreas consecutivas ficam próximas no espaço (curva de Hilbert sobre os centróides), reaproveitando
+# os blocos de raster já decodificados no cache do GDAL e os tiles do cache de estradas
+
+ORDEM_HILBERT = 16          # resolução da curva: grade de 2^16 x 2^16 células sobre a extensão das áreas
+
+
+
+# Índice de Hilbert (vetorizado) de coordenadas inteiras x, y em uma grade 2^ordem x 2^ordem
+def indice_hilbert(x, y, ordem=ORDEM_HILBERT):
+    """
+    x, y: arrays de inteiros no intervalo [0, 2^ordem)
+    """
+
+    x = np.asarray(x, dtype=np.int64).copy()
+    y = np.asarray(y, dtype=np.int64).copy()
+    indice = np.zeros(x.shape, dtype=np.int64)
+    s = 1 << (ordem - 1)
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        indice += s * s * ((3 * rx) ^ ry)
+
+        # Rotaciona o quadrante
+        gira = ~ry
+        inverte = gira & rx
+        x = np.where(inverte, s - 1 - x, x)
+        y = np.where(inverte, s - 1 - y, y)
+        x, y = np.where(gira, y, x), np.where(gira, x, y)
+        s >>= 1
+    return indice
+
+
+
+# Ordem (posições) dos pontos ao longo da curva de Hilbert
+def ordem_hilbert(x, y, ordem=ORDEM_HILBERT):
+    """
+    x, y: arrays de coordenadas (qualquer SRC)
+    Retorna as posições que ordenam os pontos ao longo da curva
+    """
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if len(x) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    # Normaliza as coordenadas para a grade inteira da curva
+    lado = (1 << ordem) - 1
+    escala = max(x.max() - x.min(), y.max() - y.min()) or 1.0
+    xi = np.round((x - x.min()) / escala * lado).astype(np.int64)
+    yi = np.round((y - y.min()) / escala * lado).astype(np.int64)
+    return np.argsort(indice_hilbert(xi, yi, ordem), kind="stable")
+
+
+
+###########################################################################
+# Ids das áreas de interesse na ordem da curva de Hilbert dos seus centróides
+def ordena_areas(gdf_in, coluna_area="interest_area_id"):
+    """
+    gdf_in: GeoDataFrame com os talhões de todas as áreas
+    coluna_area: coluna que identifica a área de interesse (string)
+    Retorna lista com os ids das áreas
+    """
+
+    # Envelope de cada área em um único groupby (centro do envelope como centróide)
+    limites = gdf_in.geometry.bounds.groupby(gdf_in[coluna_area].values, sort=False).agg(
+        {"minx": "min", "miny": "min", "maxx": "max", "maxy": "max"})
+    centro_x = (limites["minx"] + limites["maxx"]).values / 2
+    centro_y = (limites["miny"] + limites["maxy"]).values / 2
+    return list(limites.index[ordem_hilbert(centro_x, centro_y)])
+
+
+
+# Percorre as áreas de interesse sem filtrar a tabela inteira a cada área
+def itera_areas(gdf_in, coluna_area="interest_area_id", ids=None):
+    """
+    gdf_in: GeoDataFrame com os talhões de todas as áreas
+    coluna_area: coluna que identifica a área de interesse (string)
+    ids (opcional): ids das áreas, na ordem desejada (padrão: ordena_areas)
+    Gera tuplas (id da área, GeoDataFrame da área com índice reiniciado)
+    """
+
+    # Posições dos talhões de cada área, de um único groupby
+    posicoes = gdf_in.groupby(coluna_area, sort=False).indices
+    if ids is None:
+        ids = ordena_areas(gdf_in, coluna_area)
+
+    for interest_area_id in ids:
+        yield interest_area_id, gdf_in.iloc[posicoes[interest_area_id]].reset_index(drop=True)
+
+
+
+# Divide a lista de ids em lotes consecutivos (áreas próximas no mesmo lote)
+def lotes_areas(ids, tamanho_lote):
+    """
+    ids: lista de ids, já ordenada (ex: ordena_areas)
+    tamanho_lote: número de áreas por lote (int)
+    """
+
+    return [ids[inicio:inicio + tamanho_lote] for inicio in range(0, len(ids), tamanho_lote)]
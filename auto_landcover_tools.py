@@ -1,537 +1,742 @@
-import warnings
-warnings.simplefilter(action='ignore')
-
-import geopandas as gpd
-import pandas as pd
-import osmnx as ox
-import rasterio as rio
-import numpy as np
-from rasterio.mask import mask
-import scipy.stats
-
-# Config específica para a lib osmnx
-ox.config(requests_kwargs={"verify":False})
-
-###########################################################################
-# Reprojeta os dados em graus para o CRS utm sirgas correspondente
-def grau_para_utm(entrada, **kwargs):
-    """
-    entrada: geodataframe, geoseries ou geometria que será convertida para utm (sirgas2000)
-    kwargs:
-        epsg_in: int com código epsg do sistema de referência de coordenadas do dado de entrada
-        (necessário para geometria)
-    """
-
-    # Kwargs
-    epsg_informado = False
-    epsg_in = None
-    for k, v in kwargs.items():
-        if k == "epsg_in":
-            epsg_informado = True
-            epsg_in = f"EPSG:{v}"
-
-    # Verifica se o CRS de entrada foi informado, caso contrário, obtém do próprio dado
-    if not epsg_informado and hasattr(entrada, 'crs'):
-        epsg_in = entrada.crs
-
-    # Identificando a classe de entrada
-    class_in = entrada.__class__.__name__
-
-    # Calcula o centróide da entrada para determinar o fuso UTM
-    if class_in in ['GeoDataFrame', 'GeoSeries']:
-        centroid_in = entrada.unary_union.centroid
-    else:
-        entrada = gpd.GeoSeries({0:entrada}).set_crs(epsg_in)
-        centroid_in = entrada.unary_union.centroid
-
-    # Carrega a grade UTM e converte para o CRS de entrada
-    gdf_grade = gpd.read_file("assets/zonas_utm_br.geojson").to_crs(epsg_in)
-
-    # Obtém o fuso UTM pelo centróide do conjunto de dados
-    grade_within = gdf_grade[gdf_grade.contains(centroid_in)].reset_index(drop=True)
-    epsg_out = grade_within.loc[0, "EPSG_S2000"]
-
-    # Converte o dado de entrada para o CRS UTM
-    saida = entrada.to_crs(epsg_out)
-
-    # Retorna a saída na mesma classe da entrada
-    if class_in == 'GeoDataFrame':
-        return saida
-    elif class_in == 'GeoSeries':
-        return saida
-    else:  # Se for uma instância de geometria
-        return saida.geometry.iloc[0]
-
-
-
-################################################################################
-# Função buffer para recortar e limitar área de processamento
-def gera_buffer(entrada, distancia_m, **kwargs):
-    """
-    gdf_in: gdf de entrada, com sistema de referência em utm (GeoDataFrame)
-    distancia_m: distancia em metros do buffer (int)
-    epsg_out (opcional): número epsg para a geometria de saída (int)
-    utm_in (opcional): booleano, informa se o dado de entrada está em utm
-    is_geometry (opcional) booleano, informa se o dado de entrada é uma geometria
-    """
-
-    # Kwargs
-    set_epsg_out = False
-    utm_in = False
-    is_geometry = False
-    for k, v in kwargs.items():
-        if k == "epsg_out":
-            set_epsg_out = True
-            epsg_out = v
-        if k == "is_utm":
-            utm_in = v
-        if k == "crs_in":
-            entrada_crs = v
-        if k == "is_geometry":
-            is_geometry = v
-
-    # Passando para utm se a entrada for em graus
-    if utm_in:
-        entrada_utm = entrada
-    
-    # Se for geometria, converte a geometria para utm
-    elif (is_geometry) and (not utm_in):
-        entrada = gpd.GeoSeries({0:entrada}).set_crs("EPSG:4326")
-        entrada_utm = grau_para_utm(entrada)
-        entrada_crs = entrada_utm.crs
-        entrada_utm = entrada_utm.iloc[0]
-    
-    else:
-        entrada_utm = grau_para_utm(entrada, epsg_in=4326)
-
-
-    # Se geodataframe
-    if isinstance(entrada_utm, gpd.GeoDataFrame):
-        # Dissolvendo geometrias no entrada_utm
-        try:
-            entrada_dissolve = entrada_utm.dissolve()
-        except:
-            # tenta achar a geometria inválida e a apaga do geodataframe
-            geometrias_invalidas = []
-            for idx, row in entrada_utm.iterrows():
-                if not row["geometry"].is_valid:
-                    geometrias_invalidas.append(idx)
-            if len(geometrias_invalidas) > 0:
-                entrada_utm = entrada_utm.drop(geometrias_invalidas)
-                entrada_dissolve = entrada_utm.dissolve()
-        buffer = entrada_dissolve.buffer(distancia_m)
-    
-    # Se geoseries
-    elif isinstance(entrada_utm, gpd.GeoSeries):
-        entrada_utm = grau_para_utm(entrada_utm)
-        try:
-            entrada_dissolve = entrada_utm.unary_union
-        except:
-            geometrias_invalidas = []
-            for idx, geom in enumerate(entrada_gs):
-                if not geom.is_valid:
-                    geometrias_invalidas.append(idx)
-            if len(geometrias_invalidas) > 0:
-                entrada_utm = entrada_utm.drop(geometrias_invalidas)
-                entrada_dissolve = entrada_utm.unary_union
-        buffer = entrada_dissolve.buffer(distancia_m)
-        buffer = gpd.GeoSeries({0:buffer}).set_crs(entrada_crs)
-    
-    # Se geometria
-    else:
-        entrada_gs = gpd.GeoSeries({0:entrada_utm}).set_crs(entrada_crs)
-        buffer = entrada_gs.buffer(distancia_m)
-    
-    # Conversão de coordenadas
-    if set_epsg_out:
-        buffer = buffer.to_crs(f"EPSG:{epsg_out}")
-
-    # Retorna uma geometria shapely
-    return buffer.iloc[0]
-        
-
-
-
-###############################################################################
-# Função para preenchimento dos atributos a partir dos arquivos vetoriais
-def preenche_atributos_vetorial(gdf_in, lista_gdf_fontes):
-    """"
-    gdf_in: GeoDataFrame de entrada
-    lista_gdf_fontes: Lista com GeoDataFrames das fontes de dados
-    """
-
-    print("Executando preenche_atributos_vetorial")
-
-    # Cópia do gdf de entrada
-    gdf_out = gdf_in.copy()
-
-    # # Define buffer de filtragem dos dados
-    # buffer_filtragem = gera_buffer(gdf_in, 10, epsg_out=4326)
-
-    # Itera sobre as fontes de dados
-    for fonte_filtrada in lista_gdf_fontes:
-        if len(fonte_filtrada) > 0:
-           # Aplica um filtro de classe (se já estiver preenchido, não tenta preencher)
-            for idx_talhao, talhao in gdf_in[gdf_in["class"] != None].iterrows():
-                # Se a geometria for inválida ele pula esse talhão, se for válida aplica um filtro intersects
-                if not talhao["geometry"].is_valid:
-                    continue
-                else:
-                    fonte_filtrada_talhao = fonte_filtrada[fonte_filtrada["geometry"].intersects(talhao["geometry"])]
-                # Se ainda tiver alguma feição após a filtragem, segue
-                if len(fonte_filtrada_talhao) > 0:
-                    for _, dado_fonte in fonte_filtrada_talhao.iterrows():
-                        dado_fonte_buffer = gera_buffer(dado_fonte["geometry"], 25, epsg_out=4326, is_geometry=True)
-                        # Se o talhão se encontrar "within" o buffer da fonte de dados, recebe a sua classificação
-                        if talhao["geometry"].within(dado_fonte_buffer):
-                            gdf_out.loc[idx_talhao, "class"] = dado_fonte["cultura"]                        # Preenche atributo do talhão
-        else:
-            print("Sem classificação")
-
-    # Gdf de saída
-    return gdf_out
-
-
-
-#################################################################################
-# Função para preenchimento dos atributos a partir do raster "MAPBIOMAS"
-def preenche_atributos_raster(gdf_in, lulc_raster_in_path=None, irrigation_raster_in_path=None, lulc_origem_dict="mapbiomas"):
-    """
-    gdf_in: geodataframe que será atualizado com os dados (GeoDataFrame)
-    lulc_raster_in_path: caminho para o arquivo raster de land use/ land cover (string)
-    irrigation_raster_in_path: caminho para o raster de irrigação do mapbiomas (string)
-    lulc_origem_dict: indica qual dicionário de dados será usado (mapbiomas ou agrosatélite)
-    """
-
-    def analise_raster(raster_in_path, gdf_out, dict_classes, column_name):
-        # Abre raster
-        raster = rio.open(raster_in_path)
-
-        # Reprojeta gdf para o SRC do raster
-        gdf_copy = gdf_out.copy()
-        gdf_copy["geometry"] = gdf_copy["geometry"]  # aplicando buffer mínimo para correção de imperfeições
-        gdf_copy = gdf_copy.to_crs(raster.crs)
-
-        # Itera sobre os talhões para clipar o raster e calcular a classe mais frequente
-        for idx_talhao, talhao in gdf_copy.iterrows():
-            if talhao[column_name] is None:          # Só executa se a classe do talhão já não tiver sido preenchida
-                clip_geom = talhao["geometry"]            # Polígono em formato geojson para clip
-                
-                # Se a geometria for inválida, tratar
-                if not clip_geom.is_valid:
-                    print("geometria inválida")
-                    gdf_out.loc[idx_talhao, column_name] = "GEOM_INVÁLIDA"
-                    continue
-                    
-                raster_out, _ = mask(raster, [clip_geom], crop=True, nodata=255, all_touched=True)             # Realiza o clip do raster de acordo com o geojson do talhão, e atribui 255 aos valores "nodata"
-                
-                # Calcula a moda do raster clipado, ignorando o valor "nodata"
-                moda = scipy.stats.mode(raster_out[(raster_out != 255) & (raster_out != -1)]).mode
-                
-                # Calcula os valores únicos do raster clipado
-                valores_unicos = np.unique(raster_out).tolist()
-                classes_possiveis_str = ""
-                for valor in valores_unicos:
-                    if len(classes_possiveis_str) == 0:
-                        if valor in dict_classes:
-                            classes_possiveis_str += dict_classes[valor]
-                    else:
-                        classes_possiveis_str += ", "
-                        classes_possiveis_str += dict_classes[valor]
-                gdf_out.loc[idx_talhao, "classes_possiveis"] = classes_possiveis_str
-
-                # Preenche o gdf de saída
-                if not np.isnan(moda):
-                    classe_raster = dict_classes[moda]        # Obtém a classe a partir da moda
-                    gdf_out.loc[idx_talhao, column_name] = classe_raster
-                else:
-                    print("Algo deu errado no cálculo da moda.")
-                    gdf_out.loc[idx_talhao, column_name] = "ERRO_MODA"
-
-        # Apaga arquivos da memória
-        del raster, gdf_copy
-
-        # Gdf de saída
-        return gdf_out
-
-    print("Executando preenche_atributos_raster")
-
-    # IRRIGAÇÃO
-    if irrigation_raster_in_path != None:
-        print("Irrigação")
-
-        # Dicionário de classes
-        irrigation_dict_classes = {0:"NO", 1:"YES", 2:"YES", 3:"YES", 255:"NODATA"}
-
-        # Análise raster e preenchimento
-        gdf_in = analise_raster(gdf_out=gdf_in, raster_in_path=irrigation_raster_in_path, dict_classes=irrigation_dict_classes, column_name="irrigation")
-
-    # LAND COVER
-    if lulc_raster_in_path != None:
-        print("Land use/ Land cover")
-
-        # Dicionário de classes
-        if lulc_origem_dict == "mapbiomas":
-            lulc_dict_classes = {1: 'floresta', 3: 'formação florestal', 4: 'formação savânica',
-                            5: 'mangue', 6: 'floresta alagável (beta)', 49: 'restinga arbórea',
-                            10: 'formação natural não florestal', 11: 'campo alagado e área pantanosa',
-                            12: 'formação campestre', 32: 'apicum', 29: 'afloramento rochoso', 50: 'restinga herbácea',
-                            13: 'outras formações não florestais', 14: 'agropecuária', 15: 'pastagem',
-                            18: 'agricultura', 19: 'lavoura temporária', 39: 'soja', 20: 'cana', 40: 'arroz',
-                            62: 'algodão (beta)', 41: 'outras lavouras temporárias', 36: 'lavoura perene',
-                            46: 'café', 47: 'citrus', 35: 'dendê (beta)', 48: 'outras lavouras perenes',
-                            9: 'silvicultura', 21: 'mosaico de usos', 22: 'área não vegetada', 23: 'praia, duna e areal',
-                            24: 'área urbanizada', 30: 'mineração', 25: 'outras áreas não vegetadas', 26: "corpo d'água",
-                            33: 'rio, lago e oceano', 31: 'aquicultura', 27: 'não observado', 255:'nodata'}
-        elif lulc_origem_dict == "agrosatelite":
-            lulc_dict_classes = {1:'soja', 2:'milho', 3:'algodão', 4:'cana', 5:'outras culturas temporárias',
-                            6:'culturas permanentes', 7:'pastagem', 8:'floresta nativa', 9:'vegetação natural não florestal',
-                            10:'silvicultura', 11:'outros (infraestrutura, água)', 12:'áreas ágricolas sem mapeamento da cultura', 255:'nodata'}
-        elif lulc_origem_dict == "simfaz":
-            lulc_dict_classes = {201:"soja", 202:"algodão", 203:"milho", 204:"arroz", 205:"cana", 206:"café", 207:"citrus", 208:"área urbana", 101:"água", 209:"pastagem", 210:"silvicultura", 221:"outros usos antrópicos", 102:"natural florestal", 103:"natural não florestal", 222:"outros usos", 255:'nodata'}
-        
-        # Análise do raster com preenchimento das informações
-        gdf_in = analise_raster(gdf_out=gdf_in, raster_in_path=lulc_raster_in_path, dict_classes=lulc_dict_classes, column_name="class")
-
-    # Gdf de saída
-    return gdf_in
-
-
-
-################################################################################
-# Localiza estradas pelo OpenStreetMap
-def busca_estradas(gdf_in, roads_in=None, is_wgs=True):
-    """
-    gdf_in: GeoDataFrame de entrada (que será preenchido)
-    is_wgs: indica se o(s) dado(s) de entrada está(ão) em wgs84 (booleano)
-    OBS: os dados de entrada precisam estar no mesmo sistema de referência de coordenadas
-    """
-
-    print("Executando busca_estradas")
-    
-    # Cópia do gdf para gerar buffer de cada talhão
-    gdf_copy = gdf_in.copy()
-
-    # Se a entrada estiver em grau, precisa reprojetar para gerar o buffer
-    if is_wgs:
-        gdf_copy = grau_para_utm(gdf_copy)    # Para gerar o buffer em metros precisa estar em utm
-    
-    # Gerando buffer de 10Km e reprojetando para wgs84 (src compatível com o osmnx)
-    geom_dissolve_buffer = gdf_copy.buffer(10000).to_crs("EPSG:4326").unary_union
-    geom_dissolve_fazenda = gdf_copy.buffer(45).to_crs("EPSG:4326").unary_union     # aplicando buffer para corrigir geometrias e ajudar com intersects de estradas próximas
-
-    # Se não for passado um geodataframe com os dados de estradas, vai procurar no OSM
-    if roads_in is None:       
-        # Verificando se a geometria resultante é válida
-        if not geom_dissolve_fazenda.is_valid:
-            print("A geometria corrigida ainda é inválida.")
-            gdf_in["paved_road"] = "NULL"
-        
-        else:
-            # Chamada api OSM
-            gdf_estradas_osm = ox.features_from_polygon(geom_dissolve_buffer, tags={"highway":True}).reset_index(drop=True)
-            
-            try:
-                # Filtragem de estradas com pavimentação
-                try:
-                    gdf_estradas_osm_filtrada = gdf_estradas_osm[["ref", "surface", "geometry"]]
-                    gdf_estradas_osm_filtrada = gdf_estradas_osm_filtrada[gdf_estradas_osm_filtrada["geometry"].geom_type != "Point"].reset_index(drop=True)
-                    gdf_estradas_osm_filtrada = gdf_estradas_osm_filtrada[((gdf_estradas_osm_filtrada["surface"].isin(["paved", "asphalt"])) | (gdf_estradas_osm_filtrada["ref"].str.contains("BR|AC|AL|AM|AP|BA|CE|DF|ES|GO|MA|MG|MS|MT|PA|PB|PE|PI|PR|RJ|RN|RO|RR|RS|SC|SE|SP|TO", case=False))) & (gdf_estradas_osm_filtrada["surface"] !="unpaved")]   # que não sejam "unpaved" |sc|SC|pr|PR|rs|RS|sp|SP|mt|MT|df|DF|ac|AC|rj|RJ|mg|MG
-                except Exception as e:
-                    print(f"Erro {e}. Tratando.")
-                    gdf_estradas_osm_filtrada = gdf_estradas_osm[["surface", "geometry"]]
-                    gdf_estradas_osm_filtrada = gdf_estradas_osm_filtrada[gdf_estradas_osm_filtrada["geometry"].geom_type != "Point"].reset_index(drop=True)
-                    gdf_estradas_osm_filtrada = gdf_estradas_osm_filtrada[gdf_estradas_osm_filtrada["surface"].isin(["paved", "asphalt"])]   # que não sejam "unpaved"
-            
-            except Exception as e:
-                print(f"Erro {e}. Tratando.")
-                gdf_estradas_osm_filtrada = gdf_estradas_osm
-
-            # Verifica se tem ao menos uma estrada pavimentada a 10Km do buffer dos talhões dissolvidos
-            if len(gdf_estradas_osm_filtrada) > 0:
-                # Dissolve das estradas
-                geom_estradas_dissolve = gdf_estradas_osm_filtrada.unary_union.intersection(geom_dissolve_buffer)
-
-                # Preenche a informação de todos os talhões conforme o relacionamento da união das geometrias com as estradas
-                if (geom_dissolve_fazenda.intersects(geom_estradas_dissolve)):     #  | (geom_dissolve_fazenda.touches(geom_estradas_dissolve)) | (geom_dissolve_fazenda.overlaps(geom_estradas_dissolve))
-                    gdf_in["paved_road"] = "TOUCH_ROAD"
-                    print("TOUCH_ROAD")
-                else:
-                    gdf_in["paved_road"] = "10KM_ROAD"
-                    print("10KM_ROAD")
-
-            # Se não houver nenhuma, preenche todas com "NO"
-            else:
-                gdf_in["paved_road"] = "NO"
-                print("NO")
-
-    # Se for passado um geodataframe com as estradas
-    else:
-        #### AINDA NÃO ESTÁ IMPLEMENTADO!!!!!!!!!!
-        if len(roads_in) > 0:
-            # Passa para utm se a entrada for wgs
-            if is_wgs:
-                roads_in = grau_para_utm(roads_in)
-            
-            # Geometrias para as operações
-            geom_dissolve_buffer = gdf_copy.buffer(10000).unary_union
-            geom_dissolve_fazenda = gdf_copy.unary_union
-            roads_in = roads_in[roads_in.intersects(geom_dissolve_fazenda)]
-
-            # Verificando os intersects
-            if len(roads_in) > 0:
-                if roads_in.intersects(geom_dissolve_fazenda).sum() > 0 | roads_in.touches(geom_dissolve_fazenda).sum() > 0 | roads_in.overlaps(geom_dissolve_fazenda).sum() > 0:
-                    gdf_in["paved_road"] = "TOUCH_ROAD"
-                    print("TOUCH_ROAD")
-                else:
-                    gdf_in["paved_road"] = "10KM_ROAD"
-                    print("10KM_ROAD")
-            else:
-                gdf_in["paved_road"] = "NO"
-                print("NO")
-        
-        else:
-            gdf_in["paved_road"] = "NO"
-
-    # Saída gdf preenchido
-    return gdf_in
-
-
-
-
-##############################################################
-# Imprime tabelas com os resultados por classe
-def analisa_resultados(analistas, mapbiomas, simfaz, agrosatelite):
-    """
-    Imprime na tela tabelas-resumo da taxa de acerto do algoritmo conforme a fonte de dados
-    Recebe quatro geodataframes, na ordem acima
-    """
-
-    print("\nExecutando analisa_resultados...\n")
-
-    # # Filtrar colunas de interesse
-    analistas = analistas[["id", "class", "irrigation", "paved_road"]]
-    mapbiomas = mapbiomas[["id", "class", "irrigation", "paved_road"]]
-    simfaz = simfaz[["id", "class", "irrigation", "paved_road"]]
-    agrosatelite = agrosatelite[["id", "class", "irrigation", "paved_road"]]
-
-    print("Contagem de classes do arquivo analistas")
-    print(analistas["class"].value_counts())
-    print()
-    print("Contagem de classes do arquivo mapbiomas:")
-    print(mapbiomas["class"].value_counts())
-    print()
-    print("Contagem de classes do arquivo simfaz:")
-    print(simfaz["class"].value_counts())
-    print()
-    print("Contagem de classes do arquivo agrosatélite:")
-    print(agrosatelite["class"].value_counts())
-    print()
-
-    # Join dos dados
-    join = analistas.join(mapbiomas, on="id", rsuffix="_mapbiomas",).join(simfaz, on="id", rsuffix="_simfaz").join(agrosatelite, on="id", rsuffix="_agrosatelite")
-    join = join.drop(columns=["id_mapbiomas", "id_simfaz", "id_agrosatelite"])
-
-    # Padronização de dados
-    dict_classes = {"DIRTY_PASTURE":"PASTURE",
-                    "CLEAN_PASTURE":"PASTURE",
-                    "WATER":"OTHER",
-                    "REGENERATION":"NATIVE_VEGETATION",
-                    "pastagem":"PASTURE",
-                    "formação florestal":"NATIVE_VEGETATION",
-                    "lavoura temporária":"ANNUAL_CROPS",
-                    "mosaico de usos":"PRIVATE_INFRASTRUCTURE",
-                    "formação savânica":"NATIVE_VEGETATION",
-                    "rio, lago e oceano": "OTHER",
-                    "silvicultura":"SILVICULTURE",
-                    "outras áreas não vegetadas":"PRIVATE_INFRASTRUCTURE",
-                    "formação campestre":"NATIVE_VEGETATION",
-                    "campo alagado e área pantanosa":"NATIVE_VEGETATION",
-                    "lavoura perene":"PERENNIAL_CROPS",
-                    "outros usos":"OTHER",
-                    "soja":"ANNUAL_CROPS",
-                    "natural florestal":"NATIVE_VEGETATION",
-                    "natural não florestal":"NATIVE_VEGETATION",
-                    "água":"OTHER",
-                    "cana":"SEMIPERENNIAL_CROPS",
-                    "milho":"ANNUAL_CROPS",
-                    "café":"PERENNIAL_CROPS",
-                    "algodão":"ANNUAL_CROPS",
-                    "outros usos antrópicos":"PRIVATE_INFRASTRUCTURE",
-                    "área urbana":"PRIVATE_INFRASTRUCTURE",
-                    "outros (infraestrutura, água)": "OTHER",
-                    "vegetação natural não florestal":"NATIVE_VEGETATION",
-                    "floresta nativa":"NATIVE_VEGETATION",
-                    "outras culturas temporárias":"ANNUAL_CROPS",
-                    "culturas permanentes":"PERENNIAL_CROPS",
-                    None:"NULL"
-                }
-
-    join = join.replace(dict_classes)
-
-    # # Print das classes de cada fonte, para conferir se a substituição foi feita corretamente
-    # print(join["class"].value_counts())
-    # print()
-    # print(join["class_mapbiomas"].value_counts())
-    # print()
-    # print(join["class_agrosatelite"].value_counts())
-    # print()
-    # print(join["class_simfaz"].value_counts())
-
-    # Comparar colunas
-    colunas_a_comparar = [('class_mapbiomas', 'class'),
-        ('irrigation_mapbiomas', 'irrigation'),
-        ('paved_road_mapbiomas', 'paved_road'),
-        ('class_simfaz', 'class'),
-        ('irrigation_simfaz', 'irrigation'),
-        ('paved_road_simfaz', 'paved_road'),
-        ('class_agrosatelite', 'class'),
-        ('irrigation_agrosatelite', 'irrigation'),
-        ('paved_road_agrosatelite', 'paved_road')]
-
-    resultados_class = {}
-    resultados_irrigation = {}
-    resultados_paved_road = {}
-    for col_pred, col_true in colunas_a_comparar:
-        matches = join[col_pred] == join[col_true]
-        precisao = matches.mean() * 100
-        absolute_matches = matches.sum()
-        if "class" in col_pred:
-            resultados_class[col_pred] = {'Taxa de acerto (porcentagem)': precisao, 'Número de acertos': absolute_matches}
-        elif "irrigation" in col_pred:
-            resultados_irrigation[col_pred] = {'Taxa de acerto (porcentagem)': precisao, 'Número de acertos': absolute_matches}
-        elif "paved_road" in col_pred:
-            resultados_paved_road[col_pred] = {'Taxa de acerto (porcentagem)': precisao, 'Número de acertos': absolute_matches}
-
-    # Converter o dict para dataframe para visualizar os resultados em tabela
-    resultados_class_df = pd.DataFrame(resultados_class).T
-    resultados_paved_road_df = pd.DataFrame(resultados_paved_road).T
-    resultados_irrigation_df = pd.DataFrame(resultados_irrigation).T
-    print("\nTaxa de acertos por raster landcover (em porcentagem)")
-    print("Classes:")
-    print(resultados_class_df)
-    print()
-    print("Rodovias:")
-    print(resultados_paved_road_df)
-    print()
-    print("Irrigação:")
-    print(resultados_irrigation_df)
-    print()
-
-    # Comparar por classes
-    taxa_acerto_por_classe = {}
-    for classe in join['class'].unique():
-        subset = join[join['class'] == classe]
-        for col_pred, col_true in colunas_a_comparar:
-            fonte = col_pred
-            matches = subset[col_pred] == subset[col_true]
-            precisao = matches.mean() * 100
-            absolute_matches = matches.sum()
-            if "class_" in fonte:
-                if classe not in taxa_acerto_por_classe:
-                    taxa_acerto_por_classe[classe] = {}
-                taxa_acerto_por_classe[classe][fonte] = precisao
-
-    print("\nTaxa de acertos por classe (em porcentagem)")
-    df_taxa_por_classe = pd.DataFrame(taxa_acerto_por_classe).T
-    print(df_taxa_por_classe)
\ No newline at end of file
+import warnings
+warnings.simplefilter(action='ignore')
+
+import traceback
+import geopandas as gpd
+import pandas as pd
+import rasterio as rio
+import numpy as np
+import shapely
+from rasterio.features import rasterize
+from rasterio.windows import Window
+from pool_rasters import abre_raster, le_janela
+from tabela_classes import DICT_CLASSES, nomes_classes, classes_possiveis
+from avaliacao import avalia_fontes, ATRIBUTOS
+from cache_histogramas import cache_ativo, impressao_raster, impressao_dicionario, chaves_histogramas, busca_histogramas, grava_histogramas
+from fusos_utm import epsg_utm_pontos, reprojeta
+from cache_estradas import estradas_do_cache, importa_osmnx, DIRETORIO_CACHE
+from indice_estradas import constroi_indice_estradas, carrega_indice_estradas, classifica_estradas
+from validacao_geometrias import tem_geometria
+from instrumentacao import log, etapa, conta
+
+###########################################################################
+# Reprojeta os dados em graus para o CRS utm sirgas correspondente
+def grau_para_utm(entrada, **kwargs):
+    """
+    entrada: geodataframe, geoseries ou geometria que será convertida para utm (sirgas2000)
+    kwargs:
+        epsg_in: int com código epsg do sistema de referência de coordenadas do dado de entrada
+        (necessário para geometria)
+    """
+
+    # Kwargs
+    epsg_informado = False
+    epsg_in = None
+    for k, v in kwargs.items():
+        if k == "epsg_in":
+            epsg_informado = True
+            epsg_in = f"EPSG:{v}"
+
+    # Verifica se o CRS de entrada foi informado, caso contrário, obtém do próprio dado
+    if not epsg_informado and hasattr(entrada, 'crs'):
+        epsg_in = entrada.crs
+
+    # Identificando a classe de entrada
+    class_in = entrada.__class__.__name__
+
+    # Calcula o centróide da entrada para determinar o fuso UTM
+    if class_in in ['GeoDataFrame', 'GeoSeries']:
+        centroid_in = entrada.unary_union.centroid
+    else:
+        entrada = gpd.GeoSeries({0:entrada}).set_crs(epsg_in)
+        centroid_in = entrada.unary_union.centroid
+
+    # Obtém o fuso UTM pelo centróide do conjunto de dados (sem reler a grade UTM a cada chamada)
+    epsg_out = int(epsg_utm_pontos([centroid_in], entrada.crs)[0])
+
+    # Converte o dado de entrada para o CRS UTM (com transformador pyproj em cache)
+    geometrias = gpd.GeoSeries(reprojeta(np.asarray(entrada.geometry.values), entrada.crs, epsg_out),
+                               index=entrada.index, crs=epsg_out, name=entrada.geometry.name)
+    if class_in == 'GeoDataFrame':
+        saida = entrada.copy()
+        saida[entrada.geometry.name] = geometrias
+    else:
+        saida = geometrias
+
+    # Retorna a saída na mesma classe da entrada
+    if class_in == 'GeoDataFrame':
+        return saida
+    elif class_in == 'GeoSeries':
+        return saida
+    else:  # Se for uma instância de geometria
+        return saida.geometry.iloc[0]
+
+
+
+################################################################################
+# Função buffer para recortar e limitar área de processamento
+def gera_buffer(entrada, distancia_m, **kwargs):
+    """
+    gdf_in: gdf de entrada, com sistema de referência em utm (GeoDataFrame)
+    distancia_m: distancia em metros do buffer (int)
+    epsg_out (opcional): número epsg para a geometria de saída (int)
+    utm_in (opcional): booleano, informa se o dado de entrada está em utm
+    is_geometry (opcional) booleano, informa se o dado de entrada é uma geometria
+    """
+
+    # Kwargs
+    set_epsg_out = False
+    utm_in = False
+    is_geometry = False
+    entrada_crs = None
+    for k, v in kwargs.items():
+        if k == "epsg_out":
+            set_epsg_out = True
+            epsg_out = v
+        if k == "is_utm":
+            utm_in = v
+        if k == "crs_in":
+            entrada_crs = v
+        if k == "is_geometry":
+            is_geometry = v
+
+    # Passando para utm se a entrada for em graus
+    if utm_in:
+        entrada_utm = entrada
+    
+    # Se for geometria, converte a geometria para utm
+    elif (is_geometry) and (not utm_in):
+        entrada = gpd.GeoSeries({0:entrada}).set_crs("EPSG:4326")
+        entrada_utm = grau_para_utm(entrada)
+        entrada_crs = entrada_utm.crs
+        entrada_utm = entrada_utm.iloc[0]
+    
+    else:
+        entrada_utm = grau_para_utm(entrada, epsg_in=4326)
+
+
+    # Se geodataframe ou geoseries: buffer da união das geometrias (já validadas na ingestão, ver validacao_geometrias.py)
+    if isinstance(entrada_utm, (gpd.GeoDataFrame, gpd.GeoSeries)):
+        entrada_dissolve = shapely.union_all(np.asarray(entrada_utm.geometry.values))
+        buffer = gpd.GeoSeries({0:entrada_dissolve.buffer(distancia_m)}).set_crs(entrada_utm.crs)
+    
+    # Se geometria
+    else:
+        entrada_gs = gpd.GeoSeries({0:entrada_utm}).set_crs(entrada_crs)
+        buffer = entrada_gs.buffer(distancia_m)
+    
+    # Conversão de coordenadas
+    if set_epsg_out:
+        buffer = buffer.to_crs(f"EPSG:{epsg_out}")
+
+    # Retorna uma geometria shapely
+    return buffer.iloc[0]
+        
+
+
+
+###############################################################################
+# Buffer em metros de um array de geometrias, cada uma no fuso UTM do seu centróide
+def buffer_utm(geometrias, distancia_m, crs_in="EPSG:4326"):
+    """
+    geometrias: array de geometrias shapely
+    distancia_m: distancia em metros do buffer (int)
+    crs_in: SRC das geometrias (o buffer é devolvido no mesmo SRC)
+    """
+
+    geometrias = np.asarray(geometrias, dtype=object)
+    buffers = np.empty(len(geometrias), dtype=object)
+
+    # Agrupa as geometrias por fuso UTM e faz uma reprojeção + buffer por fuso
+    epsg_utm = epsg_utm_pontos(shapely.centroid(geometrias), crs_in)
+    for epsg in np.unique(epsg_utm):
+        no_fuso = epsg_utm == epsg
+        geometrias_utm = reprojeta(geometrias[no_fuso], crs_in, int(epsg))
+        buffers[no_fuso] = reprojeta(shapely.buffer(geometrias_utm, distancia_m), int(epsg), crs_in)
+
+    return buffers
+
+
+
+###############################################################################
+# Função para preenchimento dos atributos a partir dos arquivos vetoriais
+def preenche_atributos_vetorial(gdf_in, lista_gdf_fontes):
+    """"
+    gdf_in: GeoDataFrame de entrada
+    lista_gdf_fontes: Lista com GeoDataFrames das fontes de dados (com a coluna "cultura")
+
+    Um talhão recebe a cultura de uma feição da fonte quando a intersecta e está "within" o buffer de 25m da feição.
+    Só são preenchidos os talhões com "class" vazia; as fontes são aplicadas na ordem da lista.
+    """
+
+    log("Executando preenche_atributos_vetorial", "DEBUG")
+
+    # Cópia do gdf de entrada
+    gdf_out = gdf_in.copy()
+    if "class" not in gdf_out.columns:
+        gdf_out["class"] = None
+
+    # Itera sobre as fontes de dados
+    for fonte_filtrada in lista_gdf_fontes:
+        if len(fonte_filtrada) > 0:
+            # Aplica um filtro de classe (se já estiver preenchido, não tenta preencher) e de talhões com geometria
+            talhoes = gdf_out.geometry[gdf_out["class"].isna().values & tem_geometria(gdf_out.geometry.values)]
+            if len(talhoes) == 0:
+                continue
+            if talhoes.crs != fonte_filtrada.crs:
+                talhoes = talhoes.to_crs(fonte_filtrada.crs)
+            geometrias_talhoes = np.asarray(talhoes.values)
+            geometrias_fonte = np.asarray(fonte_filtrada.geometry.values)
+
+            # Pares (talhão, feição) que se intersectam, pelo índice espacial da fonte (construído uma única vez por fonte)
+            idx_talhao, idx_fonte = fonte_filtrada.sindex.query(geometrias_talhoes, predicate="intersects")
+            if len(idx_talhao) == 0:
+                continue
+
+            # Buffer de 25m de cada feição candidata, calculado uma única vez
+            candidatas, idx_candidata = np.unique(idx_fonte, return_inverse=True)
+            buffers = buffer_utm(geometrias_fonte[candidatas], 25, fonte_filtrada.crs)
+
+            # Se o talhão se encontrar "within" o buffer da fonte de dados, recebe a sua classificação
+            dentro = shapely.within(geometrias_talhoes[idx_talhao], buffers[idx_candidata])
+            pares = pd.DataFrame({"talhao": talhoes.index[idx_talhao[dentro]],
+                                  "cultura": fonte_filtrada["cultura"].values[idx_fonte[dentro]],
+                                  "ordem": idx_fonte[dentro]})
+
+            # Com mais de uma feição válida, prevalece a última da fonte (mesma ordem do loop original)
+            pares = pares.sort_values("ordem").drop_duplicates("talhao", keep="last")
+            gdf_out.loc[pares["talhao"].values, "class"] = pares["cultura"].values      # Preenche atributo do talhão
+        else:
+            log("Sem classificação", "DEBUG")
+
+    # Gdf de saída
+    return gdf_out
+
+
+
+#################################################################################
+# Rasteriza os talhões de uma área de interesse em grades de rótulos
+def rasteriza_talhoes(geometrias, transform, largura, altura):
+    """
+    geometrias: array de geometrias shapely no SRC do raster
+    transform: transformação afim do raster (Affine)
+    largura, altura: dimensões do raster em pixels (int)
+
+    Retorna um dicionário com a janela única de leitura que cobre todos os talhões e,
+    para cada pixel dessa janela, o(s) talhão(ões) que o tocam (all_touched, como no mask).
+    Talhões vizinhos podem compartilhar pixels de borda, por isso são separados em camadas
+    (coloração gulosa) em que nenhum par de talhões chega perto um do outro.
+    """
+
+    n_talhoes = len(geometrias)
+
+    # Janela de recorte de cada talhão, em pixels (mesma regra do rasterio.mask com crop=True)
+    xmin, ymin, xmax, ymax = shapely.bounds(geometrias).T
+    colunas_a, linhas_a = ~transform * (xmin, ymax)
+    colunas_b, linhas_b = ~transform * (xmax, ymin)
+    col_ini = np.clip(np.floor(np.minimum(colunas_a, colunas_b)), 0, largura).astype(np.int64)
+    col_fim = np.clip(np.ceil(np.maximum(colunas_a, colunas_b)), 0, largura).astype(np.int64)
+    lin_ini = np.clip(np.floor(np.minimum(linhas_a, linhas_b)), 0, altura).astype(np.int64)
+    lin_fim = np.clip(np.ceil(np.maximum(linhas_a, linhas_b)), 0, altura).astype(np.int64)
+    if np.any((col_fim <= col_ini) | (lin_fim <= lin_ini)):
+        raise ValueError("Geometria do talhão não sobrepõe o raster.")
+
+    # Janela única que cobre todos os talhões
+    janela = Window(col_ini.min(), lin_ini.min(), col_fim.max() - col_ini.min(), lin_fim.max() - lin_ini.min())
+    transform_janela = rio.windows.transform(janela, transform)
+    forma = (int(janela.height), int(janela.width))
+    col_ini, col_fim = col_ini - janela.col_off, col_fim - janela.col_off
+    lin_ini, lin_fim = lin_ini - janela.row_off, lin_fim - janela.row_off
+
+    # Coloração gulosa: talhões cujas janelas (com 1 pixel de folga) se sobrepõem ficam em camadas diferentes
+    caixas = shapely.box(col_ini - 1, lin_ini - 1, col_fim + 0.5, lin_fim + 0.5)
+    pares = shapely.STRtree(caixas).query(caixas, predicate="intersects")
+    vizinhos = [[] for _ in range(n_talhoes)]
+    for i, j in pares.T:
+        if i != j:
+            vizinhos[i].append(j)
+    cores = np.full(n_talhoes, -1)
+    for i in range(n_talhoes):
+        usadas = {cores[j] for j in vizinhos[i]}
+        cor = 0
+        while cor in usadas:
+            cor += 1
+        cores[i] = cor
+
+    # Uma rasterização por camada; cada pixel guarda o rótulo (posição + 1) do talhão
+    pixels = []
+    rotulos = []
+    for cor in range(cores.max() + 1):
+        posicoes = np.flatnonzero(cores == cor)
+        grade_rotulos = rasterize(zip(geometrias[posicoes], posicoes + 1), out_shape=forma, transform=transform_janela,
+                                  fill=0, all_touched=True, dtype="int32")
+
+        # Descarta pixels fora da janela de recorte do próprio talhão
+        grade_janelas = np.zeros(forma, dtype="int32")
+        for posicao in posicoes:
+            grade_janelas[lin_ini[posicao]:lin_fim[posicao], col_ini[posicao]:col_fim[posicao]] = posicao + 1
+        validos = np.flatnonzero((grade_rotulos == grade_janelas).ravel() & (grade_rotulos.ravel() > 0))
+        pixels.append(validos)
+        rotulos.append(grade_rotulos.ravel()[validos] - 1)
+
+    return {"janela": janela,
+            "transform": transform_janela,
+            "n_talhoes": n_talhoes,
+            "pixels": np.concatenate(pixels),
+            "rotulos": np.concatenate(rotulos),
+            "area_janelas": (lin_fim - lin_ini) * (col_fim - col_ini)}
+
+
+
+#################################################################################
+# Histograma de classes por talhão a partir da janela lida e da grade de rótulos
+def estatisticas_zonais(array, grade):
+    """
+    array: valores do raster lidos na janela da grade (np.ndarray 2D)
+    grade: dicionário retornado por rasteriza_talhoes
+
+    Retorna os valores únicos da janela, a matriz de contagens (talhões x valores)
+    e se o recorte de cada talhão contém pixels fora da geometria (preenchidos com 255 pelo mask)
+    """
+
+    # Valores únicos e índice de cada pixel no vetor de valores
+    valores, indices = np.unique(array, return_inverse=True)
+    indices = indices.ravel()
+
+    # Uma única contagem para todos os pares (talhão, valor)
+    chaves = grade["rotulos"] * len(valores) + indices[grade["pixels"]]
+    contagens = np.bincount(chaves, minlength=grade["n_talhoes"] * len(valores)).reshape(grade["n_talhoes"], len(valores))
+
+    # Se o talhão não preenche toda a sua janela de recorte, o mask incluiria o valor 255
+    fora = contagens.sum(axis=1) < grade["area_janelas"]
+
+    return valores, contagens, fora
+
+
+
+#################################################################################
+# Separa as estatísticas zonais em um histograma por talhão (valores presentes, contagens e pixels fora)
+def separa_histogramas(estatisticas):
+    """
+    estatisticas: retorno de estatisticas_zonais
+    Retorna uma lista com (valores, contagens, fora) de cada talhão
+    """
+
+    valores, contagens, fora = estatisticas
+    return [(valores[contagem > 0], contagem[contagem > 0], bool(fora[posicao])) for posicao, contagem in enumerate(contagens)]
+
+
+
+# Junta histogramas de talhões no formato de estatisticas_zonais
+def junta_histogramas(histogramas):
+    """
+    histogramas: lista com (valores, contagens, fora) de cada talhão
+    Retorna os valores únicos, a matriz de contagens (talhões x valores) e os pixels fora de cada talhão
+    """
+
+    valores = np.unique(np.concatenate([histograma[0] for histograma in histogramas]))
+    contagens = np.zeros((len(histogramas), len(valores)), dtype=np.int64)
+    for posicao, (valores_talhao, contagens_talhao, _) in enumerate(histogramas):
+        contagens[posicao, np.searchsorted(valores, valores_talhao)] = contagens_talhao
+    fora = np.array([histograma[2] for histograma in histogramas], dtype=bool)
+    return valores, contagens, fora
+
+
+
+#################################################################################
+# Moda do histograma de cada talhão, ignorando "nodata"
+def modas_zonais(valores, contagens):
+    """
+    valores: valores únicos do raster (np.ndarray)
+    contagens: matriz de contagens (talhões x valores)
+    Retorna o valor mais frequente de cada talhão (o menor, em caso de empate) e se o talhão tem pixels válidos
+    """
+
+    contagens = np.where(((valores != 255) & (valores != -1))[np.newaxis, :], contagens, 0)
+    if contagens.shape[1] == 0:
+        return np.zeros(len(contagens), dtype=np.int64), np.zeros(len(contagens), dtype=bool)
+    return valores[np.argmax(contagens, axis=1)], contagens.max(axis=1) > 0
+
+
+
+#################################################################################
+# Função para preenchimento dos atributos a partir de vários rasters em uma única chamada
+def preenche_atributos_multiraster(gdf_in, lista_rasters):
+    """
+    gdf_in: geodataframe que será atualizado com os dados (GeoDataFrame)
+    lista_rasters: lista de dicionários, um por raster, processados na ordem da lista, com as chaves
+        caminho: caminho para o arquivo raster (string)
+        origem_dict: dicionário de classes usado (irrigacao, mapbiomas, simfaz ou agrosatelite)
+        coluna: coluna do gdf que recebe a classe (string)
+        coluna_classes_possiveis (opcional): coluna que recebe as classes possíveis (string ou None, padrão "classes_possiveis")
+        coluna_codigo (opcional): coluna que recebe o código do pixel da classe (string ou None, padrão "{coluna}_codigo")
+
+    Os talhões são rasterizados uma única vez por grade (SRC, transformação e dimensões)
+    e a grade de rótulos é reaproveitada por todos os rasters dessa grade.
+    Rasters repetidos na lista são lidos uma única vez.
+    Com o cache de histogramas ativo (cache_histogramas.py), só os talhões ainda sem histograma são lidos.
+    """
+
+    log("Executando preenche_atributos_multiraster", "DEBUG")
+
+    # Cópia do gdf de entrada
+    gdf_out = gdf_in.copy()
+    for raster_in in lista_rasters:
+        if raster_in["coluna"] not in gdf_out.columns:
+            gdf_out[raster_in["coluna"]] = None
+        coluna_codigo = raster_in.get("coluna_codigo", f"{raster_in['coluna']}_codigo")
+        if coluna_codigo is not None and coluna_codigo not in gdf_out.columns:
+            gdf_out[coluna_codigo] = pd.array([pd.NA] * len(gdf_out), dtype="Int16")
+
+    # Talhões com ao menos uma coluna a preencher
+    colunas = list(dict.fromkeys(raster_in["coluna"] for raster_in in lista_rasters))
+    pendentes = np.zeros(len(gdf_out), dtype=bool)
+    for coluna in colunas:
+        pendentes |= np.array([valor is None for valor in gdf_out[coluna]])
+
+    geometrias_grades = {}  # grade -> (índices dos talhões válidos, geometrias no SRC da grade)
+    grades = {}             # (grade, talhões rasterizados) -> grade de rótulos
+    leituras = {}           # (caminho, talhões lidos) -> estatísticas zonais do raster
+    for raster_in in lista_rasters:
+        log(raster_in["coluna"], "DEBUG")
+        caminho = raster_in["caminho"]
+        dict_classes = DICT_CLASSES[raster_in["origem_dict"]]
+
+        # Obtém o raster do pool (aberto uma única vez por processo)
+        raster = abre_raster(caminho)
+        chave_grade = (raster.crs.to_wkt(), tuple(raster.transform), raster.width, raster.height)
+
+        # Reprojeta os talhões uma única vez por grade (os sem geometria, inválidos sem reparo na ingestão, ficam de fora)
+        if chave_grade not in geometrias_grades:
+            geometrias = gdf_out["geometry"][pendentes].to_crs(raster.crs)
+            com_geometria = tem_geometria(geometrias.values)
+            geometrias_grades[chave_grade] = (geometrias.index[com_geometria], geometrias.values[com_geometria])
+        indices, geometrias = geometrias_grades[chave_grade]
+
+        # Histogramas já guardados no cache: só os talhões sem histograma são lidos do raster
+        a_ler = np.ones(len(indices), dtype=bool)
+        usa_cache = cache_ativo() and len(indices) > 0
+        if usa_cache:
+            chaves = chaves_histogramas(geometrias, impressao_raster(raster), impressao_dicionario(dict_classes))
+            guardados = busca_histogramas(chaves)
+            a_ler = np.array([chave not in guardados for chave in chaves], dtype=bool)
+
+        # Rasteriza os talhões uma única vez por grade e lê cada raster uma única vez
+        posicoes_ler = tuple(np.flatnonzero(a_ler).tolist())
+        if (caminho, posicoes_ler) not in leituras:
+            if (chave_grade, posicoes_ler) not in grades:
+                grade = None
+                if a_ler.any():
+                    with etapa("rasterizacao", talhoes=int(a_ler.sum())):
+                        grade = rasteriza_talhoes(geometrias[a_ler], raster.transform, raster.width, raster.height)
+                grades[(chave_grade, posicoes_ler)] = grade
+            grade = grades[(chave_grade, posicoes_ler)]
+
+            # Leitura da janela que cobre todos os talhões
+            if grade is not None:
+                array = le_janela(raster, grade["janela"], masked=True).filled(255)   # Valores "nodata" do raster recebem 255, como no mask
+                with etapa("moda", raster=caminho):
+                    leituras[(caminho, posicoes_ler)] = estatisticas_zonais(array, grade)
+            else:
+                leituras[(caminho, posicoes_ler)] = None
+        estatisticas = leituras[(caminho, posicoes_ler)]
+
+        # Junta os histogramas lidos (que passam a ficar no cache) aos já guardados
+        if usa_cache:
+            lidos = separa_histogramas(estatisticas) if estatisticas is not None else []
+            chaves_lidas = [chave for chave, ler in zip(chaves, a_ler) if ler]
+            grava_histogramas(dict(zip(chaves_lidas, lidos)))
+            lidos = iter(lidos)
+            estatisticas = junta_histogramas([next(lidos) if ler else guardados[chave] for chave, ler in zip(chaves, a_ler)])
+
+        # Preenche o gdf de saída
+        with etapa("preenchimento", raster=caminho):
+            _preenche_coluna(gdf_out, pendentes, indices, estatisticas, raster_in["origem_dict"], raster_in["coluna"],
+                             raster_in.get("coluna_classes_possiveis", "classes_possiveis"),
+                             raster_in.get("coluna_codigo", f"{raster_in['coluna']}_codigo"))
+
+    # Gdf de saída
+    return gdf_out
+
+
+
+# Preenche uma coluna do gdf com a moda, o código da moda e as classes possíveis de cada talhão
+def _preenche_coluna(gdf_out, pendentes, indices, estatisticas, fonte, coluna, coluna_classes_possiveis, coluna_codigo):
+    # Só preenche os talhões cuja classe ainda não foi preenchida
+    a_preencher = np.array([valor is None for valor in gdf_out[coluna]]) & pendentes
+
+    # Talhões sem geometria (inválidos sem reparo na ingestão)
+    sem_geometria = gdf_out.index[a_preencher].difference(indices, sort=False)
+    if len(sem_geometria) > 0:
+        log(f"{len(sem_geometria)} talhões sem geometria válida", "DEBUG")
+        gdf_out.loc[sem_geometria, coluna] = "GEOM_INVÁLIDA"
+
+    if estatisticas is None:
+        return
+    valores, contagens, fora = estatisticas
+
+    # Talhões válidos ainda sem classe
+    selecionados = np.asarray(indices.isin(gdf_out.index[a_preencher]))
+    if not selecionados.any():
+        return
+    idx_talhoes = indices[selecionados]
+    contagens, fora = contagens[selecionados], fora[selecionados]
+
+    # Valores presentes no recorte de cada talhão (255 quando o recorte tem pixels fora da geometria)
+    if coluna_classes_possiveis is not None:
+        presentes = contagens > 0
+        valores_recorte = valores
+        if 255 not in valores:
+            posicao = np.searchsorted(valores, 255)
+            valores_recorte = np.insert(valores, posicao, 255)
+            presentes = np.insert(presentes, posicao, False, axis=1)
+        presentes[:, np.searchsorted(valores_recorte, 255)] |= fora
+        gdf_out.loc[idx_talhoes, coluna_classes_possiveis] = classes_possiveis(fonte, valores_recorte, presentes)
+
+    # Moda de cada talhão, ignorando o valor "nodata", e classe a partir da tabela de códigos
+    modas, com_moda = modas_zonais(valores, contagens)
+    nomes = nomes_classes(fonte, modas)
+    desconhecidos = com_moda & pd.isna(nomes)
+    if desconhecidos.any():
+        raise KeyError(modas[desconhecidos][0].item())
+    for _ in range(np.count_nonzero(~com_moda)):
+        log("Algo deu errado no cálculo da moda.", "AVISO")
+    gdf_out.loc[idx_talhoes, coluna] = np.where(com_moda, nomes, "ERRO_MODA")
+    if coluna_codigo is not None:
+        gdf_out.loc[idx_talhoes[com_moda], coluna_codigo] = modas[com_moda]
+
+
+
+#################################################################################
+# Função para preenchimento dos atributos a partir do raster "MAPBIOMAS"
+def preenche_atributos_raster(gdf_in, lulc_raster_in_path=None, irrigation_raster_in_path=None, lulc_origem_dict="mapbiomas"):
+    """
+    gdf_in: geodataframe que será atualizado com os dados (GeoDataFrame)
+    lulc_raster_in_path: caminho para o arquivo raster de land use/ land cover (string)
+    irrigation_raster_in_path: caminho para o raster de irrigação do mapbiomas (string)
+    lulc_origem_dict: indica qual dicionário de dados será usado (mapbiomas ou agrosatélite)
+    """
+
+    log("Executando preenche_atributos_raster", "DEBUG")
+
+    lista_rasters = []
+
+    # IRRIGAÇÃO
+    if irrigation_raster_in_path != None:
+        lista_rasters.append({"caminho": irrigation_raster_in_path, "origem_dict": "irrigacao", "coluna": "irrigation"})
+
+    # LAND COVER
+    if lulc_raster_in_path != None:
+        lista_rasters.append({"caminho": lulc_raster_in_path, "origem_dict": lulc_origem_dict, "coluna": "class"})
+
+    # Análise dos rasters com preenchimento das informações
+    if len(lista_rasters) > 0:
+        gdf_in = preenche_atributos_multiraster(gdf_in, lista_rasters)
+
+    # Gdf de saída
+    return gdf_in
+
+
+
+################################################################################
+# Filtra as estradas pavimentadas retornadas pelo OSM
+def filtra_estradas_pavimentadas(gdf_estradas_osm):
+    """
+    gdf_estradas_osm: GeoDataFrame com as feições "highway" do OSM
+    """
+
+    try:
+        # Filtragem de estradas com pavimentação
+        try:
+            gdf_estradas_osm_filtrada = gdf_estradas_osm[["ref", "surface", "geometry"]]
+            gdf_estradas_osm_filtrada = gdf_estradas_osm_filtrada[gdf_estradas_osm_filtrada["geometry"].geom_type != "Point"].reset_index(drop=True)
+            gdf_estradas_osm_filtrada = gdf_estradas_osm_filtrada[((gdf_estradas_osm_filtrada["surface"].isin(["paved", "asphalt"])) | (gdf_estradas_osm_filtrada["ref"].str.contains("BR|AC|AL|AM|AP|BA|CE|DF|ES|GO|MA|MG|MS|MT|PA|PB|PE|PI|PR|RJ|RN|RO|RR|RS|SC|SE|SP|TO", case=False))) & (gdf_estradas_osm_filtrada["surface"] !="unpaved")]   # que não sejam "unpaved" |sc|SC|pr|PR|rs|RS|sp|SP|mt|MT|df|DF|ac|AC|rj|RJ|mg|MG
+        except Exception as e:
+            log(f"Erro {e}. Tratando.", "AVISO")
+            gdf_estradas_osm_filtrada = gdf_estradas_osm[["surface", "geometry"]]
+            gdf_estradas_osm_filtrada = gdf_estradas_osm_filtrada[gdf_estradas_osm_filtrada["geometry"].geom_type != "Point"].reset_index(drop=True)
+            gdf_estradas_osm_filtrada = gdf_estradas_osm_filtrada[gdf_estradas_osm_filtrada["surface"].isin(["paved", "asphalt"])]   # que não sejam "unpaved"
+
+    except Exception as e:
+        log(f"Erro {e}. Tratando.", "AVISO")
+        gdf_estradas_osm_filtrada = gdf_estradas_osm
+
+    return gdf_estradas_osm_filtrada
+
+
+
+################################################################################
+# Localiza estradas pelo OpenStreetMap
+def busca_estradas(gdf_in, roads_in=None, is_wgs=True, diretorio_cache=None, offline=False):
+    """
+    gdf_in: GeoDataFrame de entrada (que será preenchido)
+    roads_in (opcional): GeoDataFrame com as estradas pavimentadas, índice de indice_estradas.py ou caminho do índice serializado
+    is_wgs: indica se o(s) dado(s) de entrada está(ão) em wgs84 (booleano)
+    diretorio_cache (opcional): diretório do cache local de estradas do OSM (ver cache_estradas.py)
+    offline: se True, usa apenas o cache local, sem acessar o OSM (booleano)
+    OBS: os dados de entrada precisam estar no mesmo sistema de referência de coordenadas
+    """
+
+    log("Executando busca_estradas", "DEBUG")
+
+    # Se for passado um geodataframe com as estradas (ou um índice já construído), classifica cada talhão pela estrada mais próxima
+    if roads_in is not None:
+        if isinstance(roads_in, (gpd.GeoDataFrame, gpd.GeoSeries)):
+            roads_in = constroi_indice_estradas(gpd.GeoDataFrame(geometry=roads_in.geometry))
+        elif isinstance(roads_in, str):
+            roads_in = carrega_indice_estradas(roads_in)
+        return classifica_estradas(gdf_in, roads_in)
+
+    # Cópia do gdf (só os talhões com geometria) para gerar buffer de cada talhão
+    gdf_copy = gdf_in[tem_geometria(gdf_in.geometry.values)].copy()
+
+    # Sem nenhum talhão com geometria (inválidos sem reparo na ingestão), não há como buscar estradas
+    if len(gdf_copy) == 0:
+        log("Área sem geometria válida.", "AVISO")
+        gdf_in["paved_road"] = "NULL"
+    
+    else:
+        # Se a entrada estiver em grau, precisa reprojetar para gerar o buffer
+        if is_wgs:
+            gdf_copy = grau_para_utm(gdf_copy)    # Para gerar o buffer em metros precisa estar em utm
+
+        # Gerando buffer de 10Km e reprojetando para wgs84 (src compatível com o osmnx)
+        with etapa("geometria_estradas"):
+            geom_dissolve_buffer = gdf_copy.buffer(10000).to_crs("EPSG:4326").unary_union
+            geom_dissolve_fazenda = gdf_copy.buffer(45).to_crs("EPSG:4326").unary_union     # aplicando buffer para ajudar com intersects de estradas próximas
+
+        # Chamada api OSM (ou cache local em tiles)
+        with etapa("busca_estradas"):
+            if diretorio_cache is None and not offline:
+                conta("chamadas_osm")
+                gdf_estradas_osm = importa_osmnx().features_from_polygon(geom_dissolve_buffer, tags={"highway":True}).reset_index(drop=True)
+            else:
+                gdf_estradas_osm = estradas_do_cache(geom_dissolve_buffer, diretorio=diretorio_cache or DIRETORIO_CACHE, offline=offline)
+        
+            # Filtragem de estradas com pavimentação
+            gdf_estradas_osm_filtrada = filtra_estradas_pavimentadas(gdf_estradas_osm)
+
+        # Verifica se tem ao menos uma estrada pavimentada a 10Km do buffer dos talhões dissolvidos
+        if len(gdf_estradas_osm_filtrada) > 0:
+            # Dissolve das estradas
+            with etapa("geometria_estradas"):
+                geom_estradas_dissolve = gdf_estradas_osm_filtrada.unary_union.intersection(geom_dissolve_buffer)
+                toca = geom_dissolve_fazenda.intersects(geom_estradas_dissolve)
+
+            # Preenche a informação de todos os talhões conforme o relacionamento da união das geometrias com as estradas
+            if toca:     #  | (geom_dissolve_fazenda.touches(geom_estradas_dissolve)) | (geom_dissolve_fazenda.overlaps(geom_estradas_dissolve))
+                gdf_in["paved_road"] = "TOUCH_ROAD"
+                log("TOUCH_ROAD", "DEBUG")
+            else:
+                gdf_in["paved_road"] = "10KM_ROAD"
+                log("10KM_ROAD", "DEBUG")
+
+        # Se não houver nenhuma, preenche todas com "NO"
+        else:
+            gdf_in["paved_road"] = "NO"
+            log("NO", "DEBUG")
+
+    # Saída gdf preenchido
+    return gdf_in
+
+
+
+################################################################################
+# Busca de estradas em lote: áreas vizinhas compartilham uma única consulta de estradas
+def busca_estradas_lote(gdf_in, coluna_area="interest_area_id", diretorio_cache=None, offline=False, busca_fn=None, tamanho_max_cluster=1.0):
+    """
+    gdf_in: GeoDataFrame (wgs84) com os talhões de todas as áreas de interesse
+    coluna_area: coluna que identifica a área de interesse (string)
+    diretorio_cache, offline: cache local de estradas do OSM (mesmo uso de busca_estradas)
+    busca_fn (opcional): função que recebe um polígono (wgs84) e retorna as estradas pavimentadas (ex: consulta PostGIS)
+    tamanho_max_cluster: tamanho máximo, em graus, da célula usada para dividir clusters muito extensos (float)
+
+    Os buffers de 10Km das áreas que se sobrepõem são unidos em clusters; as estradas são buscadas uma única vez
+    por cluster e cada área é classificada (TOUCH_ROAD, 10KM_ROAD ou NO) com as mesmas regras de busca_estradas
+    (NULL para áreas sem nenhum talhão com geometria).
+    Retorna pd.Series com o paved_road de cada área (índice = id da área); áreas de clusters com erro ficam de fora
+    """
+
+    import scipy.sparse
+    import scipy.sparse.csgraph
+
+    log("Executando busca_estradas_lote", "DEBUG")
+
+    # Áreas sem nenhum talhão com geometria (inválidos sem reparo na ingestão) ficam com NULL
+    com_geometria = tem_geometria(gdf_in.geometry.values)
+    sem_geometria = pd.Series("NULL", dtype=object,
+                              index=pd.Index(gdf_in[coluna_area].unique()).difference(gdf_in[coluna_area][com_geometria].unique()))
+    gdf_in = gdf_in[com_geometria]
+    if len(gdf_in) == 0:
+        return sem_geometria
+
+    with etapa("geometria_estradas", talhoes=len(gdf_in)):
+        # Geometria dissolvida de cada área e seus buffers de 10Km e 45m
+        areas = gdf_in[[coluna_area, "geometry"]].to_crs("EPSG:4326").dissolve(by=coluna_area)
+        geometrias_areas = np.asarray(areas.geometry.values)
+        buffers_10km = buffer_utm(geometrias_areas, 10000)
+        buffers_fazenda = buffer_utm(geometrias_areas, 45)     # aplicando buffer para ajudar com intersects de estradas próximas
+
+        # Clusters: componentes conexos dos buffers que se sobrepõem, divididos por uma grade de tamanho_max_cluster graus
+        pares = shapely.STRtree(buffers_10km).query(buffers_10km, predicate="intersects")
+        grafo = scipy.sparse.coo_matrix((np.ones(pares.shape[1]), (pares[0], pares[1])), shape=(len(areas), len(areas)))
+        _, componentes = scipy.sparse.csgraph.connected_components(grafo, directed=False)
+        centroides = shapely.centroid(geometrias_areas)
+        celulas_x = np.floor(shapely.get_x(centroides) / tamanho_max_cluster).astype(np.int64)
+        celulas_y = np.floor(shapely.get_y(centroides) / tamanho_max_cluster).astype(np.int64)
+        _, clusters = np.unique(np.column_stack([componentes, celulas_x, celulas_y]), axis=0, return_inverse=True)
+        clusters = clusters.ravel()
+    log(f"{len(areas)} áreas agrupadas em {clusters.max() + 1} clusters")
+
+    paved_road = pd.Series(index=areas.index, dtype=object)
+    com_erro = np.zeros(len(areas), dtype=bool)
+    for cluster in range(clusters.max() + 1):
+        no_cluster = np.flatnonzero(clusters == cluster)
+        try:
+            # Estradas pavimentadas do cluster (uma única consulta)
+            with etapa("busca_estradas", cluster=cluster, areas=len(no_cluster)):
+                geom_cluster = shapely.union_all(buffers_10km[no_cluster])
+                if busca_fn is not None:
+                    gdf_estradas = busca_fn(geom_cluster)
+                else:
+                    if diretorio_cache is None and not offline:
+                        conta("chamadas_osm")
+                        gdf_estradas_osm = importa_osmnx().features_from_polygon(geom_cluster, tags={"highway":True}).reset_index(drop=True)
+                    else:
+                        gdf_estradas_osm = estradas_do_cache(geom_cluster, diretorio=diretorio_cache or DIRETORIO_CACHE, offline=offline)
+                    gdf_estradas = filtra_estradas_pavimentadas(gdf_estradas_osm)
+
+            # Classificação de cada área do cluster com as estradas compartilhadas
+            with etapa("geometria_estradas", cluster=cluster, areas=len(no_cluster)):
+                valores = np.full(len(no_cluster), "NO", dtype=object)
+                if len(gdf_estradas) > 0:
+                    arvore = shapely.STRtree(np.asarray(gdf_estradas.geometry.values))
+                    perto = np.unique(arvore.query(buffers_10km[no_cluster], predicate="intersects")[0])
+                    toca = np.unique(arvore.query(buffers_fazenda[no_cluster], predicate="intersects")[0])
+                    valores[perto] = "10KM_ROAD"
+                    valores[toca] = "TOUCH_ROAD"
+            paved_road.iloc[no_cluster] = valores
+
+        except Exception as e:
+            log(f"ERRO - cluster {cluster + 1}: {e}\n{traceback.format_exc()}", "ERRO")
+            com_erro[no_cluster] = True
+
+    return pd.concat([paved_road[~com_erro], sem_geometria])
+
+
+
+
+##############################################################
+# Avalia os resultados das fontes contra a classificação dos analistas
+def analisa_resultados(analistas, mapbiomas, simfaz, agrosatelite, atributos=ATRIBUTOS, desconsidera_nulos=False):
+    """
+    analistas, mapbiomas, simfaz, agrosatelite: GeoDataFrames (ou DataFrames) com id e os atributos avaliados
+    atributos: atributos comparados (lista, padrão class, irrigation e paved_road)
+    desconsidera_nulos: se True, ignora os talhões que o analista deixou NULL no atributo (booleano)
+    Os talhões são alinhados pelo id; retorna os DataFrames de avaliacao.avalia_fontes
+    (resumo, por_classe e matrizes de confusão), que podem ser impressos com avaliacao.imprime_avaliacao
+    """
+
+    log("Executando analisa_resultados", "DEBUG")
+    return avalia_fontes(analistas, {"mapbiomas": mapbiomas, "simfaz": simfaz, "agrosatelite": agrosatelite},
+                         atributos=atributos, desconsidera_nulos=desconsidera_nulos)
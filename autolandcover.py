@@ -0,0 +1,41 @@
+import sys
+import argparse
+from importlib import import_module
+
+###########################################################################
+# Ponto de entrada único: python autolandcover.py <comando> [opções]
+# O módulo de cada comando só é importado quando o comando é executado (nada pesado é importado para o --help
+# ou para os outros comandos); os módulos não fazem trabalho ao serem importados (osmnx, scipy e sqlalchemy
+# são importados na primeira chamada que os usa), então os workers também iniciam rápido
+
+# Comando -> (módulo com a função main(argv, prog), descrição)
+COMANDOS = {"process": ("processa_landcover", "valora os talhões do banco (land cover, irrigação e estradas)"),
+            "evaluate": ("verifica_valoracoes", "avalia as valorações contra os analistas, reaproveitando as previsões já calculadas"),
+            "prefetch-roads": ("cache_estradas", "pré-carrega o cache local de estradas do OSM de uma região"),
+            "build-road-index": ("indice_estradas", "constrói o índice de estradas pavimentadas (tabela do PostGIS ou arquivo)"),
+            "prepare-rasters": ("prepara_rasters", "reescreve os rasters de entrada como COGs"),
+            "benchmark": ("benchmark", "benchmark dos caminhos críticos com dados sintéticos")}
+
+
+
+# Executa o comando com as opções restantes
+def main(argv=None):
+    """
+    argv: argumentos da linha de comando (lista, padrão sys.argv[1:])
+    Retorna o código de saída do comando (0 quando o comando não retorna nada)
+    """
+
+    parser = argparse.ArgumentParser(prog="autolandcover", description="Valoração automática de talhões por rasters de land cover",
+                                     epilog="comandos:\n" + "\n".join(f"  {comando:<18}{descricao}" for comando, (_, descricao) in COMANDOS.items()),
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("comando", choices=list(COMANDOS), help="comando a executar (autolandcover <comando> --help mostra as opções)")
+    parser.add_argument("opcoes", nargs=argparse.REMAINDER, help="opções do comando")
+    argumentos = parser.parse_args(argv)
+
+    modulo, _ = COMANDOS[argumentos.comando]
+    return import_module(modulo).main(argumentos.opcoes, prog=f"autolandcover {argumentos.comando}") or 0
+
+
+
+if __name__ == "__main__":
+    sys.exit(main())
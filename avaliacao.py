@@ -0,0 +1,157 @@
+import numpy as np
+import pandas as pd
+from tabela_classes import CLASSES_TAXONOMIA, CODIGO_DESCONHECIDO, taxonomia_de_nomes
+
+###########################################################################
+# Avaliação das valorações contra as classificações dos analistas por matrizes de confusão
+# Os rótulos viram códigos inteiros e cada matriz sai de um único np.bincount (analista x fonte);
+# acerto, precisão, revocação e F1 (por classe, macro e ponderado) são derivados das matrizes
+
+ATRIBUTOS = ["class", "irrigation", "paved_road"]
+
+# Rótulo das classes fora da taxonomia harmonizada (nunca contam como acerto)
+ROTULO_DESCONHECIDO = "DESCONHECIDA"
+
+
+
+# Valores de uma coluna das fontes alinhados às linhas dos analistas pelo id (nulo quando o talhão não está na fonte)
+def alinha_por_id(ids_analistas, fonte, coluna):
+    """
+    ids_analistas: ids dos talhões dos analistas (Series ou array)
+    fonte: DataFrame da fonte com as colunas id e coluna (ids repetidos: vale a última linha)
+    coluna: coluna a alinhar (string)
+    Retorna um array object na ordem de ids_analistas
+    """
+
+    ids_fonte = pd.Series(fonte["id"].values)
+    ids_analistas = pd.Series(np.asarray(ids_analistas))
+    if ids_fonte.dtype != ids_analistas.dtype:
+        ids_fonte, ids_analistas = ids_fonte.astype(str), ids_analistas.astype(str)
+
+    ultima = ~ids_fonte.duplicated(keep="last").values
+    posicoes = pd.Index(ids_fonte[ultima]).get_indexer(ids_analistas)
+    valores = np.asarray(fonte[coluna].values, dtype=object)[ultima]
+    return np.where(posicoes >= 0, valores[posicoes], None)
+
+
+
+# Rótulos e códigos inteiros dos valores verdadeiros e previstos de um atributo
+def codifica_atributo(atributo, verdadeiros, previstos):
+    """
+    atributo: class (taxonomia harmonizada) ou outro atributo categórico (irrigation, paved_road, ...)
+    verdadeiros: valores dos analistas (array)
+    previstos: dicionário fonte -> valores previstos, alinhados aos verdadeiros (arrays)
+    Retorna (rótulos, códigos verdadeiros, dicionário fonte -> códigos previstos); nulos viram "NULL"
+    """
+
+    if atributo == "class":
+        rotulos = CLASSES_TAXONOMIA + [ROTULO_DESCONHECIDO]
+
+        def codigos(valores):
+            taxonomia = taxonomia_de_nomes(valores).astype(np.int64)
+            return np.where(taxonomia == CODIGO_DESCONHECIDO, len(CLASSES_TAXONOMIA), taxonomia)
+
+    else:
+        series = [pd.Series(valores, dtype=object).fillna("NULL") for valores in [verdadeiros, *previstos.values()]]
+        rotulos = sorted(set().union(*(serie.unique() for serie in series)) | {"NULL"}, key=str)
+
+        def codigos(valores):
+            return pd.Categorical(pd.Series(valores, dtype=object).fillna("NULL"), categories=rotulos).codes.astype(np.int64)
+
+    return rotulos, codigos(verdadeiros), {fonte: codigos(valores) for fonte, valores in previstos.items()}
+
+
+
+# Matriz de confusão (linhas: analistas, colunas: fonte) com um único bincount
+def matriz_confusao(codigos_verdadeiros, codigos_previstos, n_rotulos):
+    return np.bincount(codigos_verdadeiros * n_rotulos + codigos_previstos, minlength=n_rotulos * n_rotulos).reshape(n_rotulos, n_rotulos)
+
+
+
+# Precisão, revocação e F1 de cada rótulo a partir da matriz de confusão
+def metricas_matriz(matriz, rotulos):
+    """
+    matriz: matriz de confusão (analistas x fonte)
+    rotulos: rótulo de cada linha/coluna (lista)
+    Retorna DataFrame indexado pelo rótulo (NaN onde a métrica não é definida)
+    """
+
+    acertos = np.diag(matriz).astype(float)
+    if rotulos[-1] == ROTULO_DESCONHECIDO:
+        acertos[-1] = 0
+    suporte = matriz.sum(axis=1)
+    previstos = matriz.sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precisao = np.where(previstos > 0, acertos / previstos, np.nan)
+        revocacao = np.where(suporte > 0, acertos / suporte, np.nan)
+        f1 = np.where(precisao + revocacao > 0, 2 * precisao * revocacao / (precisao + revocacao), 0.0)
+    f1 = np.where(np.isnan(precisao) | np.isnan(revocacao), np.nan, f1)
+    return pd.DataFrame({"suporte": suporte, "previstos": previstos, "acertos": acertos.astype(np.int64),
+                         "precisao": precisao, "revocacao": revocacao, "f1": f1}, index=pd.Index(rotulos, name="classe"))
+
+
+
+# Avalia as fontes contra os analistas em todos os atributos
+def avalia_fontes(analistas, fontes, atributos=ATRIBUTOS, desconsidera_nulos=False):
+    """
+    analistas: DataFrame com id e os atributos classificados pelos analistas
+    fontes: dicionário nome da fonte -> DataFrame com id e os atributos valorados
+    atributos: atributos avaliados (lista)
+    desconsidera_nulos: se True, ignora os talhões que o analista deixou NULL no atributo (booleano)
+    Retorna um dicionário com os DataFrames
+        resumo: uma linha por (atributo, fonte) com total, acertos, taxa de acerto (%) e precisão/revocação/F1 macro e F1 ponderado
+        por_classe: uma linha por (atributo, fonte, classe) com suporte, previstos, acertos, precisão, revocação e F1
+        matrizes: dicionário (atributo, fonte) -> matriz de confusão (DataFrame, linhas: analistas, colunas: fonte)
+    """
+
+    resumo, por_classe, matrizes = [], [], {}
+    for atributo in atributos:
+        previstos = {nome: alinha_por_id(analistas["id"], fonte, atributo) for nome, fonte in fontes.items() if atributo in fonte.columns}
+        rotulos, verdadeiros, codigos_previstos = codifica_atributo(atributo, analistas[atributo].values, previstos)
+
+        validos = np.ones(len(verdadeiros), dtype=bool)
+        if desconsidera_nulos:
+            validos = verdadeiros != rotulos.index("NULL")
+
+        for nome, codigos in codigos_previstos.items():
+            matriz = matriz_confusao(verdadeiros[validos], codigos[validos], len(rotulos))
+            matrizes[(atributo, nome)] = pd.DataFrame(matriz, index=pd.Index(rotulos, name="analistas"), columns=pd.Index(rotulos, name=nome))
+
+            metricas = metricas_matriz(matriz, rotulos)
+            por_classe.append(metricas.reset_index().assign(atributo=atributo, fonte=nome))
+
+            # Médias macro só entre as classes presentes (nos analistas ou na fonte)
+            presentes = metricas[(metricas["suporte"] > 0) | (metricas["previstos"] > 0)]
+            total = int(matriz.sum())
+            acertos = int(metricas["acertos"].sum())
+            resumo.append({"atributo": atributo, "fonte": nome, "total": total, "acertos": acertos,
+                           "taxa_acerto": acertos / total * 100 if total else np.nan,
+                           "precisao_macro": presentes["precisao"].fillna(0).mean(),
+                           "revocacao_macro": presentes["revocacao"].fillna(0).mean(),
+                           "f1_macro": presentes["f1"].fillna(0).mean(),
+                           "f1_ponderado": (metricas["f1"].fillna(0) * metricas["suporte"]).sum() / total if total else np.nan})
+
+    colunas = ["atributo", "fonte", "classe", "suporte", "previstos", "acertos", "precisao", "revocacao", "f1"]
+    return {"resumo": pd.DataFrame(resumo).set_index(["atributo", "fonte"]) if resumo else pd.DataFrame(),
+            "por_classe": pd.concat(por_classe, ignore_index=True)[colunas].set_index(["atributo", "fonte", "classe"]) if por_classe else pd.DataFrame(),
+            "matrizes": matrizes}
+
+
+
+# Imprime as tabelas de uma avaliação
+def imprime_avaliacao(avaliacao):
+    """
+    avaliacao: retorno de avalia_fontes
+    """
+
+    with pd.option_context("display.max_rows", None, "display.max_columns", None, "display.width", 200, "display.float_format", "{:.3f}".format):
+        print("\nResumo por atributo e fonte (taxa de acerto em porcentagem)")
+        print(avaliacao["resumo"])
+        for atributo, tabela in avaliacao["por_classe"].groupby(level="atributo", sort=False):
+            print(f"\nPrecisão, revocação e F1 por classe - {atributo}")
+            presentes = tabela[(tabela["suporte"] > 0) | (tabela["previstos"] > 0)]
+            print(presentes.droplevel("atributo"))
+        for (atributo, fonte), matriz in avaliacao["matrizes"].items():
+            presentes = (matriz.sum(axis=0) > 0) | (matriz.sum(axis=1) > 0)
+            print(f"\nMatriz de confusão - {atributo} - {fonte} (linhas: analistas, colunas: {fonte})")
+            print(matriz.loc[presentes.values, presentes.values])
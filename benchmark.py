@@ -0,0 +1,446 @@
+import os
+import io
+import sys
+import json
+import platform
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+import contextlib
+from time import perf_counter
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import rasterio as rio
+import shapely
+from rasterio.transform import from_origin
+from tabela_classes import DICT_CLASSES, TAXONOMIA_NOMES
+from cache_estradas import prefetch_estradas
+from indice_estradas import constroi_indice_estradas
+from agendador_areas import itera_areas
+from instrumentacao import pico_rss
+from auto_landcover_tools import (preenche_atributos_raster, preenche_atributos_vetorial, gera_buffer, grau_para_utm,
+                                  busca_estradas, filtra_estradas_pavimentadas, analisa_resultados)
+
+###########################################################################
+# Benchmark dos caminhos críticos com dados sintéticos (sem banco de dados, sem rasters nacionais e sem rede)
+# Gera rasters categóricos, talhões agrupados em áreas de interesse, estradas no formato do OSM e resultados
+# de valoração em escalas configuráveis; mede vazão (talhões por segundo) e pico de memória de cada caso
+# e compara com uma base gravada anteriormente, apontando regressões
+# Também mede o tempo de importação dos módulos em um processo novo (o custo de iniciar cada worker)
+
+# Arquivo padrão da base de comparação
+CAMINHO_BASE = "benchmark_base.json"
+
+# Escalas padrão (número de talhões)
+TAMANHOS = [1000, 5000, 20000]
+
+# Variação tolerada em relação à base antes de apontar regressão (fração)
+TOLERANCIA = 0.25
+
+# Parâmetros dos dados sintéticos
+TALHOES_POR_AREA = 50
+RESOLUCAO_GRAUS = 0.00027          # ~30 m
+LADO_1000_TALHOES = 0.5            # lado, em graus, da região com 1000 talhões (a densidade é mantida nas outras escalas)
+ORIGEM = (-50.0, -12.0)            # canto superior esquerdo da região (fuso 22S)
+MAX_AREAS_POR_CASO = 200           # casos chamados por área usam no máximo esse número de áreas
+
+# Módulos com a importação medida e pacotes que não podem ser carregados na importação (só na primeira chamada que os usa)
+MODULOS_IMPORTACAO = ["processa_landcover", "auto_landcover_tools", "verifica_valoracoes", "autolandcover"]
+IMPORTACOES_TARDIAS = ["osmnx", "scipy", "sqlalchemy", "dotenv"]
+
+
+
+##### Geradores sintéticos
+
+# Extensão (xmin, ymin, xmax, ymax) da região sintética para o número de talhões
+def regiao_sintetica(n_talhoes):
+    lado = LADO_1000_TALHOES * np.sqrt(n_talhoes / 1000)
+    return ORIGEM[0], ORIGEM[1] - lado, ORIGEM[0] + lado, ORIGEM[1]
+
+
+
+# Raster categórico com manchas de classes (como um mapa de uso e cobertura)
+def gera_raster_sintetico(caminho, bbox, fonte="mapbiomas", tamanho_mancha=40, fracao_sem_dado=0.02, semente=0):
+    """
+    caminho: GeoTIFF de saída (string)
+    bbox: extensão em wgs84 (xmin, ymin, xmax, ymax)
+    fonte: dicionário de classes cujos códigos são sorteados (DICT_CLASSES)
+    tamanho_mancha: lado das manchas de uma mesma classe, em pixels (int)
+    fracao_sem_dado: fração dos pixels com 255 (float)
+    semente: semente do sorteio (int)
+    """
+
+    rng = np.random.default_rng(semente)
+    codigos = np.array([codigo for codigo in DICT_CLASSES[fonte] if codigo != 255], dtype=np.uint8)
+    largura = int(np.ceil((bbox[2] - bbox[0]) / RESOLUCAO_GRAUS))
+    altura = int(np.ceil((bbox[3] - bbox[1]) / RESOLUCAO_GRAUS))
+    manchas = rng.choice(codigos, size=(altura // tamanho_mancha + 1, largura // tamanho_mancha + 1))
+
+    perfil = {"driver": "GTiff", "width": largura, "height": altura, "count": 1, "dtype": "uint8", "nodata": 255,
+              "crs": "EPSG:4326", "transform": from_origin(bbox[0], bbox[3], RESOLUCAO_GRAUS, RESOLUCAO_GRAUS),
+              "tiled": True, "blockxsize": 512, "blockysize": 512, "compress": "deflate"}
+    with rio.open(caminho, "w", **perfil) as raster:
+        # Escrita por faixas de blocos, para não montar o raster inteiro em memória
+        for linha in range(0, altura, 512):
+            linhas = np.arange(linha, min(linha + 512, altura))
+            faixa = manchas[linhas // tamanho_mancha][:, np.arange(largura) // tamanho_mancha]
+            faixa[rng.random(faixa.shape) < fracao_sem_dado] = 255
+            raster.write(faixa, 1, window=rio.windows.Window(0, linha, largura, len(linhas)))
+    return caminho
+
+
+
+# Talhões (quadriláteros irregulares) agrupados em áreas de interesse
+def gera_talhoes_sinteticos(n_talhoes, bbox, talhoes_por_area=TALHOES_POR_AREA, lado_medio_m=400, semente=0):
+    """
+    n_talhoes: número de talhões (int)
+    bbox: extensão em wgs84 (xmin, ymin, xmax, ymax)
+    talhoes_por_area: número de talhões de cada área de interesse (int)
+    lado_medio_m: lado médio dos talhões, em metros (float)
+    semente: semente do sorteio (int)
+    Retorna GeoDataFrame (wgs84) com id, interest_area_id e geometry
+    """
+
+    rng = np.random.default_rng(semente)
+    n_areas = int(np.ceil(n_talhoes / talhoes_por_area))
+    lado = lado_medio_m / 111000
+    colunas_grade = int(np.ceil(np.sqrt(talhoes_por_area)))
+
+    # Cada área é uma grade de talhões vizinhos em torno de um centro sorteado
+    area = np.arange(n_talhoes) // talhoes_por_area
+    posicao = np.arange(n_talhoes) % talhoes_por_area
+    margem = colunas_grade * lado
+    centros_x = rng.uniform(bbox[0] + margem, bbox[2] - margem, n_areas)[area]
+    centros_y = rng.uniform(bbox[1] + margem, bbox[3] - margem, n_areas)[area]
+    x0 = centros_x + (posicao % colunas_grade - colunas_grade / 2) * lado * 1.1
+    y0 = centros_y + (posicao // colunas_grade - colunas_grade / 2) * lado * 1.1
+
+    # Quadriláteros com lados sorteados e vértices deslocados
+    larguras = lado * rng.uniform(0.6, 1.0, n_talhoes)
+    alturas = lado * rng.uniform(0.6, 1.0, n_talhoes)
+    cantos_x = np.column_stack([x0, x0 + larguras, x0 + larguras, x0])
+    cantos_y = np.column_stack([y0, y0, y0 + alturas, y0 + alturas])
+    cantos_x += rng.uniform(-0.1, 0.1, cantos_x.shape) * larguras[:, np.newaxis]
+    cantos_y += rng.uniform(-0.1, 0.1, cantos_y.shape) * alturas[:, np.newaxis]
+    coordenadas = np.stack([cantos_x, cantos_y], axis=-1)
+    geometrias = shapely.polygons(np.concatenate([coordenadas, coordenadas[:, :1]], axis=1))
+
+    return gpd.GeoDataFrame({"id": np.arange(n_talhoes), "interest_area_id": area}, geometry=geometrias, crs="EPSG:4326")
+
+
+
+# Feições de uma fonte vetorial (coluna "cultura"): parte dos talhões ampliados e polígonos aleatórios
+def gera_fonte_vetorial_sintetica(talhoes, fracao_talhoes=0.6, semente=0):
+    rng = np.random.default_rng(semente)
+    nomes = np.array(sorted(set(DICT_CLASSES["mapbiomas"].values()) - {"nodata"}), dtype=object)
+    escolhidos = talhoes.sample(frac=fracao_talhoes, random_state=semente)
+    centroides = shapely.centroid(np.asarray(escolhidos.geometry.values))
+    geometrias = shapely.buffer(np.asarray(escolhidos.geometry.values), 0.00005)
+    aleatorios = shapely.buffer(centroides, rng.uniform(0.001, 0.003, len(centroides)), quad_segs=2)
+    geometrias = np.concatenate([geometrias, aleatorios[: len(aleatorios) // 4]])
+    return gpd.GeoDataFrame({"cultura": rng.choice(nomes, len(geometrias))}, geometry=geometrias, crs="EPSG:4326")
+
+
+
+# Estradas no formato retornado pelo OSM (linhas em passeio aleatório)
+def gera_estradas_sinteticas(bbox, n_estradas=None, vertices=30, semente=0):
+    """
+    bbox: extensão em wgs84 (xmin, ymin, xmax, ymax)
+    n_estradas: número de estradas (int); por padrão, proporcional à extensão
+    vertices: vértices de cada estrada (int)
+    semente: semente do sorteio (int)
+    Retorna GeoDataFrame (wgs84) com as colunas de cache_estradas.COLUNAS_ESTRADAS
+    """
+
+    rng = np.random.default_rng(semente)
+    if n_estradas is None:
+        n_estradas = max(10, int(40 * (bbox[2] - bbox[0]) * (bbox[3] - bbox[1]) / LADO_1000_TALHOES ** 2))
+    inicio = np.column_stack([rng.uniform(bbox[0], bbox[2], n_estradas), rng.uniform(bbox[1], bbox[3], n_estradas)])
+    passos = rng.normal(0, 0.01, (n_estradas, vertices, 2)) + rng.normal(0, 0.01, (n_estradas, 1, 2))
+    coordenadas = inicio[:, np.newaxis, :] + np.cumsum(passos, axis=1)
+
+    pavimento = rng.choice(["paved", "asphalt", "unpaved", None], n_estradas, p=[0.3, 0.2, 0.3, 0.2])
+    ref = np.where(rng.random(n_estradas) < 0.2, [f"BR-{numero}" for numero in rng.integers(10, 499, n_estradas)], None)
+    return gpd.GeoDataFrame({"element_type": "way", "osmid": np.arange(n_estradas), "highway": "primary",
+                             "ref": ref, "surface": pavimento},
+                            geometry=shapely.linestrings(coordenadas), crs="EPSG:4326")
+
+
+
+# Resultados de valoração dos analistas e das três fontes, no formato usado por analisa_resultados
+def gera_resultados_sinteticos(talhoes, semente=0):
+    rng = np.random.default_rng(semente)
+    n = len(talhoes)
+    nomes_analistas = np.array([nome for nome in TAXONOMIA_NOMES if nome.isupper()], dtype=object)
+    resultados = []
+    for nomes in [nomes_analistas] + [np.array(list(DICT_CLASSES[fonte].values()), dtype=object) for fonte in ["mapbiomas", "simfaz", "agrosatelite"]]:
+        resultados.append(pd.DataFrame({"id": talhoes["id"].values,
+                                        "class": rng.choice(nomes, n),
+                                        "irrigation": rng.choice(["YES", "NO", "NODATA"], n),
+                                        "paved_road": rng.choice(["TOUCH_ROAD", "10KM_ROAD", "NO", None], n)}))
+    return resultados
+
+
+
+##### Casos
+
+# Dados de uma escala: arquivos em diretorio e objetos já montados (a preparação não entra na medição)
+def prepara_dados(n_talhoes, diretorio, semente=0):
+    bbox = regiao_sintetica(n_talhoes)
+    talhoes = gera_talhoes_sinteticos(n_talhoes, bbox, semente=semente)
+    estradas = gera_estradas_sinteticas(bbox, semente=semente)
+    caminho_estradas = os.path.join(diretorio, "estradas.gpkg")
+    estradas.to_file(caminho_estradas, driver="GPKG")
+
+    diretorio_cache = os.path.join(diretorio, "cache_estradas")
+    with contextlib.redirect_stdout(io.StringIO()):
+        prefetch_estradas(shapely.box(bbox[0] - 0.2, bbox[1] - 0.2, bbox[2] + 0.2, bbox[3] + 0.2), diretorio=diretorio_cache,
+                          arquivo_origem=caminho_estradas)
+
+    areas = [area for _, area in itera_areas(talhoes)]
+    return {"talhoes": talhoes,
+            "areas": areas[:MAX_AREAS_POR_CASO],
+            "raster_lulc": gera_raster_sintetico(os.path.join(diretorio, "lulc.tif"), bbox, "mapbiomas", semente=semente),
+            "raster_irrigacao": gera_raster_sintetico(os.path.join(diretorio, "irrigacao.tif"), bbox, "irrigacao", tamanho_mancha=80, semente=semente + 1),
+            "fonte_vetorial": gera_fonte_vetorial_sintetica(talhoes, semente=semente),
+            "indice_estradas": constroi_indice_estradas(filtra_estradas_pavimentadas(estradas)),
+            "cache_estradas": diretorio_cache,
+            "resultados": gera_resultados_sinteticos(talhoes, semente=semente)}
+
+
+
+# Casos medidos: nome -> (função que recebe os dados, se a função é chamada por área de interesse)
+def _caso_raster(dados):
+    for area in dados["areas"]:
+        preenche_atributos_raster(area, dados["raster_lulc"], dados["raster_irrigacao"], "mapbiomas")
+
+
+def _caso_vetorial(dados):
+    preenche_atributos_vetorial(dados["talhoes"], [dados["fonte_vetorial"]])
+
+
+def _caso_buffer(dados):
+    for area in dados["areas"]:
+        gera_buffer(area, 10000)
+
+
+def _caso_utm(dados):
+    for area in dados["areas"]:
+        grau_para_utm(area)
+
+
+def _caso_estradas_indice(dados):
+    busca_estradas(dados["talhoes"], roads_in=dados["indice_estradas"])
+
+
+def _caso_estradas_cache(dados):
+    for area in dados["areas"]:
+        busca_estradas(area.copy(), diretorio_cache=dados["cache_estradas"], offline=True)
+
+
+def _caso_analise(dados):
+    analisa_resultados(*dados["resultados"])
+
+
+CASOS = {"preenche_atributos_raster": (_caso_raster, True),
+         "preenche_atributos_vetorial": (_caso_vetorial, False),
+         "gera_buffer": (_caso_buffer, True),
+         "grau_para_utm": (_caso_utm, True),
+         "busca_estradas_indice": (_caso_estradas_indice, False),
+         "busca_estradas_cache": (_caso_estradas_cache, True),
+         "analisa_resultados": (_caso_analise, False)}
+
+
+
+##### Medição
+
+# Mede o tempo de importação de cada módulo em um processo novo (como um worker iniciado por spawn)
+def mede_importacao(modulos=MODULOS_IMPORTACAO, repeticoes=3):
+    """
+    modulos: módulos importados (lista)
+    repeticoes: número de processos por módulo (int; vale o menor tempo)
+    Retorna um dicionário "importacao|módulo" -> {segundos, tardios}; tardios lista os pacotes de IMPORTACOES_TARDIAS carregados
+    """
+
+    resultados = {}
+    for modulo in modulos:
+        codigo = (f"import sys, time; inicio = time.perf_counter(); import {modulo}; segundos = time.perf_counter() - inicio; "
+                  f"print(segundos, *[pacote for pacote in {IMPORTACOES_TARDIAS!r} if pacote in sys.modules])")
+        tempos = []
+        for _ in range(repeticoes):
+            saida = subprocess.run([sys.executable, "-c", codigo], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                   capture_output=True, text=True, check=True).stdout.split()
+            tempos.append(float(saida[0]))
+        resultados[f"importacao|{modulo}"] = {"segundos": round(min(tempos), 4), "tardios": saida[1:]}
+        print(f"  importacao {modulo}: {resultados[f'importacao|{modulo}']}")
+    return resultados
+
+
+
+
+# Mede um caso: menor tempo entre as repetições e pico de memória alocada pelo Python/NumPy (tracemalloc)
+def mede_caso(funcao, dados, repeticoes=1, memoria=True):
+    """
+    funcao: função do caso (recebe os dados)
+    dados: retorno de prepara_dados (ou subconjunto)
+    repeticoes: número de execuções cronometradas (int)
+    memoria: se True, faz uma execução extra com tracemalloc para o pico de memória (booleano)
+    Retorna (segundos, pico em MB ou None)
+    """
+
+    with open(os.devnull, "w") as nulo, contextlib.redirect_stdout(nulo):
+        tempos = []
+        for _ in range(repeticoes):
+            inicio = perf_counter()
+            funcao(dados)
+            tempos.append(perf_counter() - inicio)
+
+        pico = None
+        if memoria:
+            tracemalloc.start()
+            funcao(dados)
+            pico = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+            tracemalloc.stop()
+
+    return min(tempos), pico
+
+
+
+# Executa todos os casos em todas as escalas
+def executa_benchmark(tamanhos=TAMANHOS, casos=None, repeticoes=1, memoria=True, semente=0):
+    """
+    tamanhos: números de talhões (lista)
+    casos: nomes dos casos a executar (lista; None executa todos)
+    repeticoes: número de execuções cronometradas de cada caso (int)
+    memoria: se True, mede o pico de memória (booleano)
+    semente: semente dos dados sintéticos (int)
+    Retorna um dicionário "caso|talhões" -> {talhoes, segundos, talhoes_s, pico_mb} (e os de mede_importacao, se selecionado)
+    """
+
+    resultados = {}
+    if casos is None or "importacao" in casos:
+        print("Medindo o tempo de importação dos módulos")
+        resultados.update(mede_importacao(repeticoes=max(repeticoes, 3)))
+
+    # Sem nenhum caso selecionado, os dados sintéticos não são gerados
+    if casos is not None and not any(nome in casos for nome in CASOS):
+        return resultados
+
+    for n_talhoes in tamanhos:
+        with tempfile.TemporaryDirectory(prefix="benchmark_autolandcover_") as diretorio:
+            print(f"Gerando dados sintéticos: {n_talhoes} talhões")
+            dados = prepara_dados(n_talhoes, diretorio, semente=semente)
+
+            for nome, (funcao, por_area) in CASOS.items():
+                if casos is not None and nome not in casos:
+                    continue
+
+                # Aquecimento com a primeira área (abertura dos rasters, transformadores do pyproj, imports tardios)
+                with open(os.devnull, "w") as nulo, contextlib.redirect_stdout(nulo):
+                    funcao({**dados, "talhoes": dados["areas"][0], "areas": dados["areas"][:1]})
+
+                segundos, pico = mede_caso(funcao, dados, repeticoes=repeticoes, memoria=memoria)
+                talhoes_medidos = sum(len(area) for area in dados["areas"]) if por_area else len(dados["talhoes"])
+                resultados[f"{nome}|{n_talhoes}"] = {"talhoes": talhoes_medidos, "segundos": round(segundos, 4),
+                                                     "talhoes_s": round(talhoes_medidos / segundos, 1),
+                                                     "pico_mb": round(pico, 1) if pico is not None else None}
+                print(f"  {nome}: {resultados[f'{nome}|{n_talhoes}']}")
+
+    return resultados
+
+
+
+# Compara os resultados com a base
+def compara_com_base(resultados, base, tolerancia=TOLERANCIA):
+    """
+    resultados: retorno de executa_benchmark
+    base: resultados gravados anteriormente (mesmo formato)
+    tolerancia: variação tolerada (fração)
+    Retorna DataFrame com a comparação de cada caso presente nos dois e a coluna "regressao"
+    """
+
+    linhas = []
+    for chave, atual in resultados.items():
+        if chave not in base:
+            continue
+        anterior = base[chave]
+        if "talhoes_s" in atual:
+            variacao_vazao = atual["talhoes_s"] / anterior["talhoes_s"] - 1
+        else:
+            variacao_vazao = anterior["segundos"] / atual["segundos"] - 1     # importação: vazão = inverso do tempo
+        variacao_memoria = None
+        if atual.get("pico_mb") is not None and anterior.get("pico_mb"):
+            variacao_memoria = atual["pico_mb"] / anterior["pico_mb"] - 1
+        linhas.append({"caso": chave, "talhoes_s_base": anterior.get("talhoes_s"), "talhoes_s": atual.get("talhoes_s"),
+                       "variacao_vazao": round(variacao_vazao, 3),
+                       "pico_mb_base": anterior.get("pico_mb"), "pico_mb": atual.get("pico_mb"),
+                       "variacao_memoria": round(variacao_memoria, 3) if variacao_memoria is not None else None,
+                       "regressao": (variacao_vazao < -tolerancia or (variacao_memoria is not None and variacao_memoria > tolerancia)
+                                     or bool(atual.get("tardios")))})
+    return pd.DataFrame(linhas)
+
+
+
+# Identificação da máquina gravada junto com a base (bases de máquinas diferentes não são comparáveis)
+def _maquina():
+    return {"python": platform.python_version(), "sistema": platform.platform(), "processador": platform.processor(),
+            "cpus": os.cpu_count(), "numpy": np.__version__, "gdal": rio.__gdal_version__, "shapely": shapely.__version__}
+
+
+
+# Linha de comando (python benchmark.py ou autolandcover benchmark); retorna 1 se houver regressão
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Benchmark dos caminhos críticos com dados sintéticos (offline)")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=TAMANHOS, help="números de talhões")
+    parser.add_argument("--casos", nargs="+", choices=list(CASOS) + ["importacao"], help="casos a executar (padrão: todos)")
+    parser.add_argument("--repeticoes", type=int, default=1, help="execuções cronometradas de cada caso (vale a menor)")
+    parser.add_argument("--sem-memoria", action="store_true", help="não mede o pico de memória (evita a execução extra)")
+    parser.add_argument("--base", default=CAMINHO_BASE, help="arquivo JSON da base de comparação")
+    parser.add_argument("--grava-base", action="store_true", help="grava os resultados como nova base")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA, help="variação tolerada antes de apontar regressão")
+    parser.add_argument("--saida", help="arquivo JSON com os resultados desta execução")
+    argumentos = parser.parse_args(argv)
+
+    resultados = executa_benchmark(argumentos.tamanhos, argumentos.casos, argumentos.repeticoes, not argumentos.sem_memoria)
+    if pico_rss() is not None:
+        print(f"\nPico de memória residente do processo: {pico_rss() / 1024 ** 2:.0f} MB")
+
+    tabela = pd.DataFrame(resultados).T
+    print(tabela)
+
+    if argumentos.saida:
+        with open(argumentos.saida, "w", encoding="utf-8") as arquivo:
+            json.dump({"maquina": _maquina(), "resultados": resultados}, arquivo, indent=2)
+
+    regressao = False
+    if argumentos.grava_base:
+        base = {}
+        if os.path.exists(argumentos.base):
+            with open(argumentos.base, encoding="utf-8") as arquivo:
+                base = json.load(arquivo)["resultados"]
+        base.update(resultados)
+        with open(argumentos.base, "w", encoding="utf-8") as arquivo:
+            json.dump({"maquina": _maquina(), "resultados": base}, arquivo, indent=2)
+        print(f"Base gravada em {argumentos.base}")
+    elif os.path.exists(argumentos.base):
+        with open(argumentos.base, encoding="utf-8") as arquivo:
+            base = json.load(arquivo)
+        if base["maquina"] != _maquina():
+            print("Atenção: a base foi gravada em outra máquina/ambiente; a comparação é apenas indicativa")
+        comparacao = compara_com_base(resultados, base["resultados"], argumentos.tolerancia)
+        print("\nComparação com a base:")
+        print(comparacao.to_string(index=False) if len(comparacao) else "Nenhum caso em comum com a base")
+        regressao = bool(len(comparacao)) and bool(comparacao["regressao"].any())
+        if regressao:
+            print("\nREGRESSÃO: " + ", ".join(comparacao.loc[comparacao["regressao"], "caso"]))
+    else:
+        print(f"Base {argumentos.base} não encontrada; use --grava-base para gravar a primeira")
+
+    return 1 if regressao else 0
+
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+import shapely
+from rasterio.enums import MaskFlags
+from rasterio.windows import Window
+from pool_rasters import abre_raster, le_janela
+from validacao_geometrias import tem_geometria
+from instrumentacao import log, etapa, conta, coleta_instrumentacao, incorpora_instrumentacao
+
+###########################################################################
+# Blocos de raster decodificados uma única vez por lote, em memória compartilhada pelos processos
+# As áreas de interesse do lote que tocam os mesmos blocos são agrupadas em regiões; cada região é decodificada
+# (por um único processo) em um arquivo mapeado em memória (np.memmap, em /dev/shm quando existe) e os workers
+# leem as janelas das suas áreas como visões desse arquivo (pool_rasters.regioes_compartilhadas).
+# As páginas do arquivo são as mesmas para todos os processos: a memória das regiões não cresce com o número
+# de workers e nenhum bloco das regiões é descomprimido mais de uma vez
+
+DIRETORIO_PADRAO = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+
+
+# Janela em pixels (coluna inicial, linha inicial, coluna final, linha final) de cada área de interesse em um raster
+def janelas_areas(geometrias, ids_areas, raster):
+    """
+    geometrias: GeoSeries dos talhões no SRC do raster
+    ids_areas: área de interesse de cada talhão (array)
+    raster: dataset obtido com abre_raster
+    Retorna um DataFrame indexado pela área (mesma regra de recorte de auto_landcover_tools.rasteriza_talhoes)
+    """
+
+    com_geometria = tem_geometria(geometrias.values)
+    xmin, ymin, xmax, ymax = shapely.bounds(geometrias.values[com_geometria]).T
+    limites = pd.DataFrame({"xmin": xmin, "ymin": ymin, "xmax": xmax, "ymax": ymax}, index=np.asarray(ids_areas)[com_geometria])
+    limites = limites.groupby(level=0).agg({"xmin": "min", "ymin": "min", "xmax": "max", "ymax": "max"})
+
+    transform = raster.transform
+    colunas_a, linhas_a = ~transform * (limites["xmin"].values, limites["ymax"].values)
+    colunas_b, linhas_b = ~transform * (limites["xmax"].values, limites["ymin"].values)
+    janelas = pd.DataFrame({"col_ini": np.clip(np.floor(np.minimum(colunas_a, colunas_b)), 0, raster.width),
+                            "lin_ini": np.clip(np.floor(np.minimum(linhas_a, linhas_b)), 0, raster.height),
+                            "col_fim": np.clip(np.ceil(np.maximum(colunas_a, colunas_b)), 0, raster.width),
+                            "lin_fim": np.clip(np.ceil(np.maximum(linhas_a, linhas_b)), 0, raster.height)},
+                           index=limites.index).astype(np.int64)
+    return janelas[(janelas["col_fim"] > janelas["col_ini"]) & (janelas["lin_fim"] > janelas["lin_ini"])]
+
+
+
+# Agrupa em regiões as janelas das áreas que tocam os mesmos blocos internos do raster
+def agrupa_janelas(janelas, altura_bloco, largura_bloco):
+    """
+    janelas: retorno de janelas_areas
+    altura_bloco, largura_bloco: dimensões dos blocos internos do raster (int)
+    Retorna uma lista com (janela da região, ids das áreas da região)
+    """
+
+    # Blocos tocados por cada janela; janelas com algum bloco em comum ficam na mesma região
+    # (componentes conexas da união das caixas, recuadas para que blocos só vizinhos não se juntem)
+    caixas = shapely.box(janelas["col_ini"] // largura_bloco + 0.25, janelas["lin_ini"] // altura_bloco + 0.25,
+                         -(-janelas["col_fim"] // largura_bloco) - 0.25, -(-janelas["lin_fim"] // altura_bloco) - 0.25)
+    componentes = shapely.get_parts(shapely.union_all(caixas))
+    idx_caixa, idx_componente = shapely.STRtree(componentes).query(caixas, predicate="covered_by")
+    componente = np.empty(len(janelas), dtype=np.int64)
+    componente[idx_caixa] = idx_componente
+
+    regioes = []
+    for _, janelas_componente in janelas.groupby(componente):
+        col_ini, lin_ini = janelas_componente["col_ini"].min(), janelas_componente["lin_ini"].min()
+        janela = Window(col_ini, lin_ini, janelas_componente["col_fim"].max() - col_ini, janelas_componente["lin_fim"].max() - lin_ini)
+        regioes.append((janela, janelas_componente.index.tolist()))
+    return regioes
+
+
+
+# Escolhe as regiões do lote que serão decodificadas em memória compartilhada
+def planeja_regioes(areas_de_interesse, caminhos, memoria_mb=2048, minimo_areas=2, coluna_area="interest_area_id"):
+    """
+    areas_de_interesse: GeoDataFrame com os talhões do lote
+    caminhos: rasters lidos pelas áreas (lista)
+    memoria_mb: limite da soma das regiões decodificadas do lote, em megabytes (int)
+    minimo_areas: número mínimo de áreas em uma região (regiões de uma área só não evitam nenhuma decodificação repetida)
+    coluna_area: coluna com o id da área de interesse
+    Retorna uma lista de dicionários com caminho, nome, banda, janela, dtype e áreas de cada região, as mais usadas primeiro
+    """
+
+    candidatas = []
+    geometrias_src = {}
+    for caminho in dict.fromkeys(caminhos):
+        raster = abre_raster(caminho)
+
+        # A visão compartilhada reproduz a máscara do raster.read só quando ela vem do valor "nodata"
+        if not set(raster.mask_flag_enums[0]) <= {MaskFlags.nodata, MaskFlags.all_valid}:
+            log(f"{caminho}: máscara que não vem do valor nodata, lido sem memória compartilhada", "DEBUG")
+            continue
+
+        # Reprojeta os talhões uma única vez por SRC
+        chave_src = raster.crs.to_wkt()
+        if chave_src not in geometrias_src:
+            geometrias_src[chave_src] = areas_de_interesse.geometry.to_crs(raster.crs)
+        janelas = janelas_areas(geometrias_src[chave_src], areas_de_interesse[coluna_area].values, raster)
+        if len(janelas) == 0:
+            continue
+
+        altura_bloco, largura_bloco = raster.block_shapes[0]
+        tamanho_pixel = np.dtype(raster.dtypes[0]).itemsize
+        for janela, areas in agrupa_janelas(janelas, altura_bloco, largura_bloco):
+            if len(areas) >= minimo_areas:
+                candidatas.append({"caminho": caminho, "nome": raster.name, "banda": 1,
+                                   "janela": (int(janela.col_off), int(janela.row_off), int(janela.width), int(janela.height)),
+                                   "dtype": raster.dtypes[0], "areas": areas,
+                                   "bytes": int(janela.width) * int(janela.height) * tamanho_pixel})
+
+    # Regiões com mais áreas primeiro, até o limite de memória (as que não cabem são lidas direto pelos workers)
+    regioes = []
+    disponivel = memoria_mb * 1024 * 1024
+    for regiao in sorted(candidatas, key=lambda candidata: -len(candidata["areas"])):
+        if regiao["bytes"] <= disponivel:
+            regioes.append(regiao)
+            disponivel -= regiao["bytes"]
+    return regioes
+
+
+
+#################################################################################
+# Decodifica uma região no seu arquivo mapeado (executada nos workers, uma região por tarefa)
+def decodifica_regiao(regiao):
+    """
+    regiao: dicionário de planeja_regioes com o caminho do arquivo de destino ("arquivo")
+    Retorna a instrumentação coletada no processo (como as tarefas de área)
+    """
+
+    raster = abre_raster(regiao["caminho"])
+    coluna, linha, largura, altura = regiao["janela"]
+    with etapa("decodificacao_compartilhada", raster=regiao["caminho"]):
+        array = np.memmap(regiao["arquivo"], dtype=regiao["dtype"], mode="w+", shape=(altura, largura))
+        le_janela(raster, Window(coluna, linha, largura, altura), regiao["banda"], out=array)
+        array.flush()
+        del array
+    return coleta_instrumentacao()
+
+
+
+# Decodifica as regiões compartilhadas do lote e monta os descritores de cada área
+def prepara_regioes(areas_de_interesse, caminhos, mapeia=map, diretorio=None, memoria_mb=2048, coluna_area="interest_area_id"):
+    """
+    areas_de_interesse: GeoDataFrame com os talhões do lote
+    caminhos: rasters lidos pelas áreas (lista)
+    mapeia: map ou executor.map (as regiões são decodificadas em paralelo pelos próprios workers)
+    diretorio (opcional): diretório dos arquivos das regiões (padrão /dev/shm, quando existe)
+    memoria_mb: limite da soma das regiões decodificadas do lote, em megabytes (int)
+    Retorna (diretório temporário do lote ou None, dicionário área -> descritores para pool_rasters.regioes_compartilhadas)
+    """
+
+    regioes = planeja_regioes(areas_de_interesse, caminhos, memoria_mb=memoria_mb, coluna_area=coluna_area)
+    if not regioes:
+        return None, {}
+
+    diretorio_lote = tempfile.mkdtemp(prefix="autolandcover_blocos_", dir=diretorio or DIRETORIO_PADRAO)
+    for posicao, regiao in enumerate(regioes):
+        regiao["arquivo"] = os.path.join(diretorio_lote, f"regiao_{posicao}.bin")
+    with etapa("decodificacao_compartilhada_lote", regioes=len(regioes)):
+        for instrumentacao_regiao in mapeia(decodifica_regiao, regioes):
+            incorpora_instrumentacao(instrumentacao_regiao)
+
+    descritores = {}
+    for regiao in regioes:
+        descritor = {chave: regiao[chave] for chave in ("nome", "banda", "janela", "dtype", "arquivo")}
+        for area in regiao["areas"]:
+            descritores.setdefault(area, []).append(descritor)
+    conta("regioes_compartilhadas", len(regioes))
+    conta("bytes_compartilhados", sum(regiao["bytes"] for regiao in regioes))
+    log(f"{len(regioes)} regiões compartilhadas ({sum(regiao['bytes'] for regiao in regioes) / 2**20:.0f} MB) "
+        f"cobrindo {len(descritores)} áreas", "DEBUG")
+    return diretorio_lote, descritores
+
+
+
+# Remove os arquivos das regiões de um lote
+def libera_regioes(diretorio_lote):
+    """
+    diretorio_lote: diretório retornado por prepara_regioes (None não faz nada)
+    """
+
+    if diretorio_lote is not None:
+        shutil.rmtree(diretorio_lote, ignore_errors=True)
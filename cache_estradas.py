@@ -0,0 +1,203 @@
+import os
+import math
+import argparse
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from instrumentacao import log, conta
+
+###########################################################################
+# Cache local das estradas do OpenStreetMap (tag "highway"), em tiles de uma grade fixa em graus
+# Cada tile é um GeoPackage em DIRETORIO_CACHE; tiles sem estradas ficam marcados com um arquivo ".vazio"
+
+TAMANHO_TILE = 0.25                         # tamanho do tile em graus (wgs84)
+DIRETORIO_CACHE = "cache_estradas"
+COLUNAS_ESTRADAS = ["element_type", "osmid", "highway", "ref", "surface", "geometry"]
+
+_osmnx = {"configurado": False}
+
+
+
+# osmnx importado (e configurado) só na primeira consulta ao OSM: a importação é lenta e o cache offline não precisa dela
+def importa_osmnx():
+    import osmnx as ox
+
+    if not _osmnx["configurado"]:
+        ox.config(requests_kwargs={"verify":False})     # Config específica para a lib osmnx
+        _osmnx["configurado"] = True
+    return ox
+
+
+
+# Tiles (coluna, linha) da grade que intersectam a geometria (em wgs84)
+def tiles_da_geometria(geometria):
+    """
+    geometria: geometria shapely em wgs84
+    Retorna lista de tuplas (coluna, linha) dos tiles
+    """
+
+    xmin, ymin, xmax, ymax = geometria.bounds
+    colunas = range(math.floor(xmin / TAMANHO_TILE), math.floor(xmax / TAMANHO_TILE) + 1)
+    linhas = range(math.floor(ymin / TAMANHO_TILE), math.floor(ymax / TAMANHO_TILE) + 1)
+    tiles = [(coluna, linha) for coluna in colunas for linha in linhas]
+
+    # Descarta os tiles do envelope que não tocam a geometria
+    caixas = np.array([_caixa_tile(tile) for tile in tiles])
+    return [tile for tile, toca in zip(tiles, shapely.intersects(caixas, geometria)) if toca]
+
+
+
+# Polígono do tile
+def _caixa_tile(tile):
+    coluna, linha = tile
+    return shapely.box(coluna * TAMANHO_TILE, linha * TAMANHO_TILE, (coluna + 1) * TAMANHO_TILE, (linha + 1) * TAMANHO_TILE)
+
+
+
+# Caminho do arquivo do tile no cache
+def _caminho_tile(diretorio, tile):
+    return os.path.join(diretorio, f"osm_highway_{tile[0]}_{tile[1]}.gpkg")
+
+
+
+# Verifica se o tile já está no cache (com ou sem estradas)
+def tile_em_cache(tile, diretorio=DIRETORIO_CACHE):
+    caminho = _caminho_tile(diretorio, tile)
+    return os.path.exists(caminho) or os.path.exists(caminho + ".vazio")
+
+
+
+# Salva as estradas de um tile no cache
+def _salva_tile(gdf_estradas, tile, diretorio):
+    os.makedirs(diretorio, exist_ok=True)
+    caminho = _caminho_tile(diretorio, tile)
+    if len(gdf_estradas) == 0:
+        open(caminho + ".vazio", "w").close()
+        return
+
+    # Apenas as colunas usadas na filtragem, como texto (o OSM mistura tipos nas tags)
+    colunas = [coluna for coluna in COLUNAS_ESTRADAS if coluna in gdf_estradas.columns]
+    gdf_estradas = gdf_estradas[colunas].copy()
+    for coluna in colunas:
+        if coluna != "geometry":
+            gdf_estradas[coluna] = gdf_estradas[coluna].astype(str).where(gdf_estradas[coluna].notna(), None)
+
+    # Grava em arquivo temporário e renomeia, para não deixar tile pela metade no cache
+    temporario = caminho + ".tmp"
+    gdf_estradas.to_file(temporario, driver="GPKG")
+    os.replace(temporario, caminho)
+
+
+
+# Baixa do OSM as estradas de um tile
+def _baixa_tile_osm(tile):
+    ox = importa_osmnx()
+    from osmnx._errors import InsufficientResponseError
+
+    conta("chamadas_osm")
+    try:
+        gdf_estradas = ox.features_from_polygon(_caixa_tile(tile), tags={"highway":True})
+    except InsufficientResponseError:
+        return gpd.GeoDataFrame(columns=COLUNAS_ESTRADAS, geometry="geometry", crs="EPSG:4326")
+    return gdf_estradas.reset_index()
+
+
+
+###########################################################################
+# Pré-carrega no cache todos os tiles de uma região
+def prefetch_estradas(regiao, diretorio=DIRETORIO_CACHE, arquivo_origem=None, sobrescrever=False):
+    """
+    regiao: geometria shapely, GeoSeries ou GeoDataFrame da região (GeoSeries/GeoDataFrame em qualquer SRC, geometria em wgs84)
+    diretorio: diretório do cache (string)
+    arquivo_origem (opcional): arquivo vetorial local com estradas do OSM (ex: extrato convertido), usado no lugar da API Overpass
+    sobrescrever: se True, baixa novamente tiles que já estão no cache (booleano)
+    Retorna o número de tiles gravados
+    """
+
+    if hasattr(regiao, "crs"):
+        regiao = regiao.to_crs("EPSG:4326").unary_union
+
+    # Estradas de origem local, se informada
+    estradas_origem = None
+    if arquivo_origem is not None:
+        estradas_origem = gpd.read_file(arquivo_origem).to_crs("EPSG:4326")
+
+    gravados = 0
+    tiles = tiles_da_geometria(regiao)
+    for contador, tile in enumerate(tiles, start=1):
+        if not sobrescrever and tile_em_cache(tile, diretorio):
+            continue
+        log(f"Baixando estradas do tile {contador} de {len(tiles)} {tile}")
+        if estradas_origem is None:
+            gdf_estradas = _baixa_tile_osm(tile)
+        else:
+            gdf_estradas = estradas_origem.iloc[estradas_origem.sindex.query(_caixa_tile(tile), predicate="intersects")]
+        _salva_tile(gdf_estradas, tile, diretorio)
+        gravados += 1
+
+    return gravados
+
+
+
+# Estradas do OSM que intersectam a geometria, a partir do cache
+def estradas_do_cache(geometria, diretorio=DIRETORIO_CACHE, offline=False):
+    """
+    geometria: geometria shapely em wgs84 (ex: buffer de 10Km da área de interesse)
+    diretorio: diretório do cache (string)
+    offline: se True, nunca acessa a rede; um tile ausente gera erro (booleano)
+    Retorna GeoDataFrame (wgs84) equivalente ao ox.features_from_polygon(geometria, tags={"highway":True})
+    """
+
+    partes = []
+    for tile in tiles_da_geometria(geometria):
+        # Tile ausente: baixa do OSM ou, no modo offline, interrompe
+        if not tile_em_cache(tile, diretorio):
+            if offline:
+                raise FileNotFoundError(f"Tile {tile} de estradas não está no cache '{diretorio}' (modo offline).")
+            _salva_tile(_baixa_tile_osm(tile), tile, diretorio)
+        else:
+            conta("cache_estradas_acertos")
+
+        caminho = _caminho_tile(diretorio, tile)
+        if os.path.exists(caminho):
+            partes.append(gpd.read_file(caminho, mask=geometria))
+
+    if len(partes) == 0:
+        return gpd.GeoDataFrame(columns=COLUNAS_ESTRADAS, geometry="geometry", crs="EPSG:4326")
+
+    # Feições que cruzam a borda dos tiles aparecem em mais de um tile
+    gdf_estradas = pd.concat(partes, ignore_index=True)
+    chaves = [coluna for coluna in ["element_type", "osmid"] if coluna in gdf_estradas.columns]
+    if len(chaves) > 0:
+        gdf_estradas = gdf_estradas.drop_duplicates(subset=chaves)
+    else:
+        gdf_estradas = gdf_estradas[~gdf_estradas.geometry.to_wkb().duplicated()]
+    return gdf_estradas[gdf_estradas.intersects(geometria)].reset_index(drop=True)
+
+
+
+# Linha de comando (python cache_estradas.py ou autolandcover prefetch-roads)
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Pré-carrega no cache local os tiles de estradas do OSM de uma região")
+    regiao = parser.add_mutually_exclusive_group(required=True)
+    regiao.add_argument("--bbox", nargs=4, type=float, metavar=("XMIN", "YMIN", "XMAX", "YMAX"), help="retângulo da região (EPSG:4326)")
+    regiao.add_argument("--talhoes", help="arquivo vetorial cujos talhões (com 10Km de margem) definem a região")
+    parser.add_argument("--diretorio", default=DIRETORIO_CACHE, help="diretório do cache")
+    parser.add_argument("--origem", help="arquivo vetorial local com estradas do OSM, usado no lugar da API Overpass")
+    parser.add_argument("--sobrescrever", action="store_true", help="baixa novamente os tiles que já estão no cache")
+    argumentos = parser.parse_args(argv)
+
+    if argumentos.bbox:
+        regiao = shapely.box(*argumentos.bbox)
+    else:
+        # Margem de 10Km (~0.1 grau) para cobrir os buffers usados na busca de estradas
+        talhoes = np.asarray(gpd.read_file(argumentos.talhoes).to_crs("EPSG:4326").geometry.values)
+        regiao = shapely.union_all(shapely.buffer(shapely.envelope(talhoes), 0.1))
+    gravados = prefetch_estradas(regiao, diretorio=argumentos.diretorio, arquivo_origem=argumentos.origem, sobrescrever=argumentos.sobrescrever)
+    log(f"{gravados} tiles gravados em {argumentos.diretorio}")
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+import os
+import time
+import sqlite3
+import hashlib
+import numpy as np
+import shapely
+from instrumentacao import conta
+
+###########################################################################
+# Cache em disco dos histogramas de classes por talhão, endereçado pelo conteúdo:
+# chave = (hash do WKB da geometria normalizada no SRC do raster, impressão do raster, dicionário de classes)
+# Uma geometria já valorada (em outra execução, em outro script ou repetida em outra área) não precisa
+# ler o raster de novo: a moda e as classes possíveis saem do histograma guardado.
+# O tamanho total é limitado; ao passar do limite, as entradas usadas há mais tempo são removidas (LRU)
+
+# Diretório padrão do cache
+DIRETORIO_CACHE_HISTOGRAMAS = "cache_histogramas"
+
+_config = {"caminho": None, "tamanho_max": 0}
+_conexao = {"pid": None, "conn": None}
+_estatisticas = {"acertos": 0, "faltas": 0, "gravacoes": 0, "remocoes": 0}
+
+# Fração do limite ocupada depois de uma remoção (evita remover a cada gravação)
+_FRACAO_APOS_REMOCAO = 0.9
+
+
+
+# Ativa o cache de histogramas
+def configura_cache_histogramas(diretorio, tamanho_max_mb=1024):
+    """
+    diretorio: diretório do cache (string); None desativa o cache
+    tamanho_max_mb: tamanho máximo dos histogramas guardados, em megabytes (int)
+    """
+
+    if diretorio is None:
+        _config["caminho"] = None
+        return
+    os.makedirs(diretorio, exist_ok=True)
+    _config["caminho"] = os.path.join(diretorio, "histogramas.sqlite")
+    _config["tamanho_max"] = int(tamanho_max_mb * 1024 * 1024)
+    _conexao["pid"] = None
+
+
+
+# Verifica se o cache está ativo
+def cache_ativo():
+    return _config["caminho"] is not None
+
+
+
+# Conexão do processo atual (conexões SQLite não podem ser herdadas por processos filhos)
+def _conn():
+    if _conexao["pid"] != os.getpid():
+        conn = sqlite3.connect(_config["caminho"], timeout=60)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+                     CREATE TABLE IF NOT EXISTS histogramas (
+                         chave TEXT PRIMARY KEY,
+                         valor BLOB,
+                         tamanho INTEGER,
+                         ultimo_acesso REAL)
+                     """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_ultimo_acesso ON histogramas (ultimo_acesso)")
+
+        # Tamanho total dos histogramas (uma linha), atualizado junto com cada gravação e remoção
+        conn.execute("CREATE TABLE IF NOT EXISTS metadados (id INTEGER PRIMARY KEY CHECK (id = 0), tamanho_total INTEGER)")
+        conn.execute("INSERT OR IGNORE INTO metadados SELECT 0, COALESCE(SUM(tamanho), 0) FROM histogramas")
+        conn.commit()
+        _conexao["pid"] = os.getpid()
+        _conexao["conn"] = conn
+    return _conexao["conn"]
+
+
+
+##### Chaves
+
+# Impressão de um raster aberto (conteúdo descrito pelo tamanho, data de modificação, grade e tipo)
+def impressao_raster(raster):
+    """
+    raster: dataset aberto (rasterio)
+    """
+
+    info = os.stat(raster.name)
+    descricao = f"{info.st_size}|{info.st_mtime_ns}|{raster.crs}|{tuple(raster.transform)}|{raster.width}|{raster.height}|{raster.dtypes[0]}"
+    return hashlib.sha1(descricao.encode("utf-8")).hexdigest()
+
+
+
+# Impressão de um dicionário de classes
+def impressao_dicionario(dict_classes):
+    return hashlib.sha1(repr(sorted(dict_classes.items(), key=repr)).encode("utf-8")).hexdigest()
+
+
+
+# Chaves de um conjunto de geometrias (já no SRC do raster)
+def chaves_histogramas(geometrias, impressao_raster, impressao_dicionario):
+    """
+    geometrias: array de geometrias shapely no SRC do raster
+    impressao_raster, impressao_dicionario: retornos de impressao_raster e impressao_dicionario
+    Retorna a lista de chaves, na ordem das geometrias
+    """
+
+    sufixo = f"{impressao_raster}|{impressao_dicionario}".encode("utf-8")
+    wkbs = shapely.to_wkb(shapely.normalize(np.asarray(geometrias)))
+    return [hashlib.sha1(wkb + sufixo).hexdigest() for wkb in wkbs]
+
+
+
+##### Leitura e gravação
+
+# Serializa o histograma (fora, valores e contagens) em um único vetor int64
+def _serializa(histograma):
+    valores, contagens, fora = histograma
+    return np.concatenate([[int(fora), len(valores)], valores, contagens]).astype(np.int64).tobytes()
+
+
+
+def _desserializa(valor):
+    vetor = np.frombuffer(valor, dtype=np.int64)
+    n_valores = int(vetor[1])
+    return vetor[2:2 + n_valores], vetor[2 + n_valores:], bool(vetor[0])
+
+
+
+# Busca os histogramas de um conjunto de chaves
+def busca_histogramas(chaves):
+    """
+    chaves: lista de chaves (retorno de chaves_histogramas)
+    Retorna um dicionário chave -> (valores, contagens, fora) com as chaves encontradas
+    """
+
+    conn = _conn()
+    encontrados = {}
+    chaves_unicas = list(dict.fromkeys(chaves))
+    for inicio in range(0, len(chaves_unicas), 500):
+        lote = chaves_unicas[inicio:inicio + 500]
+        for chave, valor in conn.execute(f"SELECT chave, valor FROM histogramas WHERE chave IN ({', '.join('?' * len(lote))})", lote):
+            encontrados[chave] = _desserializa(valor)
+
+    # Atualiza o último acesso das entradas encontradas (ordem do LRU)
+    if encontrados:
+        agora = time.time()
+        conn.executemany("UPDATE histogramas SET ultimo_acesso = ? WHERE chave = ?", [(agora, chave) for chave in encontrados])
+        conn.commit()
+
+    acertos = sum(chave in encontrados for chave in chaves)
+    _estatisticas["acertos"] += acertos
+    _estatisticas["faltas"] += len(chaves) - acertos
+    conta("cache_histogramas_acertos", acertos)
+    conta("cache_histogramas_faltas", len(chaves) - acertos)
+    return encontrados
+
+
+
+# Grava histogramas e remove os menos usados se o cache passar do limite
+def grava_histogramas(histogramas):
+    """
+    histogramas: dicionário chave -> (valores, contagens, fora)
+    """
+
+    if not histogramas:
+        return
+    conn = _conn()
+    agora = time.time()
+    registros = []
+    for chave, histograma in histogramas.items():
+        valor = _serializa(histograma)
+        registros.append((chave, valor, len(valor), agora))
+
+    # Gravação, tamanho total e remoção em uma única transação (outros processos podem gravar no mesmo cache)
+    conn.execute("BEGIN IMMEDIATE")
+
+    # Entradas substituídas deixam de contar no tamanho total
+    substituido = 0
+    chaves = [registro[0] for registro in registros]
+    for inicio in range(0, len(chaves), 500):
+        lote = chaves[inicio:inicio + 500]
+        substituido += conn.execute(f"SELECT COALESCE(SUM(tamanho), 0) FROM histogramas WHERE chave IN ({', '.join('?' * len(lote))})",
+                                    lote).fetchone()[0]
+    conn.executemany("INSERT OR REPLACE INTO histogramas VALUES (?, ?, ?, ?)", registros)
+    _estatisticas["gravacoes"] += len(registros)
+    conn.execute("UPDATE metadados SET tamanho_total = tamanho_total + ? WHERE id = 0",
+                 (sum(registro[2] for registro in registros) - substituido,))
+
+    # Remoção das entradas usadas há mais tempo até o cache voltar a uma fração do limite
+    total = conn.execute("SELECT tamanho_total FROM metadados WHERE id = 0").fetchone()[0]
+    if total > _config["tamanho_max"]:
+        excesso = total - _config["tamanho_max"] * _FRACAO_APOS_REMOCAO
+        removidas = []
+        for chave, tamanho in conn.execute("SELECT chave, tamanho FROM histogramas ORDER BY ultimo_acesso"):
+            if excesso <= 0:
+                break
+            removidas.append((chave, tamanho))
+            excesso -= tamanho
+        conn.executemany("DELETE FROM histogramas WHERE chave = ?", [(chave,) for chave, _ in removidas])
+        conn.execute("UPDATE metadados SET tamanho_total = tamanho_total - ? WHERE id = 0", (sum(tamanho for _, tamanho in removidas),))
+        _estatisticas["remocoes"] += len(removidas)
+    conn.commit()
+
+
+
+# Estatísticas de uso do cache desde a última vez que foram zeradas
+def estatisticas_cache_histogramas(zerar=False):
+    """
+    zerar: se True, zera os contadores após a leitura (booleano)
+    Retorna um dicionário com acertos, faltas, gravações e remoções
+    """
+
+    saida = dict(_estatisticas)
+    if zerar:
+        for chave in _estatisticas:
+            _estatisticas[chave] = 0
+    return saida
@@ -0,0 +1,168 @@
+import os
+import sqlite3
+import pandas as pd
+import fiona
+from geopandas.io.file import infer_schema
+
+###########################################################################
+# Escrita incremental dos resultados (um GeoPackage por fonte) com journal para retomar o processamento
+# Cada área concluída é anexada ao arquivo da fonte e registrada no journal ("fonte<TAB>interest_area_id" por linha)
+# logo em seguida; ao retomar (opcional, --retomar), as áreas já registradas são puladas
+
+
+
+# Caminho do arquivo de saída de uma fonte
+def caminho_saida(diretorio, fonte):
+    return os.path.join(diretorio, f"saida_script_{fonte}.gpkg")
+
+
+
+# Abre a escrita dos resultados
+def abre_escrita(diretorio, lista_fontes, retomar=False):
+    """
+    diretorio: diretório de saída (string)
+    lista_fontes: fontes que terão arquivo de saída (lista)
+    retomar: se True, mantém as saídas e o journal existentes e continua de onde parou; se False (padrão), apaga os dois e recomeça do zero (booleano)
+    Retorna o estado da escrita (dicionário), usado pelas demais funções
+    """
+
+    os.makedirs(diretorio, exist_ok=True)
+    caminho_journal = os.path.join(diretorio, "journal_areas.txt")
+
+    # Recomeçando: apaga saídas e journal anteriores
+    if not retomar:
+        for fonte in lista_fontes:
+            if os.path.exists(caminho_saida(diretorio, fonte)):
+                os.remove(caminho_saida(diretorio, fonte))
+        if os.path.exists(caminho_journal):
+            os.remove(caminho_journal)
+
+    # Áreas já concluídas por fonte
+    concluidas = set()
+    if os.path.exists(caminho_journal):
+        with open(caminho_journal, encoding="utf-8") as journal:
+            for linha in journal:
+                if "\t" in linha:
+                    fonte, interest_area_id = linha.rstrip("\n").split("\t", 1)
+                    concluidas.add((fonte, interest_area_id))
+
+    # Esquema das saídas já existentes (as próximas áreas precisam seguir o mesmo esquema)
+    esquemas = {}
+    for fonte in lista_fontes:
+        if os.path.exists(caminho_saida(diretorio, fonte)):
+            with fiona.open(caminho_saida(diretorio, fonte)) as arquivo:
+                esquemas[fonte] = arquivo.schema
+
+    return {"diretorio": diretorio,
+            "fontes": list(lista_fontes),
+            "journal": open(caminho_journal, "a", encoding="utf-8"),
+            "concluidas": concluidas,
+            "esquemas": esquemas}
+
+
+
+# Verifica se a área já foi concluída (em todas as fontes, ou apenas na fonte informada)
+def area_concluida(estado, interest_area_id, fonte=None):
+    fontes = estado["fontes"] if fonte is None else [fonte]
+    return all((f, str(interest_area_id)) in estado["concluidas"] for f in fontes)
+
+
+
+# Anexa o resultado de uma área ao arquivo da fonte e registra no journal
+def escreve_area(estado, fonte, interest_area_id, gdf_out, substituir=False):
+    """
+    estado: retorno de abre_escrita
+    fonte: fonte do resultado (string)
+    interest_area_id: id da área de interesse
+    gdf_out: GeoDataFrame com os talhões da área
+    substituir: se True, grava mesmo que a área já conste no journal, trocando as linhas anteriores dos mesmos talhões (booleano)
+    """
+
+    if not substituir and area_concluida(estado, interest_area_id, fonte):
+        return
+    caminho = caminho_saida(estado["diretorio"], fonte)
+    gdf_out = _tipos_gravaveis(gdf_out)
+
+    # O esquema é definido pela primeira área gravada; as demais são convertidas para ele
+    if fonte not in estado["esquemas"]:
+        esquema = infer_schema(gdf_out)
+        esquema["geometry"] = "Unknown"
+        estado["esquemas"][fonte] = esquema
+        modo = "w"
+    else:
+        esquema = estado["esquemas"][fonte]
+        gdf_out = _converte_para_esquema(gdf_out, esquema)
+        modo = "a"
+        if substituir:
+            _remove_talhoes(caminho, gdf_out["id"].tolist())
+
+    if len(gdf_out) > 0:
+        gdf_out.to_file(caminho, driver="GPKG", schema=esquema, mode=modo)
+    elif modo == "w":
+        del estado["esquemas"][fonte]
+
+    # Registra a área no journal somente depois que os dados foram gravados
+    estado["journal"].write(f"{fonte}\t{interest_area_id}\n")
+    estado["journal"].flush()
+    os.fsync(estado["journal"].fileno())
+    estado["concluidas"].add((fonte, str(interest_area_id)))
+
+
+
+# Remove os talhões informados das saídas de todas as fontes (talhões que saíram da tabela, na execução incremental)
+def remove_talhoes(estado, ids):
+    """
+    estado: retorno de abre_escrita
+    ids: ids dos talhões (lista)
+    """
+
+    for fonte in estado["fontes"]:
+        caminho = caminho_saida(estado["diretorio"], fonte)
+        if fonte in estado["esquemas"] and os.path.exists(caminho):
+            _remove_talhoes(caminho, list(ids))
+
+
+
+# Remove do arquivo de saída as linhas dos talhões informados (o GeoPackage é um banco SQLite)
+def _remove_talhoes(caminho, ids):
+    camada = fiona.listlayers(caminho)[0]
+    conn = sqlite3.connect(caminho)
+    with conn:
+        for inicio in range(0, len(ids), 500):
+            lote = ids[inicio:inicio + 500]
+            conn.execute(f'DELETE FROM "{camada}" WHERE "id" IN ({", ".join("?" * len(lote))})', lote)
+    conn.close()
+
+
+
+# Colunas de códigos (inteiros compactos com nulos) e categóricas em tipos que o driver sabe gravar
+def _tipos_gravaveis(gdf_out):
+    conversoes = {}
+    for coluna, tipo in gdf_out.dtypes.items():
+        if isinstance(tipo, pd.CategoricalDtype):
+            conversoes[coluna] = object
+        elif pd.api.types.is_extension_array_dtype(tipo) and pd.api.types.is_integer_dtype(tipo):
+            conversoes[coluna] = "Int64"
+    return gdf_out.astype(conversoes) if conversoes else gdf_out
+
+
+
+# Converte as colunas do gdf para os tipos do esquema do arquivo
+def _converte_para_esquema(gdf_out, esquema):
+    gdf_out = gdf_out.copy()
+    for coluna in esquema["properties"]:
+        if coluna not in gdf_out.columns:
+            gdf_out[coluna] = None
+    gdf_out = gdf_out[list(esquema["properties"]) + [gdf_out.geometry.name]]
+    for coluna, tipo in esquema["properties"].items():
+        if tipo.startswith("str"):
+            gdf_out[coluna] = gdf_out[coluna].astype(object).where(gdf_out[coluna].notna(), None).map(lambda valor: valor if valor is None else str(valor))
+        elif tipo.startswith("int") or tipo.startswith("float"):
+            gdf_out[coluna] = pd.to_numeric(gdf_out[coluna], errors="coerce")
+    return gdf_out
+
+
+
+# Fecha o journal
+def fecha_escrita(estado):
+    estado["journal"].close()
@@ -0,0 +1,217 @@
+import os
+import sqlite3
+import hashlib
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import shapely
+
+###########################################################################
+# Estado das execuções incrementais: para cada talhão, o hash da geometria, a impressão dos rasters usados,
+# o modified_at lido do banco, a área de interesse, o momento em que foi processado e a última execução que o leu
+# (banco SQLite local)
+# Numa nova execução, só as áreas com algum talhão novo ou com algum desses valores diferente são valoradas de novo;
+# os talhões do estado que a execução não leu mais foram removidos da tabela e saem das saídas
+
+# Máximo de parâmetros por consulta ao SQLite
+_TAMANHO_CONSULTA = 500
+
+
+
+# Abre (ou cria) o banco de estado
+def abre_estado(caminho, recomecar=False):
+    """
+    caminho: arquivo SQLite do estado (string)
+    recomecar: se True, apaga o estado anterior (booleano)
+    Retorna a conexão com o banco de estado
+    """
+
+    if recomecar and os.path.exists(caminho):
+        os.remove(caminho)
+
+    estado = sqlite3.connect(caminho)
+    estado.execute("""
+                   CREATE TABLE IF NOT EXISTS talhoes (
+                       id TEXT PRIMARY KEY,
+                       hash_geometria TEXT,
+                       impressao_rasters TEXT,
+                       modified_at TEXT,
+                       processado_em TEXT,
+                       interest_area_id TEXT,
+                       execucao TEXT)
+                   """)
+
+    # Estados criados antes das colunas de área e de execução
+    existentes = {linha[1] for linha in estado.execute("PRAGMA table_info(talhoes)")}
+    for coluna in ("interest_area_id", "execucao"):
+        if coluna not in existentes:
+            estado.execute(f"ALTER TABLE talhoes ADD COLUMN {coluna} TEXT")
+    estado.commit()
+    return estado
+
+
+
+# Hash de cada geometria (WKB da geometria normalizada, para não depender da ordem dos vértices; geometria nula vira WKB vazio)
+def hash_geometrias(geometrias):
+    wkbs = shapely.to_wkb(shapely.normalize(np.asarray(geometrias)))
+    return [hashlib.sha1(wkb if wkb is not None else b"").hexdigest() for wkb in wkbs]
+
+
+
+# Impressão de um conjunto de rasters (caminho, tamanho e data de modificação de cada arquivo)
+def impressao_rasters(caminhos):
+    impressao = hashlib.sha1()
+    for caminho in sorted(caminhos):
+        info = os.stat(caminho)
+        impressao.update(f"{caminho}|{info.st_size}|{info.st_mtime_ns}\n".encode("utf-8"))
+    return impressao.hexdigest()
+
+
+
+# Monta a tabela com os valores atuais de cada talhão (comparados e gravados no estado)
+def estado_talhoes(gdf_in, impressao):
+    """
+    gdf_in: GeoDataFrame dos talhões (colunas id, interest_area_id e, se houver, modified_at)
+    impressao: retorno de impressao_rasters
+    Retorna um DataFrame indexado pelo id (em texto)
+    """
+
+    modified_at = gdf_in["modified_at"] if "modified_at" in gdf_in.columns else pd.Series(None, index=gdf_in.index)
+    return pd.DataFrame({"hash_geometria": hash_geometrias(gdf_in.geometry),
+                         "impressao_rasters": impressao,
+                         "modified_at": modified_at.astype(str).values,
+                         "interest_area_id": gdf_in["interest_area_id"].astype(str).values},
+                        index=gdf_in["id"].astype(str).values)
+
+
+
+# Verifica quais talhões são novos ou mudaram desde a última execução
+def talhoes_alterados(estado, atual):
+    """
+    estado: retorno de abre_estado
+    atual: retorno de estado_talhoes
+    Retorna uma máscara booleana (array) com os talhões a valorar, na ordem de atual
+    """
+
+    ids = atual.index.tolist()
+    registros = []
+    for inicio in range(0, len(ids), _TAMANHO_CONSULTA):
+        lote = ids[inicio:inicio + _TAMANHO_CONSULTA]
+        registros += estado.execute(f"""
+                                    SELECT id, hash_geometria, impressao_rasters, modified_at, interest_area_id
+                                    FROM talhoes
+                                    WHERE id IN ({', '.join('?' * len(lote))})
+                                    """, lote).fetchall()
+
+    colunas = ["hash_geometria", "impressao_rasters", "modified_at", "interest_area_id"]
+    anterior = pd.DataFrame(registros, columns=["id"] + colunas).set_index("id")
+    anterior = anterior[~anterior.index.duplicated()].reindex(atual.index)
+    return (anterior[colunas].isna().any(axis=1) | (anterior[colunas] != atual[colunas]).any(axis=1)).values
+
+
+
+# Talhões do estado que saíram das áreas lidas (removidos da tabela ou movidos para outra área)
+def talhoes_saidos(estado, atual):
+    """
+    estado: retorno de abre_estado
+    atual: retorno de estado_talhoes com todos os talhões lidos no lote (áreas completas)
+    Retorna (ids dos talhões que saíram, áreas de onde saíram), ambos em texto
+    """
+
+    areas = atual["interest_area_id"].unique().tolist()
+    registros = []
+    for inicio in range(0, len(areas), _TAMANHO_CONSULTA):
+        lote = areas[inicio:inicio + _TAMANHO_CONSULTA]
+        registros += estado.execute(f"SELECT id, interest_area_id FROM talhoes WHERE interest_area_id IN ({', '.join('?' * len(lote))})", lote).fetchall()
+
+    anterior = pd.DataFrame(registros, columns=["id", "interest_area_id"])
+    area_atual = atual["interest_area_id"].reindex(anterior["id"]).values
+    saidos = anterior[area_atual != anterior["interest_area_id"].values]
+    return saidos["id"].tolist(), saidos["interest_area_id"].unique().tolist()
+
+
+
+# Áreas de interesse com ao menos um talhão novo, alterado ou que saiu da área
+def areas_alteradas(atual, alterados, areas_saidos=()):
+    """
+    atual: retorno de estado_talhoes
+    alterados: retorno de talhoes_alterados
+    areas_saidos: áreas que perderam talhões (retorno de talhoes_saidos)
+    Retorna uma máscara booleana com todos os talhões dessas áreas (valores por área, como o paved_road,
+    dependem da área inteira, então a área é valorada de novo por completo)
+    """
+
+    areas = atual["interest_area_id"].values
+    return np.isin(areas, np.concatenate([areas[np.asarray(alterados, dtype=bool)], np.asarray(list(areas_saidos), dtype=object)]))
+
+
+
+# Registra os talhões processados
+def registra_talhoes(estado, atual, execucao=None):
+    """
+    estado: retorno de abre_estado
+    atual: linhas de estado_talhoes dos talhões processados
+    execucao (opcional): identificador da execução atual (ver marca_lidos)
+    """
+
+    processado_em = datetime.now().isoformat(timespec="seconds")
+    estado.executemany("""
+                       INSERT OR REPLACE INTO talhoes (id, hash_geometria, impressao_rasters, modified_at, processado_em, interest_area_id, execucao)
+                       VALUES (?, ?, ?, ?, ?, ?, ?)
+                       """,
+                       [(id_talhao, linha.hash_geometria, linha.impressao_rasters, linha.modified_at, processado_em, linha.interest_area_id, execucao)
+                        for id_talhao, linha in zip(atual.index, atual.itertuples(index=False))])
+    estado.commit()
+
+
+
+# Marca os talhões lidos do banco pela execução atual (os que ficarem sem a marca foram removidos da tabela)
+def marca_lidos(estado, atual, execucao):
+    """
+    estado: retorno de abre_estado
+    atual: retorno de estado_talhoes com todos os talhões lidos no lote
+    execucao: identificador da execução atual (string)
+    """
+
+    estado.executemany("UPDATE talhoes SET execucao = ? WHERE id = ?", [(execucao, id_talhao) for id_talhao in atual.index])
+    estado.commit()
+
+
+
+# Talhões do estado que a execução atual não leu do banco (removidos da tabela desde a última execução)
+def talhoes_removidos(estado, execucao, ids_areas=None):
+    """
+    estado: retorno de abre_estado
+    execucao: identificador da execução atual (ver marca_lidos)
+    ids_areas (opcional): áreas de interesse lidas pela execução (lista); sem ela, a execução leu a tabela inteira
+    Retorna a lista de ids (em texto)
+    """
+
+    consulta = "SELECT id FROM talhoes WHERE execucao IS NOT ?"
+    if ids_areas is None:
+        return [linha[0] for linha in estado.execute(consulta, (execucao,))]
+
+    areas = [str(area) for area in ids_areas]
+    removidos = []
+    for inicio in range(0, len(areas), _TAMANHO_CONSULTA):
+        lote = areas[inicio:inicio + _TAMANHO_CONSULTA]
+        removidos += [linha[0] for linha in estado.execute(f"{consulta} AND interest_area_id IN ({', '.join('?' * len(lote))})", [execucao] + lote)]
+    return removidos
+
+
+
+# Retira talhões do estado
+def esquece_talhoes(estado, ids):
+    """
+    estado: retorno de abre_estado
+    ids: ids dos talhões (em texto)
+    """
+
+    estado.executemany("DELETE FROM talhoes WHERE id = ?", [(id_talhao,) for id_talhao in ids])
+    estado.commit()
+
+
+
+# Fecha o banco de estado
+def fecha_estado(estado):
+    estado.close()
@@ -0,0 +1,45 @@
+import os
+from estado_incremental import impressao_rasters
+from cache_histogramas import impressao_dicionario
+from tabela_classes import DICT_CLASSES
+
+###########################################################################
+# Registro das entradas da valoração (rasters de irrigação e de land cover de cada fonte) e origem de cada atributo
+# A origem identifica a entrada que gerou um atributo: é gravada nas saídas do processa_landcover e comparada pelo
+# verifica_valoracoes antes de reaproveitar uma previsão
+
+# Rasters de entrada
+RASTER_IRRIGACAO = r"assets\irrigacao\processado\irrigacao_ana_mapbiomas.tif"
+RASTERS_LULC = {"mapbiomas": r"assets\landcover\brasil_sentinel_coverage_2022_mapbiomas.tif",
+                "simfaz": r"assets\landcover\uso_terra_simfaz_2021.tif",
+                "agrosatelite": r"assets\landcover\remote_sensing_landuse_2022_2023_2023_09_30.tif"}
+
+
+
+# Fontes usadas pelo processamento (irrigação e land cover)
+def fontes_processamento():
+    return {"irrigacao": RASTER_IRRIGACAO, **RASTERS_LULC}
+
+
+
+# Origem de um atributo de raster: impressão do arquivo (caminho, tamanho e data) e do dicionário de classes
+def origem_raster(caminho, origem_dict):
+    """
+    caminho: raster avaliado (string)
+    origem_dict: dicionário de classes do raster (irrigacao, mapbiomas, simfaz ou agrosatelite)
+    """
+
+    return f"{impressao_rasters([caminho])}|{impressao_dicionario(DICT_CLASSES[origem_dict])}"
+
+
+
+# Origem do paved_road: conteúdo do índice de estradas ou cache do OSM usado
+def origem_estradas(indice=None, diretorio_cache_osm=None):
+    """
+    indice (opcional): índice de estradas (indice_estradas.py); sem ele, as estradas vêm do OSM
+    diretorio_cache_osm (opcional): cache local de estradas do OSM (ver cache_estradas.py)
+    """
+
+    if indice is not None:
+        return f"indice|{indice['impressao']}"
+    return f"osm|{os.path.abspath(diretorio_cache_osm) if diretorio_cache_osm else 'online'}"
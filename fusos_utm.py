@@ -0,0 +1,106 @@
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from pyproj import CRS, Transformer
+
+# Grade de fusos UTM (usada apenas quando o fuso não pode ser obtido aritmeticamente)
+CAMINHO_GRADE_UTM = "assets/zonas_utm_br.geojson"
+
+###########################################################################
+# Transformador pyproj reaproveitado para cada par (SRC de origem, SRC de destino)
+@lru_cache(maxsize=None)
+def transformador(crs_in, crs_out):
+    """
+    crs_in, crs_out: SRC de origem e de destino (CRS, string ou int epsg)
+    """
+
+    return Transformer.from_crs(CRS.from_user_input(crs_in), CRS.from_user_input(crs_out), always_xy=True)
+
+
+
+# Reprojeta um array de geometrias shapely com o transformador em cache
+def reprojeta(geometrias, crs_in, crs_out):
+    """
+    geometrias: array de geometrias shapely
+    crs_in, crs_out: SRC de origem e de destino (CRS, string ou int epsg)
+    """
+
+    t = transformador(crs_in, crs_out)
+    return shapely.transform(geometrias, lambda coords: np.column_stack(t.transform(coords[:, 0], coords[:, 1])))
+
+
+
+###########################################################################
+# Código EPSG SIRGAS 2000 / UTM a partir de longitude e latitude (vetorizado)
+def epsg_sirgas_utm(lon, lat):
+    """
+    lon, lat: arrays (ou escalares) de coordenadas em graus
+    Retorna array com o código EPSG de cada ponto (0 quando não existe código SIRGAS 2000 para o fuso)
+    """
+
+    lon = np.asarray(lon, dtype=float)
+    lat = np.asarray(lat, dtype=float)
+    fuso = (np.floor((lon + 180) / 6) % 60 + 1).astype(np.int64)
+
+    # Sul: 17S-25S = 31977-31985 | Norte: 11N-22N = 31965-31976, 23N = 6210, 24N = 6211
+    epsg = np.zeros(fuso.shape, dtype=np.int64)
+    sul = lat < 0
+    epsg = np.where(sul & (fuso >= 17) & (fuso <= 25), 31960 + fuso, epsg)
+    epsg = np.where(~sul & (fuso >= 11) & (fuso <= 22), 31954 + fuso, epsg)
+    epsg = np.where(~sul & ((fuso == 23) | (fuso == 24)), 6210 + fuso - 23, epsg)
+    return epsg
+
+
+
+# Carrega a grade de fusos UTM uma única vez, em wgs84, com índice espacial
+@lru_cache(maxsize=1)
+def _grade_utm():
+    gdf_grade = gpd.read_file(CAMINHO_GRADE_UTM).to_crs("EPSG:4326")
+    return gdf_grade, shapely.STRtree(gdf_grade.geometry.values)
+
+
+
+# Código EPSG pela grade de fusos (fallback)
+def _epsg_pela_grade(pontos):
+    gdf_grade, arvore = _grade_utm()
+    idx_pontos, idx_grade = arvore.query(pontos, predicate="within")
+    epsg = np.zeros(len(pontos), dtype=np.int64)
+    epsg[idx_pontos] = gdf_grade["EPSG_S2000"].values[idx_grade].astype(np.int64)
+    return epsg
+
+
+
+###########################################################################
+# Código EPSG UTM de cada ponto (um por linha)
+def epsg_utm_pontos(pontos, crs_in="EPSG:4326"):
+    """
+    pontos: array de pontos shapely
+    crs_in: SRC dos pontos
+    Retorna array de códigos EPSG; usa a grade de fusos apenas para os pontos sem código aritmético
+    """
+
+    pontos = np.asarray(pontos, dtype=object)
+    if CRS.from_user_input(crs_in) != CRS.from_epsg(4326):
+        pontos = reprojeta(pontos, crs_in, "EPSG:4326")
+
+    epsg = epsg_sirgas_utm(shapely.get_x(pontos), shapely.get_y(pontos))
+    sem_epsg = epsg == 0
+    if sem_epsg.any():
+        epsg[sem_epsg] = _epsg_pela_grade(pontos[sem_epsg])
+    if (epsg == 0).any():
+        raise ValueError("Ponto fora da grade de fusos UTM.")
+    return epsg
+
+
+
+# Fuso UTM de cada linha de um GeoDataFrame/GeoSeries, pelo centróide da geometria
+def epsg_utm_por_linha(entrada):
+    """
+    entrada: GeoDataFrame ou GeoSeries
+    Retorna pd.Series com o código EPSG de cada linha (mesmo índice da entrada)
+    """
+
+    centroides = shapely.centroid(np.asarray(entrada.geometry.values))
+    return pd.Series(epsg_utm_pontos(centroides, entrada.crs), index=entrada.index)
@@ -0,0 +1,192 @@
+import os
+import pickle
+import hashlib
+import argparse
+from functools import lru_cache
+import numpy as np
+import geopandas as gpd
+import shapely
+from fusos_utm import epsg_utm_por_linha, reprojeta
+from validacao_geometrias import tem_geometria
+from acesso_dados import engine
+from instrumentacao import log, etapa
+
+###########################################################################
+# Índice espacial (STRtree) sobre uma malha rodoviária nacional (ex: DNIT, agrosatélite)
+# As estradas ficam em um SRC métrico nacional (SIRGAS 2000 / Brazil Polyconic) para a busca dos candidatos;
+# a distância de cada talhão é medida no fuso UTM do talhão, e a estrada mais próxima é escolhida entre os candidatos
+# por essa distância (o vizinho mais próximo no Policônico nem sempre é o mais próximo no UTM)
+
+CRS_INDICE = "EPSG:5880"
+DISTANCIA_TOQUE_M = 45          # mesmo buffer usado em busca_estradas para considerar que o talhão toca a estrada
+DISTANCIA_MAXIMA_M = 10000
+
+# Folga da busca de candidatos no Policônico: a razão entre uma distância no Policônico e no UTM fica abaixo de ~1,06
+# no território brasileiro, então toda estrada mais próxima no UTM está a menos de 1,06² vezes a distância do vizinho do Policônico
+FATOR_CANDIDATOS = 1.15
+
+# Malha rodoviária usada por padrão (banco gisdb) e arquivo do índice construído a partir dela
+TABELA_ESTRADAS = '"lgt10"."tb_rodov_1010"'
+BANCO_ESTRADAS = "gisdb"
+CAMINHO_INDICE_ESTRADAS = r"assets\estradas\indice_rodovias_agrosatelite.pkl"
+
+
+
+# Constrói o índice a partir de um GeoDataFrame (ou arquivo) de estradas
+def constroi_indice_estradas(estradas, coluna_pavimento=None, valores_pavimentados=None, caminho_saida=None):
+    """
+    estradas: GeoDataFrame ou caminho para arquivo vetorial com as estradas
+    coluna_pavimento (opcional): coluna que indica a pavimentação (string)
+    valores_pavimentados (opcional): valores de coluna_pavimento considerados pavimentados (lista)
+    caminho_saida (opcional): arquivo onde o índice será serializado (pickle)
+    Sem coluna_pavimento, todas as estradas são consideradas pavimentadas
+    """
+
+    if isinstance(estradas, str):
+        estradas = gpd.read_file(estradas)
+
+    # Filtra as estradas pavimentadas
+    if coluna_pavimento is not None:
+        estradas = estradas[estradas[coluna_pavimento].isin(valores_pavimentados)]
+
+    # Geometrias válidas e não vazias, no SRC métrico do índice
+    estradas = estradas[estradas.geometry.notna() & ~estradas.geometry.is_empty].to_crs(CRS_INDICE)
+    geometrias = shapely.make_valid(np.asarray(estradas.geometry.values))
+
+    # A impressão do conteúdo identifica o índice nas saídas (origem do paved_road), qualquer que seja o arquivo
+    wkbs = shapely.to_wkb(geometrias)
+    indice = {"crs": CRS_INDICE, "geometrias": geometrias, "arvore": shapely.STRtree(geometrias), "impressao": _impressao_indice(wkbs)}
+
+    # Serializa as geometrias já filtradas e projetadas (a árvore é reconstruída na leitura)
+    if caminho_saida is not None:
+        with open(caminho_saida, "wb") as arquivo:
+            pickle.dump({"crs": CRS_INDICE, "geometrias": wkbs, "impressao": indice["impressao"]}, arquivo, protocol=pickle.HIGHEST_PROTOCOL)
+
+    return indice
+
+
+
+# Lê a malha rodoviária de uma tabela do PostGIS
+def le_estradas_banco(tabela=TABELA_ESTRADAS, banco=BANCO_ESTRADAS):
+    """
+    tabela: nome qualificado da tabela de estradas (string)
+    banco: nome do banco em acesso_dados.BANCOS
+    """
+
+    return gpd.GeoDataFrame.from_postgis(f'SELECT "id", "geom" FROM {tabela}', con=engine(banco), geom_col="geom",
+                                         crs=4674).rename(columns={"geom": "geometry"}).set_geometry("geometry")
+
+
+
+# Carrega o índice do arquivo ou, se ele ainda não existe, constrói a partir da tabela de estradas e grava
+def indice_estradas_padrao(caminho=CAMINHO_INDICE_ESTRADAS, tabela=TABELA_ESTRADAS, banco=BANCO_ESTRADAS):
+    """
+    caminho: arquivo do índice (string)
+    tabela, banco: origem das estradas quando o índice precisa ser construído (ver le_estradas_banco)
+    """
+
+    if os.path.exists(caminho):
+        return carrega_indice_estradas(caminho)
+    log(f"Índice de estradas {caminho} não encontrado; construindo a partir de {tabela}")
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    return constroi_indice_estradas(le_estradas_banco(tabela, banco), caminho_saida=caminho)
+
+
+
+# Carrega um índice serializado (uma única vez por processo)
+@lru_cache(maxsize=None)
+def carrega_indice_estradas(caminho):
+    """
+    caminho: arquivo gerado por constroi_indice_estradas (string)
+    """
+
+    with open(caminho, "rb") as arquivo:
+        dados = pickle.load(arquivo)
+    geometrias = shapely.from_wkb(dados["geometrias"])
+    impressao = dados.get("impressao") or _impressao_indice(dados["geometrias"])         # índices gravados antes da impressão
+    return {"crs": dados["crs"], "geometrias": geometrias, "arvore": shapely.STRtree(geometrias), "impressao": impressao}
+
+
+
+# Impressão do conteúdo de um índice (geometrias das estradas em WKB)
+def _impressao_indice(wkbs):
+    impressao = hashlib.sha1()
+    for wkb in wkbs:
+        impressao.update(wkb)
+    return impressao.hexdigest()
+
+
+
+###########################################################################
+# Classifica paved_road de todos os talhões com uma única busca de vizinho mais próximo
+def classifica_estradas(gdf_in, indice):
+    """
+    gdf_in: GeoDataFrame com os talhões (qualquer SRC)
+    indice: índice gerado por constroi_indice_estradas ou carrega_indice_estradas
+    Preenche "paved_road" (TOUCH_ROAD, 10KM_ROAD, NO ou NULL sem geometria) e "paved_road_dist_m" (distância em metros até a estrada pavimentada mais próxima)
+    """
+
+    # Consulta do vizinho mais próximo e distâncias no fuso UTM, medidas como uma única etapa
+    with etapa("geometria_estradas", talhoes=len(gdf_in)):
+        gdf_out = gdf_in.copy()
+        gdf_out["paved_road"] = "NO"
+        gdf_out["paved_road_dist_m"] = np.nan
+        if len(gdf_out) == 0 or len(indice["geometrias"]) == 0:
+            return gdf_out
+
+        # Estrada mais próxima de cada talhão no Policônico (uma única consulta para todos)
+        talhoes = np.asarray(gdf_out.geometry.to_crs(indice["crs"]).values)
+        (idx_talhao, idx_estrada), distancias_indice = indice["arvore"].query_nearest(talhoes, all_matches=False, return_distance=True)
+
+        # Candidatos dos talhões que podem estar a até DISTANCIA_MAXIMA_M: todas as estradas até FATOR_CANDIDATOS vezes
+        # a distância do vizinho do Policônico (os demais talhões ficam com NO e a distância até esse vizinho)
+        perto = distancias_indice <= DISTANCIA_MAXIMA_M * FATOR_CANDIDATOS
+        idx_perto, idx_candidata = indice["arvore"].query(talhoes[idx_talhao[perto]], predicate="dwithin",
+                                                          distance=distancias_indice[perto] * FATOR_CANDIDATOS)
+        idx_talhao = np.concatenate([idx_talhao[perto][idx_perto], idx_talhao[~perto]])
+        idx_estrada = np.concatenate([idx_candidata, idx_estrada[~perto]])
+
+        # Distância no fuso UTM de cada par (talhão, estrada) e a menor de cada talhão
+        distancias = np.full(len(gdf_out), np.inf)
+        epsg_talhoes = epsg_utm_por_linha(gdf_out.iloc[idx_talhao]).values
+        for epsg in np.unique(epsg_talhoes):
+            no_fuso = epsg_talhoes == epsg
+            talhoes_utm = reprojeta(talhoes[idx_talhao[no_fuso]], indice["crs"], int(epsg))
+            estradas_utm = reprojeta(indice["geometrias"][idx_estrada[no_fuso]], indice["crs"], int(epsg))
+            np.minimum.at(distancias, idx_talhao[no_fuso], shapely.distance(talhoes_utm, estradas_utm))
+        distancias[np.isinf(distancias)] = np.nan
+
+        # Classificação pela distância
+        gdf_out["paved_road_dist_m"] = distancias
+        gdf_out.loc[distancias <= DISTANCIA_MAXIMA_M, "paved_road"] = "10KM_ROAD"
+        gdf_out.loc[distancias <= DISTANCIA_TOQUE_M, "paved_road"] = "TOUCH_ROAD"
+        gdf_out.loc[~tem_geometria(talhoes), "paved_road"] = "NULL"     # talhões sem geometria (inválidos sem reparo na ingestão)
+        return gdf_out
+
+
+
+# Linha de comando (python indice_estradas.py ou autolandcover build-road-index)
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Constrói o índice de estradas pavimentadas usado por --indice-estradas")
+    origem = parser.add_mutually_exclusive_group()
+    origem.add_argument("--arquivo", help="arquivo vetorial com as estradas (no lugar da tabela do banco)")
+    origem.add_argument("--tabela", default=TABELA_ESTRADAS, help="tabela de estradas no PostGIS")
+    parser.add_argument("--banco", default=BANCO_ESTRADAS, help="banco da tabela de estradas")
+    parser.add_argument("--coluna-pavimento", help="coluna que indica a pavimentação (sem ela, todas as estradas são pavimentadas)")
+    parser.add_argument("--valores-pavimentados", nargs="+", help="valores da coluna de pavimentação considerados pavimentados")
+    parser.add_argument("--saida", default=CAMINHO_INDICE_ESTRADAS, help="arquivo do índice")
+    argumentos = parser.parse_args(argv)
+
+    if argumentos.coluna_pavimento is not None and not argumentos.valores_pavimentados:
+        parser.error("--coluna-pavimento exige --valores-pavimentados")
+
+    estradas = argumentos.arquivo if argumentos.arquivo is not None else le_estradas_banco(argumentos.tabela, argumentos.banco)
+    os.makedirs(os.path.dirname(argumentos.saida) or ".", exist_ok=True)
+    indice = constroi_indice_estradas(estradas, coluna_pavimento=argumentos.coluna_pavimento,
+                                      valores_pavimentados=argumentos.valores_pavimentados, caminho_saida=argumentos.saida)
+    log(f"Índice com {len(indice['geometrias'])} estradas gravado em {argumentos.saida}")
+
+
+
+if __name__ == "__main__":
+    main()
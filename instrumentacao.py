@@ -0,0 +1,211 @@
+import os
+import json
+import contextlib
+from time import time, perf_counter
+
+try:
+    import resource
+except ImportError:         # Windows: sem getrusage, o pico de memória residente não é medido
+    resource = None
+
+###########################################################################
+# Instrumentação do processamento: mensagens com nível de log, tempo por etapa (spans), contadores e
+# pico de memória residente. Os spans de cada área (leitura do banco, abertura e leitura dos rasters, moda, preenchimento,
+# busca e geometria das estradas, concatenação e escrita) são exportados em JSON lines; os totais por etapa
+# e os contadores, em um textfile do Prometheus (node_exporter).
+# Cada processo acumula os próprios dados; os workers os devolvem junto com o resultado de cada área.
+
+NIVEIS_LOG = {"DEBUG": 10, "INFO": 20, "AVISO": 30, "ERRO": 40}
+
+_config = {"nivel": NIVEIS_LOG["INFO"], "registra_spans": False}
+_spans = []             # spans ainda não exportados (só com registra_spans=True)
+_totais = {}            # etapa -> [execuções, segundos]
+_contadores = {}        # contador -> valor
+_contexto = {}          # atributos anexados aos spans (ex: área em processamento)
+_pico_rss = {}          # pid -> pico de memória residente (bytes)
+
+
+
+# Configura o nível de log e o registro de spans do processo
+def configura_instrumentacao(nivel_log="INFO", registra_spans=False):
+    """
+    nivel_log: nível mínimo das mensagens exibidas (DEBUG, INFO, AVISO ou ERRO)
+    registra_spans: se True, guarda cada span para exportação (exporta_jsonl); os totais por etapa são sempre acumulados
+    """
+
+    _config["nivel"] = NIVEIS_LOG[nivel_log.upper()]
+    _config["registra_spans"] = registra_spans
+
+
+
+# Exibe uma mensagem se o nível for igual ou superior ao configurado
+def log(mensagem, nivel="INFO"):
+    if NIVEIS_LOG[nivel] >= _config["nivel"]:
+        print(mensagem)
+
+
+
+##### Spans e contadores
+
+# Mede o tempo de uma etapa
+@contextlib.contextmanager
+def etapa(nome, **atributos):
+    """
+    nome: nome da etapa (ex: leitura_raster)
+    atributos: valores gravados no span, além dos atributos do contexto atual
+    """
+
+    inicio = time()
+    inicio_contador = perf_counter()
+    try:
+        yield
+    finally:
+        duracao = perf_counter() - inicio_contador
+        total = _totais.setdefault(nome, [0, 0.0])
+        total[0] += 1
+        total[1] += duracao
+        if _config["registra_spans"]:
+            _spans.append({"etapa": nome, "inicio": round(inicio, 6), "duracao_s": round(duracao, 6), "pid": os.getpid(),
+                           **_contexto, **atributos})
+
+
+
+# Anexa atributos (ex: area=id) a todos os spans registrados dentro do bloco
+@contextlib.contextmanager
+def contexto(**atributos):
+    anterior = dict(_contexto)
+    _contexto.update(atributos)
+    try:
+        yield
+    finally:
+        _contexto.clear()
+        _contexto.update(anterior)
+
+
+
+# Soma um valor a um contador
+def conta(nome, valor=1):
+    _contadores[nome] = _contadores.get(nome, 0) + valor
+
+
+
+# Itera sobre um iterável medindo o tempo de obtenção de cada item como uma etapa (ex: lotes lidos do banco)
+def itera_medindo(nome, iteravel):
+    iterador = iter(iteravel)
+    while True:
+        with etapa(nome):
+            try:
+                item = next(iterador)
+            except StopIteration:
+                return
+        yield item
+
+
+
+# Pico de memória residente do processo atual, em bytes (None se não for possível medir)
+def pico_rss():
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico if os.uname().sysname == "Darwin" else pico * 1024      # ru_maxrss é em KB no Linux e em bytes no macOS
+
+
+
+##### Coleta entre processos
+
+# Retira os dados acumulados no processo (usado pelos workers, que os devolvem com o resultado da área)
+def coleta_instrumentacao():
+    dados = {"spans": list(_spans), "totais": {nome: list(total) for nome, total in _totais.items()},
+             "contadores": dict(_contadores), "pico_rss": {os.getpid(): pico_rss()}}
+    _spans.clear()
+    _totais.clear()
+    _contadores.clear()
+    return dados
+
+
+
+# Soma aos dados do processo atual os dados coletados em outro processo
+def incorpora_instrumentacao(dados):
+    _spans.extend(dados["spans"])
+    for nome, (execucoes, segundos) in dados["totais"].items():
+        total = _totais.setdefault(nome, [0, 0.0])
+        total[0] += execucoes
+        total[1] += segundos
+    for nome, valor in dados["contadores"].items():
+        conta(nome, valor)
+    for pid, pico in dados["pico_rss"].items():
+        if pico is not None:
+            _pico_rss[pid] = max(_pico_rss.get(pid, 0), pico)
+
+
+
+# Pico de memória residente de cada processo (bytes), incluindo o processo atual
+def _picos_rss():
+    picos = dict(_pico_rss)
+    if pico_rss() is not None:
+        picos[os.getpid()] = max(picos.get(os.getpid(), 0), pico_rss())
+    return picos
+
+
+
+# Resumo dos totais por etapa, contadores e pico de memória de cada processo
+def resumo_instrumentacao():
+    picos = _picos_rss()
+    return {"etapas": {nome: {"execucoes": execucoes, "segundos": round(segundos, 3)} for nome, (execucoes, segundos) in _totais.items()},
+            "contadores": dict(_contadores),
+            "pico_rss_mb": {pid: round(pico / 1024 ** 2, 1) for pid, pico in picos.items()}}
+
+
+
+# Zera os dados acumulados
+def zera_instrumentacao():
+    _spans.clear()
+    _totais.clear()
+    _contadores.clear()
+    _pico_rss.clear()
+
+
+
+##### Exportação
+
+# Acrescenta os spans pendentes a um arquivo JSON lines (e, se final=True, uma linha com o resumo)
+def exporta_jsonl(caminho, final=False):
+    """
+    caminho: arquivo JSON lines (string); as linhas são acrescentadas ao final
+    final: se True, grava também o resumo (totais, contadores e pico de memória)
+    """
+
+    with open(caminho, "a", encoding="utf-8") as arquivo:
+        for span in _spans:
+            arquivo.write(json.dumps({"tipo": "span", **span}, default=str) + "\n")
+        if final:
+            arquivo.write(json.dumps({"tipo": "resumo", "momento": round(time(), 3), **resumo_instrumentacao()}, default=str) + "\n")
+    _spans.clear()
+
+
+
+# Grava os totais por etapa, os contadores e o pico de memória em um textfile do Prometheus
+def exporta_prometheus(caminho, prefixo="autolandcover"):
+    """
+    caminho: arquivo .prom lido pelo textfile collector do node_exporter (string)
+    prefixo: prefixo das métricas (string)
+    """
+
+    resumo = resumo_instrumentacao()
+    linhas = [f"# HELP {prefixo}_etapa_segundos_total Tempo acumulado em cada etapa do processamento",
+              f"# TYPE {prefixo}_etapa_segundos_total counter"]
+    linhas += [f'{prefixo}_etapa_segundos_total{{etapa="{nome}"}} {total["segundos"]}' for nome, total in resumo["etapas"].items()]
+    linhas += [f"# HELP {prefixo}_etapa_execucoes_total Número de execuções de cada etapa",
+               f"# TYPE {prefixo}_etapa_execucoes_total counter"]
+    linhas += [f'{prefixo}_etapa_execucoes_total{{etapa="{nome}"}} {total["execucoes"]}' for nome, total in resumo["etapas"].items()]
+    for nome, valor in resumo["contadores"].items():
+        linhas += [f"# TYPE {prefixo}_{nome}_total counter", f"{prefixo}_{nome}_total {valor}"]
+    linhas += [f"# HELP {prefixo}_pico_rss_bytes Pico de memória residente de cada processo",
+               f"# TYPE {prefixo}_pico_rss_bytes gauge"]
+    linhas += [f'{prefixo}_pico_rss_bytes{{pid="{pid}"}} {pico}' for pid, pico in _picos_rss().items()]
+
+    # Grava em arquivo temporário e renomeia, para o coletor nunca ler um arquivo pela metade
+    temporario = caminho + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as arquivo:
+        arquivo.write("\n".join(linhas) + "\n")
+    os.replace(temporario, caminho)
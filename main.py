@@ -1,22 +1,26 @@
-# Importar bibliotecas
-import geopandas as gpd
-from processa_landcover import processa_landcover
-from auto_landcover_tools import analisa_resultados
-
-# Abrindo estradas
-# estradas_dnit = gpd.read_file(r"assets\estradas\dnit_merge.geojson").to_crs("EPSG:4326")
-# estradas_agrosatelite = gpd.read_file(r"assets\estradas\rodovias_agrosatelite.geojson").to_crs("EPSG:4326")
-
-# Processar valorações
-processa_landcover(["mapbiomas", "simfaz", "agrosatelite"])
-print("Arquivos salvos em 'C:\projetos_python\automatiza_landcover\saidas'")
-
-# Carregar arquivos
-analistas = gpd.read_file(r"assets\analise_dados\fields_valuation_analistas.geojson")
-mapbiomas = gpd.read_file(r"saidas\saida_script_mapbiomas.geojson")
-simfaz = gpd.read_file(r"saidas\saida_script_simfaz.geojson")
-agrosatelite = gpd.read_file(r"saidas\saida_script_agrosatelite.geojson")
-
-# Resultados
-analisa_resultados(analistas=analistas, mapbiomas=mapbiomas, simfaz=simfaz, agrosatelite=agrosatelite)
-
+# Importar bibliotecas
+import os
+import geopandas as gpd
+from processa_landcover import processa_landcover
+from auto_landcover_tools import analisa_resultados
+from avaliacao import imprime_avaliacao
+
+# Abrindo estradas
+# estradas_dnit = gpd.read_file(r"assets\estradas\dnit_merge.geojson").to_crs("EPSG:4326")
+# estradas_agrosatelite = gpd.read_file(r"assets\estradas\rodovias_agrosatelite.geojson").to_crs("EPSG:4326")
+
+# Processamento protegido pelo "__main__": com n_processos > 1 os workers importam este módulo novamente
+if __name__ == "__main__":
+    # Processar valorações
+    processa_landcover(["mapbiomas", "simfaz", "agrosatelite"], n_processos=os.cpu_count())
+    print("Arquivos salvos em 'C:\projetos_python\automatiza_landcover\saidas'")
+
+    # Carregar arquivos
+    analistas = gpd.read_file(r"assets\analise_dados\fields_valuation_analistas.geojson")
+    mapbiomas = gpd.read_file(r"saidas\saida_script_mapbiomas.gpkg")
+    simfaz = gpd.read_file(r"saidas\saida_script_simfaz.gpkg")
+    agrosatelite = gpd.read_file(r"saidas\saida_script_agrosatelite.gpkg")
+
+    # Resultados
+    imprime_avaliacao(analisa_resultados(analistas=analistas, mapbiomas=mapbiomas, simfaz=simfaz, agrosatelite=agrosatelite))
+
@@ -0,0 +1,170 @@
+import os
+import atexit
+from contextlib import contextmanager
+import numpy as np
+import rasterio as rio
+from rasterio.env import set_gdal_config
+from instrumentacao import etapa, conta
+
+###########################################################################
+# Pool de rasters abertos, compartilhado pelo processo inteiro
+# Evita reabrir (e reler o cabeçalho) dos rasters nacionais a cada área de interesse
+
+_datasets = {}                  # caminho -> dataset aberto
+_blocos_vistos = set()          # (caminho, linha_bloco, coluna_bloco) já lidos neste processo
+_regioes = {}                   # (caminho, banda) -> regiões já decodificadas em memória compartilhada (ver blocos_compartilhados.py)
+_pid = os.getpid()              # handles abertos não podem ser herdados por processos filhos
+_estatisticas = {"aberturas": 0, "acertos_pool": 0, "leituras": 0, "pixels_lidos": 0,
+                 "blocos_lidos": 0, "blocos_repetidos": 0,
+                 "leituras_compartilhadas": 0, "pixels_compartilhados": 0}
+
+
+
+# Configura o tamanho do cache de blocos do GDAL
+def configura_cache(cache_mb):
+    """
+    cache_mb: tamanho do cache de blocos do GDAL, em megabytes (int)
+    Blocos já decodificados ficam em memória, então áreas vizinhas não descomprimem o mesmo bloco de novo
+    """
+
+    set_gdal_config("GDAL_CACHEMAX", int(cache_mb))
+
+
+
+# Retorna o dataset aberto para o caminho, abrindo apenas na primeira vez
+def abre_raster(caminho):
+    """
+    caminho: caminho para o arquivo raster (string)
+    """
+
+    global _pid
+
+    # Em um processo filho os handles do processo pai são descartados (sem fechar, o pai ainda os usa)
+    if os.getpid() != _pid:
+        _datasets.clear()
+        _blocos_vistos.clear()
+        _pid = os.getpid()
+
+    raster = _datasets.get(caminho)
+    if raster is not None and not raster.closed:
+        _estatisticas["acertos_pool"] += 1
+        conta("rasters_pool_acertos")
+        return raster
+
+    with etapa("abertura_raster", raster=caminho):
+        raster = rio.open(caminho)
+    _datasets[caminho] = raster
+    _estatisticas["aberturas"] += 1
+    return raster
+
+
+
+# Lê uma janela de uma ou mais bandas e contabiliza os blocos internos do arquivo tocados pela leitura
+def le_janela(raster, janela, banda=1, **kwargs):
+    """
+    raster: dataset obtido com abre_raster
+    janela: rasterio.windows.Window a ser lida
+    banda: índice da banda (int) ou lista de índices (a leitura retorna um array 3D, bandas x linhas x colunas)
+    kwargs: repassados para raster.read (ex: masked=True)
+    """
+
+    # Janela dentro de uma região já decodificada em memória compartilhada: visão sem cópia, sem decodificar de novo
+    if _regioes and isinstance(banda, int) and set(kwargs) <= {"masked"}:
+        visao = _visao_compartilhada(raster, janela, banda, kwargs.get("masked", False))
+        if visao is not None:
+            return visao
+
+    # Blocos internos do arquivo que cobrem a janela, em cada banda lida
+    bandas = list(banda) if isinstance(banda, (list, tuple)) else [banda]
+    for indice_banda in bandas:
+        altura_bloco, largura_bloco = raster.block_shapes[indice_banda - 1]
+        linha_ini, coluna_ini = int(janela.row_off) // altura_bloco, int(janela.col_off) // largura_bloco
+        linha_fim = (int(janela.row_off + janela.height) - 1) // altura_bloco
+        coluna_fim = (int(janela.col_off + janela.width) - 1) // largura_bloco
+        for linha in range(linha_ini, linha_fim + 1):
+            for coluna in range(coluna_ini, coluna_fim + 1):
+                chave = (raster.name, indice_banda, linha, coluna)
+                if chave in _blocos_vistos:
+                    _estatisticas["blocos_repetidos"] += 1     # provável acerto do cache de blocos do GDAL
+                else:
+                    _blocos_vistos.add(chave)
+                _estatisticas["blocos_lidos"] += 1
+
+    pixels = int(janela.width) * int(janela.height) * len(bandas)
+    _estatisticas["leituras"] += 1
+    _estatisticas["pixels_lidos"] += pixels
+    conta("pixels_lidos", pixels)
+    with etapa("leitura_raster", raster=raster.name):
+        return raster.read(banda, window=janela, **kwargs)
+
+
+
+# Registra, durante a valoração de uma área, as regiões decodificadas em memória compartilhada que a cobrem
+@contextmanager
+def regioes_compartilhadas(descritores):
+    """
+    descritores: lista de dicionários com nome, banda, janela (coluna, linha, largura, altura), arquivo e dtype
+                 (retorno de blocos_compartilhados.prepara_regioes); None ou lista vazia não registra nada
+    Os arquivos são mapeados só para leitura (as páginas são as mesmas em todos os processos) e liberados ao final
+    """
+
+    for descritor in descritores or []:
+        coluna, linha, largura, altura = descritor["janela"]
+        array = np.memmap(descritor["arquivo"], dtype=descritor["dtype"], mode="r", shape=(altura, largura))
+        _regioes.setdefault((descritor["nome"], descritor["banda"]), []).append((coluna, linha, largura, altura, array))
+    try:
+        yield
+    finally:
+        _regioes.clear()
+
+
+
+# Visão (sem cópia) da janela em uma região compartilhada que a contém, ou None
+def _visao_compartilhada(raster, janela, banda, masked):
+    coluna, linha = int(janela.col_off), int(janela.row_off)
+    largura, altura = int(janela.width), int(janela.height)
+    for coluna_regiao, linha_regiao, largura_regiao, altura_regiao, array in _regioes.get((raster.name, banda), []):
+        if (coluna >= coluna_regiao and linha >= linha_regiao and
+                coluna + largura <= coluna_regiao + largura_regiao and linha + altura <= linha_regiao + altura_regiao):
+            visao = array[linha - linha_regiao:linha - linha_regiao + altura, coluna - coluna_regiao:coluna - coluna_regiao + largura]
+            _estatisticas["leituras_compartilhadas"] += 1
+            _estatisticas["pixels_compartilhados"] += largura * altura
+            conta("pixels_compartilhados", largura * altura)
+
+            # Só rasters com máscara por "nodata" são compartilhados, então a máscara é a mesma do raster.read
+            if masked:
+                nodata = raster.nodatavals[banda - 1]
+                return np.ma.MaskedArray(visao, mask=(visao == nodata) if nodata is not None else np.ma.nomask)
+            return visao
+    return None
+
+
+
+# Estatísticas de uso do pool desde a última vez que foram zeradas
+def estatisticas_pool(zerar=False):
+    """
+    zerar: se True, zera os contadores após a leitura (booleano)
+    Retorna um dicionário com aberturas de arquivos, acertos do pool, leituras, pixels e blocos lidos
+    """
+
+    saida = dict(_estatisticas)
+    saida["rasters_abertos"] = len(_datasets)
+    if zerar:
+        for chave in _estatisticas:
+            _estatisticas[chave] = 0
+        _blocos_vistos.clear()
+    return saida
+
+
+
+# Fecha todos os rasters do pool
+def fecha_rasters():
+    if os.getpid() != _pid:
+        _datasets.clear()
+        return
+    for raster in _datasets.values():
+        raster.close()
+    _datasets.clear()
+
+
+atexit.register(fecha_rasters)
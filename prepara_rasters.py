@@ -0,0 +1,269 @@
+import os
+import argparse
+import itertools
+from time import perf_counter
+from xml.sax.saxutils import escape
+import numpy as np
+import geopandas as gpd
+import rasterio as rio
+import rasterio.shutil
+from rasterio.windows import Window
+from fontes_valoracao import fontes_processamento
+
+###########################################################################
+# Preparação dos rasters de entrada: reescreve cada fonte como Cloud-Optimized GeoTIFF (blocos internos,
+# compressão, preditor e overviews configuráveis) e monta um VRT quando a fonte está dividida em vários arquivos.
+# Cada layout candidato é medido com leituras das janelas de uma amostra de talhões reais (antes e depois),
+# e o mais rápido é mantido.
+
+# Diretório padrão das fontes preparadas
+DIRETORIO_COG = r"assets\cog"
+
+# Talhões usados por padrão na amostra de janelas
+CAMINHO_TALHOES_AMOSTRA = r"assets\analise_dados\fields_valuation_analistas.geojson"
+
+
+
+##### VRT
+
+# Tipo de dado do NumPy -> nome do tipo no GDAL (dataType das bandas do VRT)
+_TIPOS_GDAL = {"uint8": "Byte", "int8": "Int8", "uint16": "UInt16", "int16": "Int16", "uint32": "UInt32", "int32": "Int32",
+               "uint64": "UInt64", "int64": "Int64", "float32": "Float32", "float64": "Float64",
+               "complex64": "CFloat32", "complex128": "CFloat64"}
+
+# Monta um VRT (mosaico) com os arquivos de uma fonte dividida em vários arquivos
+def monta_vrt(arquivos, caminho_vrt):
+    """
+    arquivos: caminhos dos arquivos da fonte, todos com o mesmo SRC, resolução, tipo e número de bandas (lista)
+    caminho_vrt: caminho do VRT gerado (string)
+    """
+
+    perfis = []
+    for arquivo in arquivos:
+        with rio.open(arquivo) as raster:
+            perfis.append((raster.crs, raster.res, raster.dtypes, raster.nodata, raster.bounds, raster.width, raster.height))
+    crs, res, dtypes, nodata = perfis[0][:4]
+    if any((perfil[0], perfil[1], perfil[2]) != (crs, res, dtypes) for perfil in perfis):
+        raise ValueError("Os arquivos da fonte precisam ter o mesmo SRC, resolução, tipo e número de bandas.")
+
+    # Extensão do mosaico
+    xmin = min(perfil[4].left for perfil in perfis)
+    ymax = max(perfil[4].top for perfil in perfis)
+    largura = int(round((max(perfil[4].right for perfil in perfis) - xmin) / res[0]))
+    altura = int(round((ymax - min(perfil[4].bottom for perfil in perfis)) / res[1]))
+
+    bandas = []
+    for banda, dtype in enumerate(dtypes, start=1):
+        fontes = []
+        for arquivo, perfil in zip(arquivos, perfis):
+            col_off = int(round((perfil[4].left - xmin) / res[0]))
+            row_off = int(round((ymax - perfil[4].top) / res[1]))
+            fontes.append(f"""
+        <SimpleSource>
+            <SourceFilename relativeToVRT="0">{escape(os.path.abspath(arquivo))}</SourceFilename>
+            <SourceBand>{banda}</SourceBand>
+            <SrcRect xOff="0" yOff="0" xSize="{perfil[5]}" ySize="{perfil[6]}"/>
+            <DstRect xOff="{col_off}" yOff="{row_off}" xSize="{perfil[5]}" ySize="{perfil[6]}"/>
+        </SimpleSource>""")
+        sem_dado = f"\n        <NoDataValue>{nodata}</NoDataValue>" if nodata is not None else ""
+        bandas.append(f"""
+    <VRTRasterBand dataType="{_TIPOS_GDAL[dtype]}" band="{banda}">{sem_dado}{''.join(fontes)}
+    </VRTRasterBand>""")
+
+    with open(caminho_vrt, "w", encoding="utf-8") as vrt:
+        vrt.write(f"""<VRTDataset rasterXSize="{largura}" rasterYSize="{altura}">
+    <SRS>{escape(crs.to_wkt())}</SRS>
+    <GeoTransform>{xmin}, {res[0]}, 0.0, {ymax}, 0.0, {-res[1]}</GeoTransform>{''.join(bandas)}
+</VRTDataset>
+""")
+    return caminho_vrt
+
+
+
+##### COG
+
+# Reescreve um raster como Cloud-Optimized GeoTIFF
+def converte_cog(origem, destino, tamanho_bloco=512, compressao="DEFLATE", preditor="YES", overviews=True, reamostragem="MODE"):
+    """
+    origem: raster ou VRT de entrada (string)
+    destino: COG de saída (string)
+    tamanho_bloco: lado dos blocos internos, em pixels (int, múltiplo de 16)
+    compressao: compressão dos blocos (DEFLATE, ZSTD, LZW, ...)
+    preditor: preditor da compressão (YES, NO, STANDARD)
+    overviews: se True, gera overviews internas (booleano)
+    reamostragem: reamostragem das overviews (MODE ou NEAREST, pois os rasters são categóricos)
+    """
+
+    rio.shutil.copy(origem, destino, driver="COG", BLOCKSIZE=int(tamanho_bloco), COMPRESS=compressao, PREDICTOR=preditor,
+                    OVERVIEWS="AUTO" if overviews else "NONE", RESAMPLING=reamostragem, BIGTIFF="IF_SAFER", NUM_THREADS="ALL_CPUS")
+    return destino
+
+
+
+##### Benchmark
+
+# Janelas de recorte (mesma regra de rasteriza_talhoes) de uma amostra de talhões
+def amostra_janelas(talhoes, caminho, n_amostra=500, semente=0):
+    """
+    talhoes: GeoDataFrame com os talhões
+    caminho: raster a ser lido (string)
+    n_amostra: número de talhões sorteados (int)
+    semente: semente do sorteio (int)
+    Retorna a lista de janelas (rasterio Window) que sobrepõem o raster
+    """
+
+    if len(talhoes) > n_amostra:
+        talhoes = talhoes.sample(n_amostra, random_state=semente)
+
+    with rio.open(caminho) as raster:
+        xmin, ymin, xmax, ymax = talhoes.geometry.to_crs(raster.crs).bounds.values.T
+        colunas_a, linhas_a = ~raster.transform * (xmin, ymax)
+        colunas_b, linhas_b = ~raster.transform * (xmax, ymin)
+        col_ini = np.clip(np.floor(np.minimum(colunas_a, colunas_b)), 0, raster.width).astype(np.int64)
+        col_fim = np.clip(np.ceil(np.maximum(colunas_a, colunas_b)), 0, raster.width).astype(np.int64)
+        lin_ini = np.clip(np.floor(np.minimum(linhas_a, linhas_b)), 0, raster.height).astype(np.int64)
+        lin_fim = np.clip(np.ceil(np.maximum(linhas_a, linhas_b)), 0, raster.height).astype(np.int64)
+
+    validas = (col_fim > col_ini) & (lin_fim > lin_ini)
+    return [Window(c0, l0, c1 - c0, l1 - l0) for c0, c1, l0, l1 in zip(col_ini[validas], col_fim[validas], lin_ini[validas], lin_fim[validas])]
+
+
+
+# Mede o tempo de leitura das janelas: uma passada de aquecimento (page cache do sistema no mesmo estado para a origem e
+# para todos os candidatos) e várias passadas medidas, cada uma em um raster recém-aberto (cache de blocos do GDAL vazio)
+def mede_leituras(caminho, janelas, repeticoes=5):
+    """
+    caminho: raster a ser lido (string)
+    janelas: retorno de amostra_janelas
+    repeticoes: número de passadas medidas depois do aquecimento (int)
+    Retorna um dicionário com o tamanho do arquivo e os tempos de leitura (total da passada mais rápida e mediana
+    das passadas; estatísticas por leitura sobre a mediana de cada janela entre as passadas)
+    """
+
+    totais = []
+    tempos = np.zeros((repeticoes, len(janelas)))
+    for passada in range(-1, repeticoes):
+        inicio = perf_counter()
+        with rio.open(caminho) as raster:
+            for posicao, janela in enumerate(janelas):
+                inicio_leitura = perf_counter()
+                raster.read(1, window=janela, masked=True)
+                if passada >= 0:
+                    tempos[passada, posicao] = perf_counter() - inicio_leitura
+        if passada >= 0:
+            totais.append(perf_counter() - inicio)
+
+    tempos = np.median(tempos, axis=0) * 1000
+    return {"tamanho_mb": round(_tamanho_arquivos(caminho) / 1024 ** 2, 1),
+            "leituras": len(tempos),
+            "repeticoes": repeticoes,
+            "total_s": round(min(totais), 3),
+            "total_mediana_s": round(float(np.median(totais)), 3),
+            "media_ms": round(float(tempos.mean()), 3) if len(tempos) else None,
+            "mediana_ms": round(float(np.median(tempos)), 3) if len(tempos) else None,
+            "p95_ms": round(float(np.percentile(tempos, 95)), 3) if len(tempos) else None}
+
+
+
+# Tamanho em disco de um raster (no caso de um VRT, soma dos arquivos que ele referencia)
+def _tamanho_arquivos(caminho):
+    with rio.open(caminho) as raster:
+        arquivos = raster.files
+    return sum(os.path.getsize(arquivo) for arquivo in arquivos if os.path.exists(arquivo))
+
+
+
+##### Preparação
+
+def prepara_raster(nome, origem, diretorio_saida=DIRETORIO_COG, talhoes=None, tamanhos_bloco=(512,), compressoes=("DEFLATE",),
+                   preditores=("YES",), overviews=True, n_amostra=500, repeticoes=5):
+    """
+    nome: nome da fonte, usado no arquivo de saída (string)
+    origem: arquivo da fonte ou lista de arquivos (fonte dividida em vários arquivos)
+    diretorio_saida: diretório do COG (e do VRT) gerado (string)
+    talhoes (opcional): GeoDataFrame com os talhões da amostra de janelas do benchmark
+    tamanhos_bloco, compressoes, preditores: valores candidatos; todas as combinações são geradas e medidas
+    overviews: se True, gera overviews internas (booleano)
+    n_amostra: número de talhões da amostra (int)
+    repeticoes: passadas medidas de cada raster depois do aquecimento, a origem e cada candidato (int)
+    Retorna um dicionário com o caminho final, a medição antes e a medição de cada layout candidato
+    """
+
+    os.makedirs(diretorio_saida, exist_ok=True)
+
+    # Fonte dividida em vários arquivos: um VRT passa a ser a entrada
+    if isinstance(origem, (list, tuple)):
+        origem = monta_vrt(origem, os.path.join(diretorio_saida, f"{nome}.vrt")) if len(origem) > 1 else origem[0]
+
+    janelas = amostra_janelas(talhoes, origem, n_amostra=n_amostra) if talhoes is not None else []
+    relatorio = {"fonte": nome, "origem": origem, "antes": mede_leituras(origem, janelas, repeticoes), "candidatos": []}
+    print(f"{nome} (antes): {relatorio['antes']}")
+
+    # Um COG por combinação de parâmetros; fica o de menor tempo total de leitura (passada mais rápida)
+    melhor = None
+    for tamanho_bloco, compressao, preditor in itertools.product(tamanhos_bloco, compressoes, preditores):
+        candidato = os.path.join(diretorio_saida, f"{nome}.b{tamanho_bloco}_{compressao.lower()}_p{preditor.lower()}.tif")
+        converte_cog(origem, candidato, tamanho_bloco=tamanho_bloco, compressao=compressao, preditor=preditor, overviews=overviews)
+        medicao = mede_leituras(candidato, janelas, repeticoes)
+        medicao.update({"tamanho_bloco": tamanho_bloco, "compressao": compressao, "preditor": preditor, "caminho": candidato})
+        relatorio["candidatos"].append(medicao)
+        print(f"{nome} (bloco {tamanho_bloco}, {compressao}, preditor {preditor}): {medicao}")
+        if melhor is None or medicao["total_s"] < melhor["total_s"]:
+            melhor = medicao
+
+    # Mantém o melhor layout com o nome final e remove os demais candidatos
+    caminho_final = os.path.join(diretorio_saida, f"{nome}.tif")
+    for medicao in relatorio["candidatos"]:
+        if medicao is not melhor:
+            os.remove(medicao["caminho"])
+    os.replace(melhor["caminho"], caminho_final)
+    melhor["caminho"] = caminho_final
+    relatorio["escolhido"] = melhor
+
+    print(f"{nome}: layout escolhido bloco {melhor['tamanho_bloco']}, {melhor['compressao']}, preditor {melhor['preditor']} -> {caminho_final} "
+          f"(leitura {relatorio['antes']['total_s']} s -> {melhor['total_s']} s, tamanho {relatorio['antes']['tamanho_mb']} MB -> {melhor['tamanho_mb']} MB)")
+    return relatorio
+
+
+
+def prepara_rasters(fontes, diretorio_saida=DIRETORIO_COG, caminho_talhoes=CAMINHO_TALHOES_AMOSTRA, **kwargs):
+    """
+    fontes: dicionário nome -> arquivo (ou lista de arquivos) de cada fonte
+    diretorio_saida: diretório dos COGs gerados (string)
+    caminho_talhoes: arquivo vetorial com os talhões da amostra de janelas (string ou None para não medir)
+    kwargs: repassados para prepara_raster
+    Retorna a lista de relatórios de prepara_raster
+    """
+
+    talhoes = gpd.read_file(caminho_talhoes) if caminho_talhoes is not None and os.path.exists(caminho_talhoes) else None
+    if talhoes is None:
+        print("Talhões da amostra não encontrados: os layouts serão gerados sem benchmark de leitura")
+
+    return [prepara_raster(nome, origem, diretorio_saida=diretorio_saida, talhoes=talhoes, **kwargs) for nome, origem in fontes.items()]
+
+
+
+# Linha de comando (python prepara_rasters.py ou autolandcover prepare-rasters)
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Reescreve os rasters de entrada como COGs e mede o tempo de leitura por talhão")
+    parser.add_argument("--fonte", nargs="+", action="append", metavar=("NOME", "ARQUIVO"),
+                        help="fonte a preparar: nome seguido de um ou mais arquivos (padrão: rasters do processamento)")
+    parser.add_argument("--saida", default=DIRETORIO_COG, help="diretório dos COGs gerados")
+    parser.add_argument("--talhoes", default=CAMINHO_TALHOES_AMOSTRA, help="arquivo vetorial com os talhões da amostra")
+    parser.add_argument("--amostra", type=int, default=500, help="número de talhões da amostra")
+    parser.add_argument("--bloco", type=int, nargs="+", default=[512], help="tamanhos de bloco candidatos")
+    parser.add_argument("--compressao", nargs="+", default=["DEFLATE"], help="compressões candidatas")
+    parser.add_argument("--preditor", nargs="+", default=["YES"], help="preditores candidatos")
+    parser.add_argument("--repeticoes", type=int, default=5, help="passadas medidas de cada raster, depois de uma de aquecimento")
+    parser.add_argument("--sem-overviews", action="store_true", help="não gera overviews internas")
+    argumentos = parser.parse_args(argv)
+
+    fontes = {fonte[0]: fonte[1:] for fonte in argumentos.fonte} if argumentos.fonte else fontes_processamento()
+    prepara_rasters(fontes, diretorio_saida=argumentos.saida, caminho_talhoes=argumentos.talhoes, n_amostra=argumentos.amostra,
+                    tamanhos_bloco=argumentos.bloco, compressoes=argumentos.compressao, preditores=argumentos.preditor,
+                    overviews=not argumentos.sem_overviews, repeticoes=argumentos.repeticoes)
+
+
+
+if __name__ == "__main__":
+    main()
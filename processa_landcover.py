@@ -1,142 +1,446 @@
-import os
-import traceback
-from time import time
-import pandas as pd
-import geopandas as gpd
-from sqlalchemy import create_engine
-from dotenv import load_dotenv
-from auto_landcover_tools import preenche_atributos_raster, preenche_atributos_vetorial, busca_estradas
-
-# Carregando Variáveis de ambiente
-load_dotenv(".env")
-USER = os.environ.get("USER")
-GISDB_GISREP_PASSWORD = os.environ.get("GISDB_GISREP_PASSWORD")
-ANOTACOES_SR_DB_PASSWORD = os.environ.get("ANOTACOES_SR_DB_PASSWORD")
-
-GISDB_NAME = os.environ.get("GISDB_NAME")
-GISREP_NAME = os.environ.get("GISREP")
-GISREP_GISDB_HOST = os.environ.get("GISREP_GISDB_HOST")
-ANOTACOES_SR_DB_NAME = os.environ.get("ANOTACOES_SR_DB_NAME")
-ANOTACOES_SR_DB_HOST = os.environ.get("ANOTACOES_SR_DB_HOST")
-PORT = os.environ.get("PORT")
-
-def processa_landcover(lista_fontes, roads_in=None):
-    # Iniciando processamento
-    print("\nIniciando processamento...\n")
-    inicio = time()
-    
-    # Leitura do banco de dados
-    print("Realizando leitura do banco de dados...")
-    conn_anotacoes_sr_db = create_engine(f'postgresql://{USER}:{ANOTACOES_SR_DB_PASSWORD}@{ANOTACOES_SR_DB_HOST}:{PORT}/{ANOTACOES_SR_DB_NAME}')
-    # conn_gisdb = create_engine(f'postgresql://{USER}:{GISDB_GISREP_PASSWORD}@{GISREP_GISDB_HOST}:{PORT}/{GISDB_NAME}')
-    # conn_gisrep = create_engine(f'postgresql://{USER}:{GISDB_GISREP_PASSWORD}@{GISREP_GISDB_HOST}:{PORT}/{GISREP_NAME}')
-
-    # # Consultando bases
-    # print("Consultando base de grãos...")
-    # base_graos = gpd.GeoDataFrame.from_postgis("""
-    #                                                SELECT *
-    #                                                FROM "bmp11"."tb_grbrasil_112023"
-    #                                                """,
-    #                                                con=conn_gisdb, geom_col="geom", crs=4674).rename(columns={"geom":"geometry"}).set_geometry("geometry").to_crs("EPSG:4326")
-
-    # print("Consultando base canasat...\n")
-    # base_cnsat = gpd.GeoDataFrame.from_postgis("""
-    #                                            SELECT *
-    #                                            FROM "cst14"."tb_cnsat_142023"
-    #                                            """,
-    #                                            con=conn_gisdb, geom_col="geom", crs=4674).rename(columns={"geom":"geometry"}).set_geometry("geometry").to_crs("EPSG:4326")
-    # base_cnsat["cultura"] = "cana" # Adicionando coluna "cultura para padronizar com base de grãos"
-
-    # # Tempo de carregamento
-    # carregamento = time()
-    # print(f"Tempo de carregamento dos dados vetoriais: {carregamento-inicio} segundos\n")
-
-    # Obtendo áreas de interesse
-    areas_de_interesse = gpd.GeoDataFrame.from_postgis("""
-                                            SELECT *
-                                            FROM "remote_sensing"."fields_valuation"
-                                            """,
-                                            con=conn_anotacoes_sr_db,
-                                            geom_col="geom",
-                                            crs=4326).rename(columns={"geom":"geometry"}).set_geometry("geometry")
-
-    # Lista de áreas de interesse a serem valoradas
-    lista_id = list(areas_de_interesse["interest_area_id"].unique())
-
-    # Preparando geodataframe que irá receber a saída da análise de uso e cobertura (uma cópia do original)
-    gdf_final = areas_de_interesse.copy()
-    gdf_final = gdf_final[0:0]
-    # Adicionando nova coluna
-    gdf_final["classes_possiveis"] = None
-    
-    total_erros = 0
-    for fonte in lista_fontes:
-        # Análise de uso e cobertura
-        print("Iniciando uso e cobertura...")
-        parcial = time()
-        contador = 1
-        erros = 0
-        for interest_area_id in lista_id:
-            print(f"Preenchendo área {contador} de {len(lista_id)} ({fonte}) - ID {interest_area_id}.")
-            try:
-                area_de_interesse = areas_de_interesse[areas_de_interesse["interest_area_id"] == interest_area_id].reset_index(drop=True)
-
-                ############ zerando as colunas da área de interesse
-                area_de_interesse[["class", "conversion_year", "irrigation",
-                                "crops_per_year", "created_by", "created_at",
-                                "modified_by", "modified_at", "paved_road"]] = None
-                # Adicionando nova coluna
-                area_de_interesse["classes_possiveis"] = None
-
-                # Filtragem espacial das bases
-                # dissolve_area_de_interesse = area_de_interesse.dissolve().reset_index(drop=True).loc[0, "geometry"]
-                # base_graos_filtrada = base_graos[base_graos.intersects(dissolve_area_de_interesse)]
-                # base_cnsat_filtrada = base_cnsat[base_cnsat.intersects(dissolve_area_de_interesse)]
-
-                # Executando funções para preenchimento de campos
-                # gdf_out = preenche_atributos_vetorial(area_de_interesse, [base_graos_filtrada, base_cnsat_filtrada])
-                # gdf_out = preenche_atributos_raster(gdf_out, r"assets\brasil_sentinel_coverage_2022.tif")
-                
-                # Preenchendo os campos com raster
-                if fonte == "mapbiomas":
-                    gdf_out = preenche_atributos_raster(area_de_interesse, lulc_raster_in_path=r"assets\landcover\brasil_sentinel_coverage_2022_mapbiomas.tif", irrigation_raster_in_path=r"assets\irrigacao\processado\irrigacao_ana_mapbiomas.tif", lulc_origem_dict="mapbiomas")
-                elif fonte == "simfaz":
-                    gdf_out = preenche_atributos_raster(area_de_interesse, lulc_raster_in_path=r"assets\landcover\uso_terra_simfaz_2021.tif", irrigation_raster_in_path=r"assets\irrigacao\processado\irrigacao_ana_mapbiomas.tif", lulc_origem_dict="simfaz")
-                elif fonte == "agrosatelite":
-                    gdf_out = preenche_atributos_raster(area_de_interesse, lulc_raster_in_path=r"assets\landcover\remote_sensing_landuse_2022_2023_2023_09_30.tif", irrigation_raster_in_path=r"assets\irrigacao\processado\irrigacao_ana_mapbiomas.tif", lulc_origem_dict="agrosatelite")
-                
-                # Preenchendo paved_road
-                if roads_in is None:
-                    gdf_out = busca_estradas(gdf_out)
-                else:
-                    gdf_out = busca_estradas(gdf_out, roads_in=roads_in)
-
-                # Retorna resultados ao SRC de entrada e junta ao gdf final
-                gdf_out = gdf_out.to_crs(gdf_final.crs)
-                gdf_final = pd.concat([gdf_final, gdf_out], ignore_index=True).set_geometry("geometry").set_crs("EPSG:4326")
-                
-                # Fim da análise atual
-                print(f"Área {contador} de {len(lista_id)} concluída ({fonte}).\n")
-            
-            except Exception as e:
-                erros += 1
-                total_erros += 1
-                print(e)
-                print(f"ERRO - Área {contador} de {len(lista_id)}.\nFONTE - {fonte}\n")
-                traceback.print_exc()
-
-            contador += 1
-        
-        # Finalizando processamento parcial
-        print(f"Finalizando processamento {fonte}")
-        print(f"Erros nesta sessão: {erros}")
-        print(f"Tempo decorrido nesta sessão: {int((time()-parcial)/60)} minutos\n")
-
-        # Arquivo geojson de saída
-        gdf_final.to_file(f"saidas\saida_script_{fonte}.geojson")
-
-    # Final processamento
-    final = time()
-    print("Finalizando processatmento...")
-    print(f"Total de erros: {total_erros}")
-    print(f"Tempo total: {int((final-inicio)/60)} minutos")
\ No newline at end of file
+import os
+import argparse
+import traceback
+from uuid import uuid4
+from time import time
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import geopandas as gpd
+from auto_landcover_tools import preenche_atributos_multiraster, preenche_atributos_vetorial, busca_estradas, busca_estradas_lote
+from pool_rasters import configura_cache, estatisticas_pool, fecha_rasters, regioes_compartilhadas
+from cache_histogramas import configura_cache_histogramas, estatisticas_cache_histogramas
+from indice_estradas import constroi_indice_estradas, indice_estradas_padrao, CAMINHO_INDICE_ESTRADAS
+from agendador_areas import ordena_areas, itera_areas
+from escrita_resultados import abre_escrita, area_concluida, escreve_area, remove_talhoes, fecha_escrita
+from acesso_dados import engine, le_areas_lotes, grava_valoracoes, TAMANHO_LOTE, COLUNAS_AREAS
+from validacao_geometrias import valida_talhoes
+from serie_temporal import preenche_conversao
+from blocos_compartilhados import prepara_regioes, libera_regioes
+from fontes_valoracao import RASTER_IRRIGACAO, RASTERS_LULC, origem_raster, origem_estradas
+from estado_incremental import (abre_estado, impressao_rasters, hash_geometrias, estado_talhoes, talhoes_alterados, talhoes_saidos, areas_alteradas, marca_lidos,
+                                registra_talhoes, talhoes_removidos, esquece_talhoes, fecha_estado)
+from instrumentacao import (configura_instrumentacao, log, etapa, contexto, conta, itera_medindo, coleta_instrumentacao, incorpora_instrumentacao,
+                            resumo_instrumentacao, zera_instrumentacao, exporta_jsonl, exporta_prometheus)
+
+# Valor usado quando a busca de estradas do cluster da área falhou
+ERRO_ESTRADAS = "__ERRO_ESTRADAS__"
+
+# Estado de cada processo (handles de raster ficam no pool_rasters do próprio processo)
+_worker = {}
+
+
+
+# Inicializa o processo worker: cache do GDAL, cache de histogramas, índice de estradas, série temporal e instrumentação ficam no processo
+def _inicializa_worker(roads_in, cache_gdal_mb, diretorio_cache_histogramas=None, cache_histogramas_mb=1024, nivel_log="INFO", registra_spans=False,
+                       serie=None):
+    configura_instrumentacao(nivel_log, registra_spans)
+    zera_instrumentacao()           # um processo criado por fork herda os totais já acumulados pelo processo principal
+    configura_cache(cache_gdal_mb)
+    configura_cache_histogramas(diretorio_cache_histogramas, cache_histogramas_mb)
+    _worker["roads_in"] = roads_in
+    _worker["serie"] = serie
+
+
+
+# Executa uma área capturando o erro (com traceback) para que uma falha não interrompa as demais
+# A instrumentação acumulada na área (spans, contadores e pico de memória do processo) volta junto com o resultado
+# As janelas cobertas por regiões já decodificadas em memória compartilhada são lidas como visões dessas regiões
+def _processa_area_worker(tarefa):
+    interest_area_id, area_de_interesse, lista_fontes, lista_rasters, paved_road, regioes = tarefa
+    gdfs_out, erro = None, None
+    with contexto(area=interest_area_id), etapa("area", talhoes=len(area_de_interesse)):
+        try:
+            with regioes_compartilhadas(regioes):
+                gdfs_out = processa_area(area_de_interesse, lista_fontes, lista_rasters, paved_road=paved_road, roads_in=_worker.get("roads_in"),
+                                         serie=_worker.get("serie"))
+        except Exception:
+            erro = traceback.format_exc()
+    return interest_area_id, gdfs_out, erro, coleta_instrumentacao()
+
+
+
+# Tarefas de um lote: uma por área de interesse, na ordem de lista_id
+def _tarefas(areas_de_interesse, lista_id, lista_fontes, lista_rasters, estradas_por_area=None, regioes_por_area=None):
+    for interest_area_id, area_de_interesse in itera_areas(areas_de_interesse, ids=lista_id):
+        paved_road = None
+        if estradas_por_area is not None:
+            paved_road = estradas_por_area.get(interest_area_id, ERRO_ESTRADAS)
+        regioes = regioes_por_area.get(interest_area_id) if regioes_por_area is not None else None
+        yield interest_area_id, area_de_interesse, lista_fontes, lista_rasters, paved_road, regioes
+
+
+
+# Valora uma área de interesse para todas as fontes
+def processa_area(area_de_interesse, lista_fontes, lista_rasters, paved_road=None, roads_in=None, serie=None):
+    """
+    area_de_interesse: GeoDataFrame com os talhões de uma área de interesse
+    lista_fontes: fontes de land cover (mapbiomas, simfaz, agrosatelite)
+    lista_rasters: rasters no formato de preenche_atributos_multiraster
+    paved_road: valor de paved_road já obtido em lote para a área (string) ou None para buscar com roads_in
+    roads_in: estradas (índice de indice_estradas.py) usadas quando paved_road não é informado
+    serie (opcional): argumentos de serie_temporal.preenche_conversao (caminho, origem_dict, anos) para preencher conversion_year
+    Retorna um dicionário fonte -> GeoDataFrame preenchido
+    """
+
+    ############ zerando as colunas da área de interesse
+    area_de_interesse = area_de_interesse.copy()
+    area_de_interesse[["class", "conversion_year", "irrigation",
+                    "crops_per_year", "created_by", "created_at",
+                    "modified_by", "modified_at", "paved_road"]] = None
+
+    # Filtragem espacial das bases
+    # dissolve_area_de_interesse = area_de_interesse.dissolve().reset_index(drop=True).loc[0, "geometry"]
+    # base_graos_filtrada = base_graos[base_graos.intersects(dissolve_area_de_interesse)]
+    # base_cnsat_filtrada = base_cnsat[base_cnsat.intersects(dissolve_area_de_interesse)]
+
+    # Executando funções para preenchimento de campos
+    # gdf_out = preenche_atributos_vetorial(area_de_interesse, [base_graos_filtrada, base_cnsat_filtrada])
+    # gdf_out = preenche_atributos_raster(gdf_out, r"assets\brasil_sentinel_coverage_2022.tif")
+
+    # Preenchendo os campos com todos os rasters de uma vez
+    gdf_multi = preenche_atributos_multiraster(area_de_interesse, lista_rasters)
+
+    # Ano de conversão a partir da série temporal (igual para todas as fontes), com uma única leitura de todos os anos
+    if serie is not None:
+        gdf_multi = preenche_conversao(gdf_multi, **serie)
+
+    # Preenchendo paved_road (igual para todas as fontes)
+    if paved_road == ERRO_ESTRADAS:
+        raise RuntimeError("Falha na busca de estradas do cluster desta área.")
+    elif paved_road is not None:
+        gdf_multi["paved_road"] = paved_road
+    else:
+        gdf_multi = busca_estradas(gdf_multi, roads_in=roads_in)
+
+    # Hash da geometria valorada (com as origens gravadas nas saídas, permite reaproveitar as valorações com segurança)
+    gdf_multi["hash_geometria"] = hash_geometrias(area_de_interesse.geometry)
+
+    # Separa o resultado de cada fonte
+    gdfs_out = {}
+    with etapa("concatenacao"):
+        for fonte in lista_fontes:
+            gdf_out = gdf_multi.drop(columns=[col for f in lista_fontes if f != fonte for col in (f"class_{f}", f"class_{f}_codigo", f"classes_possiveis_{f}")])
+            gdfs_out[fonte] = gdf_out.drop(columns=["class"]).rename(columns={f"class_{fonte}":"class", f"class_{fonte}_codigo":"class_codigo",
+                                                                              f"classes_possiveis_{fonte}":"classes_possiveis"})
+
+    return gdfs_out
+
+
+
+# Grava no banco as valorações de um lote de áreas
+def _grava_lote_banco(valoracoes_lote, fonte_banco=None, tabela_staging=None):
+    for fonte, gdfs_fonte in valoracoes_lote.items():
+        if not gdfs_fonte:
+            continue
+        with etapa("concatenacao", fonte=fonte):
+            gdf_fonte = pd.concat(gdfs_fonte, ignore_index=True)
+        with etapa("escrita_banco", fonte=fonte, talhoes=len(gdf_fonte)):
+            if tabela_staging is not None:
+                grava_valoracoes(gdf_fonte, fonte=fonte, tabela_staging=tabela_staging)
+            if fonte == fonte_banco:
+                grava_valoracoes(gdf_fonte)
+
+
+
+def processa_landcover(lista_fontes, roads_in=None, cache_gdal_mb=512, diretorio_cache_osm=None, offline=False, n_processos=1, diretorio_saida="saidas", retomar=False,
+                       ids_areas=None, bbox=None, colunas_areas=None, tamanho_lote=TAMANHO_LOTE, fonte_banco=None, tabela_staging=None,
+                       incremental=False, diretorio_cache_histogramas=None, cache_histogramas_mb=1024,
+                       raster_serie=None, origem_serie="mapbiomas", anos_serie=None,
+                       blocos_compartilhados=False, memoria_blocos_mb=2048, diretorio_blocos=None,
+                       nivel_log="INFO", caminho_metricas_jsonl=None, caminho_metricas_prometheus=None):
+    """
+    lista_fontes: fontes de land cover a processar (mapbiomas, simfaz, agrosatelite)
+    roads_in (opcional): GeoDataFrame ou índice de estradas; sem ele, as estradas vêm do OSM
+    cache_gdal_mb: tamanho do cache de blocos do GDAL em cada processo (int)
+    diretorio_cache_osm, offline: cache local de estradas do OSM (ver cache_estradas.py)
+    n_processos: número de processos para valorar as áreas em paralelo (int, 1 = em série)
+    diretorio_saida: diretório dos arquivos saida_script_{fonte}.gpkg e do journal de áreas concluídas (string)
+    retomar: se True, continua uma execução interrompida a partir do journal (as áreas já registradas são puladas);
+             se False, apaga as saídas, o journal e o estado incremental anteriores e recomeça do zero (booleano).
+             Na execução incremental, as saídas e o estado são sempre mantidos
+    ids_areas, bbox (opcionais): filtros das áreas lidas do banco (ver acesso_dados.le_areas_lotes)
+    colunas_areas (opcional): colunas de fields_valuation copiadas para as saídas (lista, padrão id e interest_area_id)
+    tamanho_lote: número de talhões lidos do banco por vez (int)
+    fonte_banco (opcional): fonte cujas valorações são gravadas de volta em fields_valuation (string)
+    tabela_staging (opcional): tabela de staging que recebe as valorações de todas as fontes (string)
+    incremental: se True, só valora as áreas com talhões novos, com geometria, área ou modified_at alterados, cujos rasters mudaram
+                 ou que perderam talhões; os talhões removidos da tabela saem das saídas (exceto com bbox),
+                 substituindo as linhas desses talhões nas saídas anteriores (booleano)
+    diretorio_cache_histogramas (opcional): diretório do cache de histogramas por talhão (ver cache_histogramas.py)
+    cache_histogramas_mb: tamanho máximo do cache de histogramas, em megabytes (int)
+    raster_serie (opcional): raster com uma banda por ano (stack ou VRT das coleções anuais) que preenche conversion_year (ver serie_temporal.py)
+    origem_serie: dicionário de classes das bandas da série (string)
+    anos_serie (opcional): ano da primeira banda ou lista com o ano de cada banda (sem ele, os anos vêm das descrições das bandas)
+    blocos_compartilhados: se True, as regiões dos rasters lidas por mais de uma área do lote são decodificadas uma única vez
+                           em memória compartilhada pelos processos (ver blocos_compartilhados.py); com ele, o cache_gdal_mb
+                           de cada processo pode ser pequeno (booleano)
+    memoria_blocos_mb: limite das regiões compartilhadas de cada lote, em megabytes (int)
+    diretorio_blocos (opcional): diretório dos arquivos das regiões (padrão /dev/shm, quando existe)
+    nivel_log: nível mínimo das mensagens exibidas (DEBUG mostra o andamento de cada área; INFO, AVISO ou ERRO)
+    caminho_metricas_jsonl (opcional): arquivo JSON lines que recebe os spans de cada etapa por área e o resumo final (string)
+    caminho_metricas_prometheus (opcional): textfile do Prometheus com os totais por etapa e os contadores, atualizado a cada lote (string)
+    """
+
+    # Instrumentação: tempo por etapa, contadores e pico de memória (spans por área só se forem exportados)
+    registra_spans = caminho_metricas_jsonl is not None
+    configura_instrumentacao(nivel_log, registra_spans)
+    zera_instrumentacao()
+
+    # Iniciando processamento
+    log("\nIniciando processamento...\n")
+    inicio = time()
+
+    # Estradas informadas: o índice espacial é construído uma única vez para todas as áreas
+    if isinstance(roads_in, gpd.GeoDataFrame):
+        roads_in = constroi_indice_estradas(roads_in)
+
+    # Cache de blocos do GDAL compartilhado pelas leituras de todas as áreas
+    configura_cache(cache_gdal_mb)
+    estatisticas_pool(zerar=True)
+    estatisticas_cache_histogramas(zerar=True)
+
+    # # Consultando bases
+    # print("Consultando base de grãos...")
+    # base_graos = gpd.GeoDataFrame.from_postgis("""
+    #                                                SELECT *
+    #                                                FROM "bmp11"."tb_grbrasil_112023"
+    #                                                """,
+    #                                                con=engine("gisdb"), geom_col="geom", crs=4674).rename(columns={"geom":"geometry"}).set_geometry("geometry").to_crs("EPSG:4326")
+
+    # print("Consultando base canasat...\n")
+    # base_cnsat = gpd.GeoDataFrame.from_postgis("""
+    #                                            SELECT *
+    #                                            FROM "cst14"."tb_cnsat_142023"
+    #                                            """,
+    #                                            con=engine("gisdb"), geom_col="geom", crs=4674).rename(columns={"geom":"geometry"}).set_geometry("geometry").to_crs("EPSG:4326")
+    # base_cnsat["cultura"] = "cana" # Adicionando coluna "cultura para padronizar com base de grãos"
+
+    # # Tempo de carregamento
+    # carregamento = time()
+    # print(f"Tempo de carregamento dos dados vetoriais: {carregamento-inicio} segundos\n")
+
+    # Saídas gravadas área a área (um GeoPackage por fonte); com retomar=True, as áreas já registradas no journal são puladas
+    # A execução incremental atualiza as saídas anteriores; uma execução completa do zero invalida o estado incremental
+    caminho_estado = os.path.join(diretorio_saida, "estado_talhoes.sqlite")
+    escrita = abre_escrita(diretorio_saida, lista_fontes, retomar=retomar or incremental)
+    if not incremental and not retomar and os.path.exists(caminho_estado):
+        os.remove(caminho_estado)
+
+    # Rasters avaliados em uma única chamada por área (irrigação + land cover de todas as fontes)
+    lista_rasters = [{"caminho": RASTER_IRRIGACAO, "origem_dict": "irrigacao", "coluna": "irrigation", "coluna_classes_possiveis": None}]
+    for fonte in lista_fontes:
+        lista_rasters.append({"caminho": RASTERS_LULC[fonte], "origem_dict": fonte,
+                              "coluna": f"class_{fonte}", "coluna_classes_possiveis": f"classes_possiveis_{fonte}",
+                              "coluna_codigo": f"class_{fonte}_codigo"})
+
+    # Origem de cada atributo valorado, gravada junto com as saídas de cada fonte (ver fontes_valoracao.py)
+    origens = {"origem_irrigation": origem_raster(RASTER_IRRIGACAO, "irrigacao"),
+               "origem_paved_road": origem_estradas(roads_in, diretorio_cache_osm)}
+    origens = {fonte: {"origem_class": origem_raster(RASTERS_LULC[fonte], fonte), **origens} for fonte in lista_fontes}
+
+    # Execução incremental: estado dos talhões já valorados (hash da geometria, modified_at, área e impressão dos rasters)
+    # Com bbox, áreas podem ser lidas pela metade, então talhões que saíram da tabela não são detectados
+    colunas_leitura = colunas_areas
+    if incremental:
+        execucao = uuid4().hex
+        detecta_removidos = bbox is None
+        if not detecta_removidos:
+            log("Execução incremental com bbox: talhões removidos da tabela não são retirados das saídas", "AVISO")
+        estado = abre_estado(caminho_estado)
+        impressao = impressao_rasters([raster["caminho"] for raster in lista_rasters] + ([raster_serie] if raster_serie is not None else []))
+        colunas_leitura = list(dict.fromkeys((COLUNAS_AREAS if colunas_areas is None else list(colunas_areas)) + ["id", "modified_at"]))
+
+    # Análise de uso e cobertura (em série ou em um pool de processos reaproveitado por todos os lotes)
+    log("Iniciando uso e cobertura...")
+    serie = None
+    if raster_serie is not None:
+        serie = {"caminho": raster_serie, "origem_dict": origem_serie, "anos": anos_serie}
+    parametros_worker = (roads_in, cache_gdal_mb, diretorio_cache_histogramas, cache_histogramas_mb, nivel_log, registra_spans, serie)
+    if n_processos > 1:
+        log(f"Processando em paralelo com {n_processos} processos")
+        executor = ProcessPoolExecutor(max_workers=n_processos, initializer=_inicializa_worker, initargs=parametros_worker)
+        mapeia = executor.map
+    else:
+        executor = None
+        _inicializa_worker(*parametros_worker)
+        mapeia = map
+
+    # Áreas lidas do banco em lotes (só as colunas necessárias), para que a memória não cresça com a tabela
+    log("Realizando leitura do banco de dados...")
+    contador = 1
+    total_erros = 0
+    lotes = itera_medindo("leitura_banco", le_areas_lotes(colunas=colunas_leitura, ids=ids_areas, bbox=bbox, tamanho_lote=tamanho_lote))
+    for n_lote, areas_de_interesse in enumerate(lotes, start=1):
+        conta("talhoes_lidos", len(areas_de_interesse))
+
+        # Ingestão: geometrias validadas e reparadas de uma vez para o lote (as etapas seguintes partem de geometrias válidas)
+        areas_de_interesse = valida_talhoes(areas_de_interesse)
+
+        # Execução incremental: mantém só as áreas com algum talhão novo, alterado ou que saiu da área (as demais são puladas)
+        # Todos os talhões dessas áreas são valorados de novo, pois o paved_road depende da área inteira
+        if incremental:
+            atual = estado_talhoes(areas_de_interesse, impressao)
+            marca_lidos(estado, atual, execucao)
+            alterados = talhoes_alterados(estado, atual)
+            areas_saidos = []
+            if detecta_removidos:
+                saidos, areas_saidos = talhoes_saidos(estado, atual)
+                if saidos:
+                    remove_talhoes(escrita, saidos)
+                    esquece_talhoes(estado, saidos)
+            manter = areas_alteradas(atual, alterados, areas_saidos)
+            log(f"Lote {n_lote}: {alterados.sum()} de {len(alterados)} talhões novos ou alterados; "
+                f"{manter.sum()} talhões valorados nas áreas afetadas")
+            areas_de_interesse = areas_de_interesse[manter].reset_index(drop=True)
+            atual = atual[manter]
+
+        # Áreas do lote na ordem da curva de Hilbert (áreas vizinhas em sequência), sem as já concluídas
+        # (na execução incremental, o estado dos talhões faz o papel do journal)
+        lista_id = ordena_areas(areas_de_interesse)
+        total_areas = len(lista_id)
+        if not incremental:
+            lista_id = [interest_area_id for interest_area_id in lista_id if not area_concluida(escrita, interest_area_id)]
+        log(f"Lote {n_lote}: {total_areas} áreas")
+        if len(lista_id) < total_areas:
+            log(f"Retomando: {total_areas - len(lista_id)} de {total_areas} áreas do lote já concluídas")
+        if not lista_id:
+            continue
+
+        # Estradas do OSM buscadas em lote, uma consulta por cluster de áreas vizinhas
+        estradas_por_area = None
+        if roads_in is None:
+            estradas_por_area = busca_estradas_lote(areas_de_interesse[areas_de_interesse["interest_area_id"].isin(lista_id).values], diretorio_cache=diretorio_cache_osm, offline=offline)
+
+        # Regiões dos rasters lidas por mais de uma área do lote, decodificadas uma única vez (pelos próprios workers)
+        diretorio_regioes, regioes_por_area = None, None
+        if blocos_compartilhados:
+            diretorio_regioes, regioes_por_area = prepara_regioes(areas_de_interesse[areas_de_interesse["interest_area_id"].isin(lista_id).values],
+                                                                  [raster["caminho"] for raster in lista_rasters], mapeia=mapeia,
+                                                                  diretorio=diretorio_blocos, memoria_mb=memoria_blocos_mb)
+
+        # Valorações do lote que vão para o banco (gravadas de uma vez ao final do lote)
+        valoracoes_lote = {fonte: [] for fonte in lista_fontes}
+
+        # Os resultados chegam sempre na ordem de lista_id
+        resultados = mapeia(_processa_area_worker, _tarefas(areas_de_interesse, lista_id, lista_fontes, lista_rasters, estradas_por_area, regioes_por_area))
+        for interest_area_id, gdfs_out, erro, instrumentacao_area in resultados:
+            incorpora_instrumentacao(instrumentacao_area)
+            if erro is None:
+                # Retorna resultados ao SRC de entrada e anexa ao arquivo de cada fonte
+                with contexto(area=interest_area_id), etapa("escrita_gpkg"):
+                    for fonte, gdf_out in gdfs_out.items():
+                        escreve_area(escrita, fonte, interest_area_id, gdf_out.assign(**origens[fonte]).to_crs(areas_de_interesse.crs),
+                                     substituir=incremental)
+                        valoracoes_lote[fonte].append(gdf_out)
+                conta("areas_processadas")
+                conta("talhoes_processados", len(gdf_out))
+
+                # Os talhões só entram no estado depois de gravados em todas as fontes
+                if incremental:
+                    registra_talhoes(estado, atual.loc[gdf_out["id"].astype(str).values], execucao)
+
+                # Fim da análise atual
+                log(f"Área {contador} concluída (lote {n_lote}) - ID {interest_area_id}.\n", "DEBUG")
+
+            else:
+                total_erros += 1
+                conta("areas_com_erro")
+                log(f"ERRO - Área {contador} (lote {n_lote}) - ID {interest_area_id}.\nFONTES - {', '.join(lista_fontes)}\n{erro}", "ERRO")
+
+            contador += 1
+
+        # Todas as áreas do lote já foram valoradas: as regiões compartilhadas podem ser removidas
+        libera_regioes(diretorio_regioes)
+
+        # Escrita em massa das valorações do lote (COPY + um único comando por destino)
+        if fonte_banco is not None or tabela_staging is not None:
+            _grava_lote_banco(valoracoes_lote, fonte_banco, tabela_staging)
+
+        # Métricas exportadas a cada lote (uma execução longa pode ser acompanhada enquanto roda)
+        if caminho_metricas_jsonl is not None:
+            exporta_jsonl(caminho_metricas_jsonl)
+        if caminho_metricas_prometheus is not None:
+            exporta_prometheus(caminho_metricas_prometheus)
+        log(f"Lote {n_lote} concluído: {contador - 1} áreas até aqui, {total_erros} com erro")
+
+    if executor is not None:
+        executor.shutdown()
+
+    # Execução incremental: talhões de áreas que não foram mais lidas (removidas da tabela) saem das saídas e do estado
+    if incremental and detecta_removidos:
+        removidos = talhoes_removidos(estado, execucao, ids_areas=ids_areas)
+        if removidos:
+            log(f"{len(removidos)} talhões removidos da tabela retirados das saídas")
+            remove_talhoes(escrita, removidos)
+            esquece_talhoes(estado, removidos)
+
+    fecha_escrita(escrita)
+    if incremental:
+        fecha_estado(estado)
+
+    # Final processamento
+    log("Finalizando processamento...")
+    log(f"Total de erros: {total_erros}")
+    log(f"Estatísticas de leitura dos rasters: {estatisticas_pool()}")
+    if diretorio_cache_histogramas is not None:
+        log(f"Estatísticas do cache de histogramas: {estatisticas_cache_histogramas()}")
+    fecha_rasters()
+
+    # Tempo por etapa (somado entre os processos), contadores e pico de memória
+    resumo = resumo_instrumentacao()
+    log("Tempo por etapa (s): " + ", ".join(f"{nome} {total['segundos']}" for nome, total in resumo["etapas"].items()))
+    log(f"Contadores: {resumo['contadores']}")
+    log(f"Pico de memória residente (MB, por processo): {resumo['pico_rss_mb']}")
+    if caminho_metricas_jsonl is not None:
+        exporta_jsonl(caminho_metricas_jsonl, final=True)
+    if caminho_metricas_prometheus is not None:
+        exporta_prometheus(caminho_metricas_prometheus)
+    log(f"Tempo decorrido: {int((time()-inicio)/60)} minutos\n")
+
+
+
+# Linha de comando (python processa_landcover.py ou autolandcover process)
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Valora os talhões do banco (land cover, irrigação e estradas) e grava as saídas por fonte")
+    parser.add_argument("--fontes", nargs="+", default=list(RASTERS_LULC), choices=list(RASTERS_LULC), help="fontes de land cover")
+    parser.add_argument("--processos", type=int, default=os.cpu_count(), help="processos que valoram as áreas em paralelo")
+    parser.add_argument("--saida", default="saidas", help="diretório das saídas e do journal")
+    parser.add_argument("--retomar", action="store_true", help="continua uma execução interrompida, pulando as áreas já registradas no journal")
+    parser.add_argument("--incremental", action="store_true", help="só valora as áreas com talhões novos ou alterados desde a última execução, atualizando as saídas")
+    parser.add_argument("--areas", nargs="+", type=int, help="interest_area_id das áreas a valorar")
+    parser.add_argument("--bbox", nargs=4, type=float, metavar=("XMIN", "YMIN", "XMAX", "YMAX"), help="retângulo das áreas a valorar (EPSG:4326)")
+    parser.add_argument("--indice-estradas", nargs="?", const=CAMINHO_INDICE_ESTRADAS,
+                        help="índice de estradas usado no lugar do OSM (sem arquivo, o índice padrão; se não existir, é construído a partir do PostGIS)")
+    parser.add_argument("--cache-osm", help="diretório do cache local de estradas do OSM")
+    parser.add_argument("--offline", action="store_true", help="usa apenas o cache local de estradas, sem acessar o OSM")
+    parser.add_argument("--cache-gdal", type=int, default=512, help="cache de blocos do GDAL por processo, em megabytes")
+    parser.add_argument("--cache-histogramas", help="diretório do cache de histogramas por talhão")
+    parser.add_argument("--serie", help="raster com uma banda por ano (stack ou VRT das coleções anuais) que preenche conversion_year")
+    parser.add_argument("--origem-serie", default="mapbiomas", choices=list(RASTERS_LULC), help="dicionário de classes das bandas da série")
+    parser.add_argument("--anos-serie", nargs="+", type=int, help="ano da primeira banda ou o ano de cada banda (padrão: descrições das bandas)")
+    parser.add_argument("--blocos-compartilhados", action="store_true", help="decodifica uma única vez, em memória compartilhada, as regiões dos rasters lidas por várias áreas do lote")
+    parser.add_argument("--memoria-blocos", type=int, default=2048, help="limite das regiões compartilhadas de cada lote, em megabytes")
+    parser.add_argument("--diretorio-blocos", help="diretório dos arquivos das regiões compartilhadas (padrão /dev/shm, quando existe)")
+    parser.add_argument("--fonte-banco", choices=list(RASTERS_LULC), help="fonte gravada de volta em fields_valuation")
+    parser.add_argument("--tabela-staging", help="tabela de staging que recebe as valorações de todas as fontes")
+    parser.add_argument("--log", default="INFO", help="nível mínimo das mensagens (DEBUG, INFO, AVISO ou ERRO)")
+    parser.add_argument("--metricas-jsonl", help="arquivo JSON lines com os spans por área e o resumo final")
+    parser.add_argument("--metricas-prometheus", help="textfile do Prometheus com os totais por etapa e os contadores")
+    argumentos = parser.parse_args(argv)
+
+    roads_in = indice_estradas_padrao(argumentos.indice_estradas) if argumentos.indice_estradas else None
+    processa_landcover(argumentos.fontes, roads_in=roads_in, cache_gdal_mb=argumentos.cache_gdal, diretorio_cache_osm=argumentos.cache_osm,
+                       offline=argumentos.offline, n_processos=argumentos.processos, diretorio_saida=argumentos.saida,
+                       retomar=argumentos.retomar, ids_areas=argumentos.areas, bbox=argumentos.bbox,
+                       fonte_banco=argumentos.fonte_banco, tabela_staging=argumentos.tabela_staging, incremental=argumentos.incremental,
+                       diretorio_cache_histogramas=argumentos.cache_histogramas, nivel_log=argumentos.log,
+                       raster_serie=argumentos.serie, origem_serie=argumentos.origem_serie,
+                       blocos_compartilhados=argumentos.blocos_compartilhados, memoria_blocos_mb=argumentos.memoria_blocos,
+                       diretorio_blocos=argumentos.diretorio_blocos,
+                       anos_serie=argumentos.anos_serie[0] if argumentos.anos_serie and len(argumentos.anos_serie) == 1 else argumentos.anos_serie,
+                       caminho_metricas_jsonl=argumentos.metricas_jsonl, caminho_metricas_prometheus=argumentos.metricas_prometheus)
+
+
+
+if __name__ == "__main__":
+    main()
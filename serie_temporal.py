@@ -0,0 +1,155 @@
+import re
+import numpy as np
+import pandas as pd
+from pool_rasters import abre_raster, le_janela
+from tabela_classes import CLASSES_TAXONOMIA, taxonomia_codigos, nomes_classes
+from auto_landcover_tools import rasteriza_talhoes, modas_zonais
+from validacao_geometrias import tem_geometria
+from instrumentacao import log, etapa, conta
+
+###########################################################################
+# Modo série temporal: um raster com uma banda por ano (stack multibanda ou VRT das coleções anuais do MapBiomas)
+# Cada área de interesse faz uma única leitura em janela com todas as bandas (em vez de um arquivo por ano),
+# e as modas de cada talhão em cada ano saem de uma única contagem (talhão, ano, classe).
+# O conversion_year é o primeiro ano em que o talhão passa de vegetação nativa para uso antrópico
+
+# Classes harmonizadas (tabela_classes.py) de cada lado da conversão
+CLASSES_NATIVAS = ["NATIVE_VEGETATION"]
+CLASSES_ANTROPICAS = ["ANNUAL_CROPS", "SEMIPERENNIAL_CROPS", "PERENNIAL_CROPS", "PASTURE", "SILVICULTURE", "INFRASTRUCTURE"]
+
+# Classes das fontes que ficam em OTHER na taxonomia, mas são uso antrópico (agropecuária do MapBiomas, código 14)
+NOMES_ANTROPICOS = ["agropecuária", "outros usos antrópicos"]
+
+# Estado de cada ano na série (anos sem dado, com classes fora da tabela ou OTHER, como água, não mudam o estado:
+# repetem o do ano anterior, de modo que nativa -> OTHER -> antrópica também é uma conversão)
+_SEM_ESTADO, _NATIVA, _ANTROPICA, _OUTRA = 0, 1, 2, 3
+
+
+
+# Anos de cada banda do raster da série
+def anos_bandas(raster, anos=None):
+    """
+    raster: dataset obtido com abre_raster
+    anos (opcional): ano da primeira banda (int, as demais são consecutivas) ou lista com o ano de cada banda;
+                     sem ele, os anos são lidos das descrições das bandas (ex: "classification_1985")
+    Retorna um array com o ano de cada banda, em ordem crescente
+    """
+
+    if anos is None:
+        encontrados = [re.search(r"(19|20)\d{2}", descricao or "") for descricao in raster.descriptions]
+        if not all(encontrados):
+            raise ValueError(f"As bandas de {raster.name} não têm o ano na descrição; informe os anos da série.")
+        anos = [int(ano.group(0)) for ano in encontrados]
+    elif np.ndim(anos) == 0:
+        anos = range(int(anos), int(anos) + raster.count)
+
+    anos = np.asarray(list(anos), dtype=np.int64)
+    if len(anos) != raster.count:
+        raise ValueError(f"{len(anos)} anos informados para {raster.count} bandas de {raster.name}.")
+    if np.any(np.diff(anos) <= 0):
+        raise ValueError(f"Os anos das bandas de {raster.name} não estão em ordem crescente.")
+    return anos
+
+
+
+#################################################################################
+# Moda de cada talhão em cada banda a partir da janela lida (bandas x linhas x colunas) e da grade de rótulos
+def modas_bandas(array, grade):
+    """
+    array: valores do raster lidos na janela da grade, todas as bandas (np.ndarray 3D)
+    grade: dicionário retornado por rasteriza_talhoes
+    Retorna a matriz de modas (talhões x bandas) e se cada moda tem pixels válidos (matriz booleana)
+    """
+
+    n_bandas = array.shape[0]
+    n_talhoes = grade["n_talhoes"]
+
+    # Valores únicos de todas as bandas e índice de cada pixel no vetor de valores
+    valores, indices = np.unique(array, return_inverse=True)
+    indices = indices.reshape(n_bandas, -1)[:, grade["pixels"]]
+
+    # Uma única contagem para todas as triplas (talhão, banda, valor)
+    bandas = np.arange(n_bandas)[:, np.newaxis]
+    chaves = (grade["rotulos"][np.newaxis, :] * n_bandas + bandas) * len(valores) + indices
+    contagens = np.bincount(chaves.ravel(), minlength=n_talhoes * n_bandas * len(valores)).reshape(n_talhoes * n_bandas, len(valores))
+
+    modas, com_moda = modas_zonais(valores, contagens)
+    return modas.reshape(n_talhoes, n_bandas), com_moda.reshape(n_talhoes, n_bandas)
+
+
+
+# Estado de cada talhão em cada ano (nativa ou antrópica), repetindo o último dos dois nos anos sem dado ou com outra classe
+def estados_serie(fonte, modas, com_moda):
+    """
+    fonte: dicionário de classes da série (mapbiomas, simfaz ou agrosatelite)
+    modas, com_moda: retorno de modas_bandas
+    Retorna a matriz de estados (talhões x anos)
+    """
+
+    taxonomia = taxonomia_codigos(fonte, modas)
+    estados = np.full(taxonomia.shape, _OUTRA, dtype=np.int8)
+    estados[np.isin(taxonomia, [CLASSES_TAXONOMIA.index(classe) for classe in CLASSES_NATIVAS])] = _NATIVA
+    estados[np.isin(taxonomia, [CLASSES_TAXONOMIA.index(classe) for classe in CLASSES_ANTROPICAS])] = _ANTROPICA
+    estados[np.isin(nomes_classes(fonte, modas), NOMES_ANTROPICOS)] = _ANTROPICA
+    estados[~com_moda | (taxonomia == CLASSES_TAXONOMIA.index("NULL")) | (taxonomia < 0)] = _SEM_ESTADO
+
+    # Preenchimento para frente: cada ano sem estado ou com outra classe recebe o do último ano nativo ou antrópico
+    conhecidos = (estados == _NATIVA) | (estados == _ANTROPICA)
+    ultimo = np.maximum.accumulate(np.where(conhecidos, np.arange(estados.shape[1])[np.newaxis, :], -1), axis=1)
+    return np.where(ultimo >= 0, np.take_along_axis(estados, np.maximum(ultimo, 0), axis=1), _SEM_ESTADO)
+
+
+
+# Primeiro ano de conversão de vegetação nativa para uso antrópico de cada talhão
+def anos_conversao(estados, anos):
+    """
+    estados: retorno de estados_serie
+    anos: ano de cada coluna de estados (array)
+    Retorna um array Int16 com o ano de conversão de cada talhão (nulo sem conversão na série)
+    """
+
+    transicoes = (estados[:, :-1] == _NATIVA) & (estados[:, 1:] == _ANTROPICA)
+    convertidos = transicoes.any(axis=1)
+    primeiro = np.argmax(transicoes, axis=1)
+    anos_transicao = np.append(anos[1:], 0)[primeiro]       # séries de um único ano não têm transição
+    return pd.arrays.IntegerArray(np.where(convertidos, anos_transicao, 0).astype(np.int16), ~convertidos)
+
+
+
+#################################################################################
+# Preenche o conversion_year dos talhões a partir do raster da série, com uma única leitura de todas as bandas
+def preenche_conversao(gdf_in, caminho, origem_dict="mapbiomas", anos=None, coluna="conversion_year"):
+    """
+    gdf_in: geodataframe que será atualizado com os dados (GeoDataFrame)
+    caminho: raster da série, uma banda por ano (stack multibanda ou VRT das coleções anuais)
+    origem_dict: dicionário de classes das bandas (mapbiomas, simfaz ou agrosatelite)
+    anos (opcional): anos das bandas, ver anos_bandas
+    coluna: coluna do gdf que recebe o ano de conversão (string)
+    """
+
+    log("Executando preenche_conversao", "DEBUG")
+
+    gdf_out = gdf_in.copy()
+    gdf_out[coluna] = pd.array([pd.NA] * len(gdf_out), dtype="Int16")
+
+    # Talhões com geometria, no SRC do raster
+    raster = abre_raster(caminho)
+    anos = anos_bandas(raster, anos)
+    geometrias = gdf_out.geometry.to_crs(raster.crs)
+    com_geometria = tem_geometria(geometrias.values)
+    if not com_geometria.any():
+        return gdf_out
+
+    # Rasterização única e leitura da janela que cobre todos os talhões, todas as bandas de uma vez
+    with etapa("rasterizacao", talhoes=int(com_geometria.sum())):
+        grade = rasteriza_talhoes(geometrias.values[com_geometria], raster.transform, raster.width, raster.height)
+    array = le_janela(raster, grade["janela"], banda=list(range(1, raster.count + 1)), masked=True).filled(255)
+
+    with etapa("serie_temporal", raster=caminho, anos=len(anos)):
+        modas, com_moda = modas_bandas(array, grade)
+        conversao = anos_conversao(estados_serie(origem_dict, modas, com_moda), anos)
+    gdf_out.loc[gdf_out.index[com_geometria], coluna] = conversao
+    conta("talhoes_convertidos", int((~conversao.isna()).sum()))
+
+    # Gdf de saída
+    return gdf_out
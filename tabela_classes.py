@@ -0,0 +1,170 @@
+import numpy as np
+import pandas as pd
+
+###########################################################################
+# Tabela central de classes: código do pixel de cada fonte -> nome da classe -> taxonomia harmonizada
+# Os nomes e a taxonomia de cada código são obtidos por vetores de consulta (NumPy) indexados pelo código,
+# de modo que colunas inteiras de códigos são convertidas sem laços em Python
+
+
+
+# Dicionários de classes dos rasters (valor do pixel -> classe)
+DICT_CLASSES = {
+    "irrigacao": {0:"NO", 1:"YES", 2:"YES", 3:"YES", 255:"NODATA"},
+    "mapbiomas": {1: 'floresta', 3: 'formação florestal', 4: 'formação savânica',
+                  5: 'mangue', 6: 'floresta alagável (beta)', 49: 'restinga arbórea',
+                  10: 'formação natural não florestal', 11: 'campo alagado e área pantanosa',
+                  12: 'formação campestre', 32: 'apicum', 29: 'afloramento rochoso', 50: 'restinga herbácea',
+                  13: 'outras formações não florestais', 14: 'agropecuária', 15: 'pastagem',
+                  18: 'agricultura', 19: 'lavoura temporária', 39: 'soja', 20: 'cana', 40: 'arroz',
+                  62: 'algodão (beta)', 41: 'outras lavouras temporárias', 36: 'lavoura perene',
+                  46: 'café', 47: 'citrus', 35: 'dendê (beta)', 48: 'outras lavouras perenes',
+                  9: 'silvicultura', 21: 'mosaico de usos', 22: 'área não vegetada', 23: 'praia, duna e areal',
+                  24: 'área urbanizada', 30: 'mineração', 25: 'outras áreas não vegetadas', 26: "corpo d'água",
+                  33: 'rio, lago e oceano', 31: 'aquicultura', 27: 'não observado', 255:'nodata'},
+    "agrosatelite": {1:'soja', 2:'milho', 3:'algodão', 4:'cana', 5:'outras culturas temporárias',
+                     6:'culturas permanentes', 7:'pastagem', 8:'floresta nativa', 9:'vegetação natural não florestal',
+                     10:'silvicultura', 11:'outros (infraestrutura, água)', 12:'áreas ágricolas sem mapeamento da cultura', 255:'nodata'},
+    "simfaz": {201:"soja", 202:"algodão", 203:"milho", 204:"arroz", 205:"cana", 206:"café", 207:"citrus", 208:"área urbana", 101:"água", 209:"pastagem", 210:"silvicultura", 221:"outros usos antrópicos", 102:"natural florestal", 103:"natural não florestal", 222:"outros usos", 255:'nodata'},
+}
+
+# Taxonomia harmonizada (a posição na lista é o código da classe harmonizada)
+CLASSES_TAXONOMIA = ["NULL", "ANNUAL_CROPS", "SEMIPERENNIAL_CROPS", "PERENNIAL_CROPS", "PASTURE",
+                     "SILVICULTURE", "NATIVE_VEGETATION", "INFRASTRUCTURE", "OTHER"]
+
+# Nome da classe (das fontes e dos analistas) -> classe harmonizada
+# Mantém os mapeamentos do dicionário do verifica_landcover.py original (infraestrutura pública e privada dos analistas
+# na mesma classe INFRASTRUCTURE) e acrescenta os demais nomes dos rasters (DICT_CLASSES), que os scripts originais não
+# mapeavam: formações nativas do MapBiomas -> NATIVE_VEGETATION, lavouras -> ANNUAL_CROPS ou PERENNIAL_CROPS, áreas
+# urbanizadas e mineração -> INFRASTRUCTURE, água e agropecuária (mosaico sem cultura definida) -> OTHER, não observado
+# e nodata -> NULL. Nomes sem classe harmonizada clara (ex: "praia, duna e areal") ficam fora da taxonomia
+TAXONOMIA_NOMES = {
+    # mapbiomas
+    "floresta":"NATIVE_VEGETATION", "formação florestal":"NATIVE_VEGETATION", "formação savânica":"NATIVE_VEGETATION",
+    "mangue":"NATIVE_VEGETATION", "floresta alagável (beta)":"NATIVE_VEGETATION", "restinga arbórea":"NATIVE_VEGETATION",
+    "formação natural não florestal":"NATIVE_VEGETATION", "campo alagado e área pantanosa":"NATIVE_VEGETATION",
+    "formação campestre":"NATIVE_VEGETATION", "apicum":"NATIVE_VEGETATION", "afloramento rochoso":"NATIVE_VEGETATION",
+    "restinga herbácea":"NATIVE_VEGETATION", "outras formações não florestais":"NATIVE_VEGETATION",
+    "agropecuária":"OTHER", "pastagem":"PASTURE", "agricultura":"ANNUAL_CROPS", "lavoura temporária":"ANNUAL_CROPS",
+    "soja":"ANNUAL_CROPS", "cana":"SEMIPERENNIAL_CROPS", "arroz":"ANNUAL_CROPS", "algodão (beta)":"ANNUAL_CROPS",
+    "outras lavouras temporárias":"ANNUAL_CROPS", "lavoura perene":"PERENNIAL_CROPS", "café":"PERENNIAL_CROPS",
+    "citrus":"PERENNIAL_CROPS", "dendê (beta)":"PERENNIAL_CROPS", "outras lavouras perenes":"PERENNIAL_CROPS",
+    "silvicultura":"SILVICULTURE", "mosaico de usos":"INFRASTRUCTURE", "área não vegetada":"INFRASTRUCTURE",
+    "área urbanizada":"INFRASTRUCTURE", "mineração":"INFRASTRUCTURE",
+    "outras áreas não vegetadas":"INFRASTRUCTURE", "corpo d'água":"OTHER", "rio, lago e oceano":"OTHER",
+    "aquicultura":"OTHER", "não observado":"NULL", "nodata":"NULL",
+    # agrosatélite
+    "milho":"ANNUAL_CROPS", "algodão":"ANNUAL_CROPS", "outras culturas temporárias":"ANNUAL_CROPS",
+    "culturas permanentes":"PERENNIAL_CROPS", "floresta nativa":"NATIVE_VEGETATION",
+    "vegetação natural não florestal":"NATIVE_VEGETATION", "outros (infraestrutura, água)":"OTHER",
+    "áreas ágricolas sem mapeamento da cultura":"ANNUAL_CROPS",
+    # simfaz
+    "área urbana":"INFRASTRUCTURE", "água":"OTHER", "outros usos antrópicos":"OTHER",
+    "natural florestal":"NATIVE_VEGETATION", "natural não florestal":"NATIVE_VEGETATION", "outros usos":"OTHER",
+    # analistas
+    "DIRTY_PASTURE":"PASTURE", "CLEAN_PASTURE":"PASTURE", "WATER":"OTHER",
+    "PUBLIC_INFRASTRUCTURE":"INFRASTRUCTURE", "PRIVATE_INFRASTRUCTURE":"INFRASTRUCTURE",
+    "REGENERATION":"NATIVE_VEGETATION", "COTTON":"ANNUAL_CROPS", "AGRICULTURAL_AREA":"ANNUAL_CROPS",
+    "CITRUS":"PERENNIAL_CROPS", "ANTHROPIC_EXPOSED_SOIL":"INFRASTRUCTURE", "WHEAT":"ANNUAL_CROPS",
+    "NON_FOREST_VEGETATION":"NATIVE_VEGETATION", "NATURAL_EXPOSED_SOIL":"NATIVE_VEGETATION",
+    "OTHER_PERENNIAL_CROPS":"PERENNIAL_CROPS", "OTHER_SEMIPERENNIAL_CROPS":"SEMIPERENNIAL_CROPS",
+    "SUGAR_CANE":"SEMIPERENNIAL_CROPS", "UNCERTAIN":"OTHER", "CORN":"ANNUAL_CROPS", "COFFEE":"PERENNIAL_CROPS",
+    "NATIVE_FOREST":"NATIVE_VEGETATION", "OTHERS":"OTHER", "RICE":"ANNUAL_CROPS",
+    "area_agricola":"PERENNIAL_CROPS",
+    **{classe: classe for classe in CLASSES_TAXONOMIA},
+}
+
+# Código usado para nomes fora da taxonomia (nunca coincide com uma classe harmonizada)
+CODIGO_DESCONHECIDO = -1
+
+
+
+# Vetores de consulta de uma fonte: nome e classe harmonizada de cada código de pixel
+def _monta_consulta(dict_classes):
+    tamanho = max(dict_classes) + 1
+    nomes = np.full(tamanho, None, dtype=object)
+    taxonomia = np.full(tamanho, CODIGO_DESCONHECIDO, dtype=np.int8)
+    for codigo, nome in dict_classes.items():
+        nomes[codigo] = nome
+        if nome in TAXONOMIA_NOMES:
+            taxonomia[codigo] = CLASSES_TAXONOMIA.index(TAXONOMIA_NOMES[nome])
+    return nomes, taxonomia
+
+
+_CONSULTAS = {fonte: _monta_consulta(dict_classes) for fonte, dict_classes in DICT_CLASSES.items()}
+
+
+
+# Posições válidas dos códigos nos vetores de consulta
+def _indices_consulta(fonte, codigos):
+    codigos = np.asarray(codigos, dtype=np.int64)
+    tamanho = len(_CONSULTAS[fonte][0])
+    validos = (codigos >= 0) & (codigos < tamanho)
+    return np.where(validos, codigos, 0), validos
+
+
+
+# Nomes das classes de um vetor de códigos de pixel
+def nomes_classes(fonte, codigos):
+    """
+    fonte: fonte dos códigos (irrigacao, mapbiomas, simfaz ou agrosatelite)
+    codigos: códigos de pixel (array de inteiros)
+    Retorna um array de nomes (None para códigos fora da tabela)
+    """
+
+    indices, validos = _indices_consulta(fonte, codigos)
+    return np.where(validos, _CONSULTAS[fonte][0][indices], None)
+
+
+
+# Códigos da taxonomia harmonizada de um vetor de códigos de pixel
+def taxonomia_codigos(fonte, codigos):
+    """
+    fonte: fonte dos códigos (mapbiomas, simfaz ou agrosatelite)
+    codigos: códigos de pixel (array de inteiros)
+    Retorna um array int8 com a posição de cada classe em CLASSES_TAXONOMIA (CODIGO_DESCONHECIDO fora da tabela)
+    """
+
+    indices, validos = _indices_consulta(fonte, codigos)
+    return np.where(validos, _CONSULTAS[fonte][1][indices], CODIGO_DESCONHECIDO).astype(np.int8)
+
+
+
+# Códigos da taxonomia harmonizada de uma coluna de nomes (fontes ou analistas)
+def taxonomia_de_nomes(nomes):
+    """
+    nomes: nomes das classes (Series ou lista); nulos viram "NULL"
+    Retorna um array int8 com a posição de cada classe em CLASSES_TAXONOMIA (CODIGO_DESCONHECIDO para nomes fora da tabela)
+    """
+
+    # A conversão é feita uma vez por categoria, não por linha (o último item atende aos nulos, de código -1)
+    categorias = pd.Categorical(nomes)
+    codigos_categorias = np.array([CLASSES_TAXONOMIA.index(TAXONOMIA_NOMES[nome]) if nome in TAXONOMIA_NOMES else CODIGO_DESCONHECIDO
+                                   for nome in categorias.categories] + [CLASSES_TAXONOMIA.index("NULL")], dtype=np.int8)
+    return codigos_categorias[categorias.codes]
+
+
+
+# Converte códigos da taxonomia em uma coluna categórica com os nomes harmonizados
+def categorias_taxonomia(codigos):
+    """
+    codigos: retorno de taxonomia_codigos ou taxonomia_de_nomes
+    Retorna um pd.Categorical (nulo para CODIGO_DESCONHECIDO)
+    """
+
+    return pd.Categorical.from_codes(np.asarray(codigos, dtype=np.int8), categories=CLASSES_TAXONOMIA)
+
+
+
+# Classes possíveis de cada talhão a partir da matriz de presença dos valores do recorte
+def classes_possiveis(fonte, valores, presentes):
+    """
+    fonte: fonte dos valores (irrigacao, mapbiomas, simfaz ou agrosatelite)
+    valores: valores únicos, em ordem crescente (array)
+    presentes: matriz booleana (talhões x valores) com os valores presentes no recorte de cada talhão
+    Retorna a lista de strings com os nomes separados por vírgula (códigos fora da tabela são ignorados)
+    """
+
+    nomes = nomes_classes(fonte, valores)
+    presentes = presentes & pd.notna(nomes)[np.newaxis, :]
+    return [", ".join(nomes[linha]) for linha in presentes]
@@ -0,0 +1,118 @@
+import os
+import pandas as pd
+import shapely
+import pytest
+import acesso_dados
+from tabela_classes import CLASSES_TAXONOMIA
+
+
+
+# Engine falsa: a conexão só precisa aceitar execution_options e o bloco with
+class _Conexao:
+    def execution_options(self, **kwargs):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class _Engine:
+    def connect(self):
+        return _Conexao()
+
+
+
+# Substitui o banco por lotes já prontos (o que o pd.read_sql com chunksize geraria)
+@pytest.fixture
+def banco_falso(monkeypatch):
+    def configura(lotes):
+        monkeypatch.setattr(acesso_dados, "engine", lambda banco="anotacoes_sr": _Engine())
+        monkeypatch.setattr(acesso_dados.pd, "read_sql", lambda *args, **kwargs: iter(lotes))
+    return configura
+
+
+
+def _lote(ids, areas):
+    return pd.DataFrame({"id": ids, "interest_area_id": areas,
+                         "geom": [shapely.to_wkb(shapely.Point(i, i)) for i in ids]})
+
+
+
+def test_consulta_sem_linhas(banco_falso):
+    # Sem nenhuma linha, o pd.read_sql gera um único lote vazio
+    banco_falso([_lote([], [])])
+    assert list(acesso_dados.le_areas_lotes(ids=[999])) == []
+
+    areas = acesso_dados.le_areas(ids=[999])
+    assert len(areas) == 0
+    assert list(areas.columns) == ["id", "interest_area_id", "geometry"]
+
+
+
+def test_area_dividida_entre_lotes(banco_falso):
+    # A área 2 começa no primeiro lote e termina no segundo; o último lote vem vazio
+    banco_falso([_lote([1, 2, 3], [1, 2, 2]), _lote([4, 5], [2, 3]), _lote([], [])])
+    lotes = list(acesso_dados.le_areas_lotes())
+
+    assert [lote["interest_area_id"].tolist() for lote in lotes] == [[1], [2, 2, 2], [3]]
+    assert lotes[1]["id"].tolist() == [2, 3, 4]
+
+
+
+def test_valores_fields_valuation():
+    valoracoes = pd.DataFrame({"id": [1, 2, 3, 4],
+                               "class": ["soja", "formação florestal", "ERRO_MODA", "nome desconhecido"],
+                               "irrigation": ["YES", "NODATA", "GEOM_INVÁLIDA", None],
+                               "paved_road": ["NO", "TOUCH_ROAD", "10KM_ROAD", "OUTRO"]})
+    valores = acesso_dados.valores_fields_valuation(valoracoes, {"paved_road": ["NO", "TOUCH_ROAD", "10KM_ROAD"]})
+
+    assert valores["class"].tolist() == ["ANNUAL_CROPS", "NATIVE_VEGETATION", None, None]
+    assert valores["irrigation"].tolist() == ["YES", None, None, None]
+    assert valores["paved_road"].tolist() == ["NO", "TOUCH_ROAD", "10KM_ROAD", None]
+
+
+
+# Ida e volta em um PostgreSQL de verdade (banco de testes descartável, informado pela URL em AUTOLANDCOVER_TESTE_PG)
+@pytest.mark.skipif(not os.environ.get("AUTOLANDCOVER_TESTE_PG"), reason="sem banco de testes (AUTOLANDCOVER_TESTE_PG)")
+def test_grava_valoracoes_no_banco(monkeypatch):
+    from sqlalchemy import create_engine, text
+
+    engine = create_engine(os.environ["AUTOLANDCOVER_TESTE_PG"])
+    esquema = f"teste_autolandcover_{os.getpid()}"
+    monkeypatch.setattr(acesso_dados, "engine", lambda banco="anotacoes_sr": engine)
+    monkeypatch.setattr(acesso_dados, "TABELA_AREAS", f'"{esquema}"."fields_valuation"')
+
+    classes = ", ".join(f"'{classe}'" for classe in CLASSES_TAXONOMIA[1:])
+    with engine.begin() as conn:
+        conn.execute(text(f'CREATE SCHEMA "{esquema}"'))
+        conn.execute(text(f'CREATE TYPE "{esquema}".classe AS ENUM ({classes})'))
+        conn.execute(text(f"""CREATE TYPE "{esquema}".irrigacao AS ENUM ('YES', 'NO')"""))
+        conn.execute(text(f"""CREATE TYPE "{esquema}".estradas AS ENUM ('NO', 'TOUCH_ROAD', '10KM_ROAD')"""))
+        conn.execute(text(f"""
+                          CREATE TABLE "{esquema}"."fields_valuation" (
+                              "id" integer PRIMARY KEY, "class" "{esquema}".classe, "irrigation" "{esquema}".irrigacao,
+                              "paved_road" "{esquema}".estradas, "classes_possiveis" text)
+                          """))
+        conn.execute(text(f"""INSERT INTO "{esquema}"."fields_valuation" VALUES (1, 'PASTURE', 'NO', 'NO', NULL), (2, NULL, NULL, NULL, NULL),
+                              (3, 'SILVICULTURE', 'YES', 'NO', NULL), (4, NULL, NULL, NULL, NULL)"""))
+
+    try:
+        valoracoes = pd.DataFrame({"id": [1, 2, 3, 4],
+                                   "class": ["soja", "formação florestal", "ERRO_MODA", "GEOM_INVÁLIDA"],
+                                   "irrigation": ["YES", "NODATA", "ERRO_MODA", "NO"],
+                                   "paved_road": ["TOUCH_ROAD", "10KM_ROAD", "NO", None],
+                                   "classes_possiveis": ["soja, pastagem", "formação florestal", None, None]})
+        assert acesso_dados.grava_valoracoes(valoracoes, tamanho_lote=3) == 4
+
+        with engine.connect() as conn:
+            gravados = pd.read_sql(text(f'SELECT * FROM "{esquema}"."fields_valuation" ORDER BY "id"'), conn)
+        assert gravados["class"].tolist() == ["ANNUAL_CROPS", "NATIVE_VEGETATION", None, None]
+        assert gravados["irrigation"].tolist() == ["YES", None, None, "NO"]
+        assert gravados["paved_road"].tolist() == ["TOUCH_ROAD", "10KM_ROAD", "NO", None]
+        assert gravados["classes_possiveis"].tolist() == ["soja, pastagem", "formação florestal", None, None]
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text(f'DROP SCHEMA "{esquema}" CASCADE'))
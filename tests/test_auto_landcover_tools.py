@@ -0,0 +1,85 @@
+import numpy as np
+import geopandas as gpd
+import shapely
+import scipy.stats
+import pytest
+import rasterio as rio
+from rasterio.mask import mask
+from rasterio.transform import from_origin
+from auto_landcover_tools import preenche_atributos_raster
+from cache_histogramas import configura_cache_histogramas
+from tabela_classes import DICT_CLASSES
+
+# Raster de 20 x 20 pixels de 1m; o land cover usa 0 como "nodata" do arquivo e a irrigação usa 255
+CRS = "EPSG:32722"
+TRANSFORM = from_origin(0, 20, 1, 1)
+
+# Talhões: bordas fora da grade de pixels (all_touched), talhões sobrepostos, triângulo (recorte com pixels fora da
+# geometria), talhão só sobre "nodata", empate 2 x 2 na moda e talhão parcialmente fora do raster
+TALHOES = [shapely.box(2.5, 2.5, 7.3, 6.8), shapely.box(6.1, 4.2, 11.7, 9.5), shapely.box(7.2, 3.1, 9.9, 5.6),
+           shapely.Polygon([(1.2, 10.4), (8.7, 10.9), (1.6, 17.3)]), shapely.box(14.2, 1.2, 15.8, 2.8),
+           shapely.box(12.25, 12.25, 13.75, 13.75), shapely.box(17.5, 15.2, 25, 25), shapely.box(-3, -3, 0.6, 1.4)]
+
+
+
+# Grava os rasters de land cover e de irrigação
+def _rasters(diretorio):
+    gerador = np.random.default_rng(7)
+    lulc = gerador.choice(np.array([3, 15, 39], dtype=np.uint8), size=(20, 20))
+    irrigacao = gerador.choice(np.array([0, 1, 2, 3], dtype=np.uint8), size=(20, 20))
+
+    # Região "nodata" inteira sob o talhão 5 e pixels "nodata" espalhados
+    lulc[17:19, 14:16] = 0
+    irrigacao[17:19, 14:16] = 255
+    lulc[gerador.random((20, 20)) < 0.1] = 0
+    irrigacao[gerador.random((20, 20)) < 0.1] = 255
+
+    # Empate entre 3 e 15 sob o talhão 6 (a moda fica com o menor valor)
+    lulc[6:8, 12:14] = [[3, 15], [15, 3]]
+
+    caminhos = []
+    for nome, array, nodata in [("lulc", lulc, 0), ("irrigacao", irrigacao, 255)]:
+        caminho = str(diretorio / f"{nome}.tif")
+        with rio.open(caminho, "w", driver="GTiff", height=20, width=20, count=1, dtype="uint8", crs=CRS,
+                      transform=TRANSFORM, nodata=nodata) as raster:
+            raster.write(array, 1)
+        caminhos.append(caminho)
+    return caminhos
+
+
+
+# Caminho original: mask de cada talhão (crop, all_touched, nodata 255) e moda do scipy
+def _mask_por_talhao(gdf, caminho, dict_classes, coluna):
+    with rio.open(caminho) as raster:
+        for idx_talhao, geometria in gdf["geometry"].items():
+            raster_out, _ = mask(raster, [geometria], crop=True, nodata=255, all_touched=True)
+            validos = raster_out[(raster_out != 255) & (raster_out != -1)]
+            moda = scipy.stats.mode(validos).mode if validos.size > 0 else np.nan
+            gdf.loc[idx_talhao, "classes_possiveis"] = ", ".join(dict_classes[valor] for valor in np.unique(raster_out).tolist())
+            gdf.loc[idx_talhao, coluna] = "ERRO_MODA" if np.isnan(moda) else dict_classes[moda]
+    return gdf
+
+
+
+@pytest.mark.parametrize("com_cache", [False, True])
+def test_mesmo_resultado_do_mask_por_talhao(tmp_path, com_cache):
+    caminho_lulc, caminho_irrigacao = _rasters(tmp_path)
+    talhoes = gpd.GeoDataFrame({"id": range(len(TALHOES)), "irrigation": None, "class": None}, geometry=TALHOES, crs=CRS)
+
+    esperado = _mask_por_talhao(talhoes.copy(), caminho_irrigacao, DICT_CLASSES["irrigacao"], "irrigation")
+    esperado = _mask_por_talhao(esperado, caminho_lulc, DICT_CLASSES["mapbiomas"], "class")
+
+    # Com o cache, a segunda execução sai toda dos histogramas guardados
+    configura_cache_histogramas(str(tmp_path / "cache") if com_cache else None)
+    try:
+        for _ in range(2 if com_cache else 1):
+            resultado = preenche_atributos_raster(talhoes.copy(), caminho_lulc, caminho_irrigacao, "mapbiomas")
+            for coluna in ["class", "irrigation", "classes_possiveis"]:
+                assert resultado[coluna].tolist() == esperado[coluna].tolist(), coluna
+    finally:
+        configura_cache_histogramas(None)
+
+    # Os casos de borda estão de fato no teste: talhão só sobre "nodata", empate e recortes com pixels fora da geometria
+    assert esperado.loc[4, "class"] == "ERRO_MODA"
+    assert esperado.loc[5, "class"] == "formação florestal"
+    assert esperado["classes_possiveis"].str.contains("nodata").sum() >= 3
@@ -0,0 +1,41 @@
+import os
+import sys
+import subprocess
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Pacotes que só podem ser importados na primeira chamada que os usa (nunca no --help de nenhum comando)
+TARDIOS = ["osmnx", "scipy", "sqlalchemy", "dotenv"]
+
+
+
+# Executa autolandcover.main em um interpretador limpo e retorna os pacotes verificados que ficaram carregados
+def _importados(argv, pacotes):
+    codigo = ("import sys, io, contextlib, autolandcover\n"
+              "with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):\n"
+              "    try:\n"
+              f"        autolandcover.main({argv!r})\n"
+              "    except SystemExit:\n"
+              "        pass\n"
+              f"print(' '.join(pacote for pacote in {pacotes!r} if pacote in sys.modules))")
+    saida = subprocess.run([sys.executable, "-c", codigo], cwd=RAIZ, capture_output=True, text=True, check=True).stdout
+    return saida.split()
+
+
+
+@pytest.mark.parametrize("argv", [["--help"], ["comando-invalido"]])
+def test_ajuda_sem_importacoes_pesadas(argv):
+    assert _importados(argv, ["geopandas", "rasterio", "shapely", "processa_landcover"] + TARDIOS) == []
+
+
+
+@pytest.mark.parametrize("comando", ["prefetch-roads", "build-road-index"])
+def test_comandos_vetoriais_sem_rasterio(comando):
+    assert _importados([comando, "--help"], ["rasterio", "processa_landcover"] + TARDIOS) == []
+
+
+
+@pytest.mark.parametrize("comando", ["process", "evaluate", "prepare-rasters", "benchmark"])
+def test_ajuda_dos_comandos_sem_importacoes_tardias(comando):
+    assert _importados([comando, "--help"], TARDIOS) == []
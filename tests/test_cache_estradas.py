@@ -0,0 +1,74 @@
+import os
+import geopandas as gpd
+import shapely
+import pytest
+import cache_estradas
+import auto_landcover_tools
+from cache_estradas import prefetch_estradas, estradas_do_cache, tile_em_cache, tiles_da_geometria
+from auto_landcover_tools import busca_estradas_lote, filtra_estradas_pavimentadas
+
+# Região de teste: a estrada pavimentada cruza a borda de dois tiles (x = -50,0)
+REGIAO = shapely.box(-50.4, -10.8, -49.6, -9.8)
+
+
+
+# Extrato local de estradas do OSM (o mesmo formato de features_from_polygon)
+@pytest.fixture
+def arquivo_estradas(tmp_path):
+    caminho = str(tmp_path / "estradas.gpkg")
+    gpd.GeoDataFrame({"element_type": ["way", "way"], "osmid": ["1", "2"], "highway": ["primary", "track"],
+                      "ref": ["BR-158", ""], "surface": ["asphalt", "unpaved"]},
+                     geometry=[shapely.LineString([(-50.1, -10.1), (-49.9, -10.1)]), shapely.LineString([(-50.3, -10.6), (-50.2, -10.6)])],
+                     crs="EPSG:4326").to_file(caminho, driver="GPKG")
+    return caminho
+
+
+
+# Nenhum acesso à rede durante os testes
+@pytest.fixture(autouse=True)
+def sem_rede(monkeypatch):
+    def falha(*args, **kwargs):
+        raise AssertionError("acesso ao OSM no modo offline")
+    monkeypatch.setattr(cache_estradas, "_baixa_tile_osm", falha)
+    monkeypatch.setattr(auto_landcover_tools, "importa_osmnx", falha)
+
+
+
+def test_prefetch_e_leitura_offline(tmp_path, arquivo_estradas):
+    diretorio = str(tmp_path / "cache")
+    tiles = tiles_da_geometria(REGIAO)
+    assert prefetch_estradas(REGIAO, diretorio=diretorio, arquivo_origem=arquivo_estradas) == len(tiles)
+    assert all(tile_em_cache(tile, diretorio) for tile in tiles)
+
+    # Tiles já em cache não são gravados de novo; tiles sem estradas ficam marcados como vazios
+    assert prefetch_estradas(REGIAO, diretorio=diretorio, arquivo_origem=arquivo_estradas) == 0
+    assert any(nome.endswith(".vazio") for nome in os.listdir(diretorio))
+
+    # A estrada que cruza a borda dos tiles aparece uma única vez
+    estradas = estradas_do_cache(shapely.box(-50.2, -10.2, -49.8, -10.0), diretorio=diretorio, offline=True)
+    assert estradas["osmid"].tolist() == ["1"]
+    assert len(filtra_estradas_pavimentadas(estradas)) == 1
+
+
+
+def test_tile_ausente_no_modo_offline(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        estradas_do_cache(shapely.box(-50.2, -10.2, -49.8, -10.0), diretorio=str(tmp_path / "vazio"), offline=True)
+
+
+
+def test_busca_estradas_lote_offline(tmp_path, arquivo_estradas):
+    diretorio = str(tmp_path / "cache")
+    prefetch_estradas(REGIAO, diretorio=diretorio, arquivo_origem=arquivo_estradas)
+
+    # Área 1 encosta na estrada, área 2 fica a ~5Km dela e a área 3 só tem a estrada não pavimentada por perto
+    talhoes = gpd.GeoDataFrame({"interest_area_id": [1, 2, 3]},
+                               geometry=[shapely.box(-50.01, -10.105, -50.0, -10.095), shapely.box(-50.01, -10.16, -50.0, -10.15),
+                                         shapely.box(-50.26, -10.62, -50.25, -10.61)], crs="EPSG:4326")
+    paved_road = busca_estradas_lote(talhoes, diretorio_cache=diretorio, offline=True)
+    assert paved_road.to_dict() == {1: "TOUCH_ROAD", 2: "10KM_ROAD", 3: "NO"}
+
+    # Mesmo resultado consultando o extrato diretamente
+    extrato = gpd.read_file(arquivo_estradas)
+    direto = busca_estradas_lote(talhoes, busca_fn=lambda geometria: filtra_estradas_pavimentadas(extrato[extrato.intersects(geometria)]))
+    assert direto.to_dict() == paved_road.to_dict()
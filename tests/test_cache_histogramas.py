@@ -0,0 +1,40 @@
+import sqlite3
+import numpy as np
+from cache_histogramas import configura_cache_histogramas, grava_histogramas, busca_histogramas
+
+
+
+# Tamanho total guardado nos metadados e soma real dos tamanhos das entradas
+def _tamanhos(diretorio):
+    conn = sqlite3.connect(str(diretorio / "histogramas.sqlite"))
+    total = conn.execute("SELECT tamanho_total FROM metadados").fetchone()[0]
+    soma = conn.execute("SELECT COALESCE(SUM(tamanho), 0) FROM histogramas").fetchone()[0]
+    conn.close()
+    return total, soma
+
+
+
+def _histograma(n_valores):
+    return np.arange(n_valores), np.ones(n_valores, dtype=np.int64), False
+
+
+
+def test_tamanho_total_com_substituicoes_e_remocoes(tmp_path):
+    # Cada histograma de 10 valores ocupa 176 bytes; o limite comporta umas 60 entradas
+    configura_cache_histogramas(str(tmp_path), tamanho_max_mb=10000 / (1024 * 1024))
+    try:
+        grava_histogramas({f"a{i}": _histograma(10) for i in range(40)})
+        assert _tamanhos(tmp_path) == (40 * 176, 40 * 176)
+
+        # Substituir entradas com histogramas maiores só soma a diferença
+        grava_histogramas({f"a{i}": _histograma(20) for i in range(10)})
+        assert _tamanhos(tmp_path) == (30 * 176 + 10 * 336, 30 * 176 + 10 * 336)
+
+        # Ao passar do limite, as entradas usadas há mais tempo saem e o total acompanha
+        busca_histogramas(["a39"])
+        grava_histogramas({f"b{i}": _histograma(10) for i in range(30)})
+        total, soma = _tamanhos(tmp_path)
+        assert total == soma <= 10000
+        assert set(busca_histogramas(["a10", "a39", "b29"])) == {"a39", "b29"}
+    finally:
+        configura_cache_histogramas(None)
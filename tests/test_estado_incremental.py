@@ -0,0 +1,49 @@
+import geopandas as gpd
+import shapely
+from estado_incremental import (abre_estado, estado_talhoes, talhoes_alterados, talhoes_saidos, areas_alteradas, marca_lidos,
+                                registra_talhoes, talhoes_removidos)
+
+
+
+def _talhoes(ids, areas):
+    return gpd.GeoDataFrame({"id": ids, "interest_area_id": areas},
+                            geometry=[shapely.box(i, 0, i + 1, 1) for i in ids], crs="EPSG:4326")
+
+
+
+def test_areas_inteiras_e_talhoes_removidos(tmp_path):
+    estado = abre_estado(str(tmp_path / "estado.sqlite"))
+    registra_talhoes(estado, estado_talhoes(_talhoes([1, 2, 3, 4, 5, 6], [10, 10, 20, 20, 30, 30]), "r"), "anterior")
+
+    # Talhão 1 alterado (área 10), talhão 4 removido (área 20) e área 30 inteira removida
+    gdf = _talhoes([1, 2, 3], [10, 10, 20])
+    gdf.loc[0, "geometry"] = shapely.box(0, 0, 2, 2)
+    atual = estado_talhoes(gdf, "r")
+    marca_lidos(estado, atual, "atual")
+
+    alterados = talhoes_alterados(estado, atual)
+    assert alterados.tolist() == [True, False, False]
+
+    saidos, areas_saidos = talhoes_saidos(estado, atual)
+    assert saidos == ["4"] and areas_saidos == ["20"]
+
+    # Todos os talhões das áreas afetadas são valorados de novo
+    assert areas_alteradas(atual, alterados, areas_saidos).tolist() == [True, True, True]
+    assert areas_alteradas(atual, alterados).tolist() == [True, True, False]
+
+    assert sorted(talhoes_removidos(estado, "atual")) == ["4", "5", "6"]
+    assert talhoes_removidos(estado, "atual", ids_areas=[20]) == ["4"]
+
+
+
+def test_talhao_movido_de_area(tmp_path):
+    estado = abre_estado(str(tmp_path / "estado.sqlite"))
+    registra_talhoes(estado, estado_talhoes(_talhoes([1, 2, 3], [10, 10, 20]), "r"))
+
+    # O talhão 1 passa para a área 20: a área 10, que o perdeu, também é valorada de novo
+    atual = estado_talhoes(_talhoes([1, 2, 3], [20, 10, 20]), "r")
+    alterados = talhoes_alterados(estado, atual)
+    assert alterados.tolist() == [True, False, False]
+    saidos, areas_saidos = talhoes_saidos(estado, atual)
+    assert (saidos, areas_saidos) == (["1"], ["10"])
+    assert areas_alteradas(atual, alterados, areas_saidos).tolist() == [True, True, True]
@@ -0,0 +1,48 @@
+import numpy as np
+import geopandas as gpd
+import shapely
+from indice_estradas import constroi_indice_estradas, carrega_indice_estradas, classifica_estradas, DISTANCIA_MAXIMA_M, DISTANCIA_TOQUE_M
+from fusos_utm import epsg_utm_por_linha
+
+
+
+# Talhões e estradas no extremo leste do Brasil, onde a distorção do Policônico é maior
+def _dados(semente=0, n_talhoes=200, n_estradas=300):
+    rng = np.random.default_rng(semente)
+    centros = np.column_stack([rng.uniform(-36.5, -35.5, n_talhoes), rng.uniform(-8.0, -7.0, n_talhoes)])
+    talhoes = shapely.box(centros[:, 0], centros[:, 1], centros[:, 0] + 0.002, centros[:, 1] + 0.002)
+    inicios = np.column_stack([rng.uniform(-36.6, -35.4, n_estradas), rng.uniform(-8.1, -6.9, n_estradas)])
+    fins = inicios + rng.normal(0, 0.03, (n_estradas, 2))
+    estradas = shapely.linestrings(np.stack([inicios, fins], axis=1))
+    return (gpd.GeoDataFrame({"id": range(n_talhoes)}, geometry=talhoes, crs="EPSG:4326"),
+            gpd.GeoDataFrame(geometry=estradas, crs="EPSG:4326"))
+
+
+
+def test_distancia_igual_a_forca_bruta_no_utm(tmp_path):
+    talhoes, estradas = _dados()
+    constroi_indice_estradas(estradas, caminho_saida=str(tmp_path / "indice.pkl"))
+    saida = classifica_estradas(talhoes, carrega_indice_estradas(str(tmp_path / "indice.pkl")))
+
+    # Menor distância até qualquer estrada, no fuso UTM de cada talhão
+    esperado = np.empty(len(talhoes))
+    epsg = epsg_utm_por_linha(talhoes).values
+    for fuso in np.unique(epsg):
+        no_fuso = epsg == fuso
+        estradas_utm = np.asarray(estradas.to_crs(int(fuso)).geometry.values)
+        for posicao, talhao in zip(np.flatnonzero(no_fuso), talhoes.to_crs(int(fuso)).geometry.values[no_fuso]):
+            esperado[posicao] = shapely.distance(talhao, estradas_utm).min()
+
+    perto = esperado <= DISTANCIA_MAXIMA_M
+    np.testing.assert_allclose(saida["paved_road_dist_m"].values[perto], esperado[perto], rtol=1e-6, atol=0.01)
+    classes = np.where(esperado <= DISTANCIA_TOQUE_M, "TOUCH_ROAD", np.where(perto, "10KM_ROAD", "NO"))
+    assert (saida["paved_road"].values == classes).all()
+
+
+
+def test_talhao_sem_geometria():
+    talhoes, estradas = _dados(n_talhoes=3)
+    talhoes.loc[1, "geometry"] = None
+    saida = classifica_estradas(talhoes, constroi_indice_estradas(estradas))
+    assert saida["paved_road"].tolist()[1] == "NULL"
+    assert np.isnan(saida["paved_road_dist_m"].values[1])
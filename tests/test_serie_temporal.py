@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+import rasterio as rio
+from rasterio.transform import from_origin
+from serie_temporal import estados_serie, anos_conversao, preenche_conversao
+
+# Códigos do MapBiomas: 3 formação florestal (nativa), 33 rio, lago e oceano (OTHER), 14 agropecuária, 15 pastagem, 27 não observado
+ANOS = np.array([2000, 2001, 2002, 2003])
+
+
+
+def _conversao(modas):
+    modas = np.array(modas)
+    conversao = anos_conversao(estados_serie("mapbiomas", modas, np.ones(modas.shape, dtype=bool)), ANOS)
+    return [None if pd.isna(ano) else int(ano) for ano in conversao]
+
+
+
+def test_conversao_passando_por_outra_classe():
+    # Nativa -> água -> pastagem: a conversão é o primeiro ano antrópico; nativa -> não observado -> pastagem também
+    assert _conversao([[3, 33, 33, 15], [3, 27, 15, 15], [33, 15, 15, 15], [3, 3, 33, 3]]) == [2003, 2002, None, None]
+
+
+
+def test_conversao_para_agropecuaria():
+    assert _conversao([[3, 3, 14, 14], [14, 3, 3, 3]]) == [2002, None]
+
+
+
+def test_preenche_conversao_no_raster(tmp_path):
+    caminho = str(tmp_path / "serie.tif")
+    bandas = np.zeros((4, 10, 20), dtype=np.uint8)
+    bandas[:, :, :10] = np.array([3, 33, 15, 15])[:, np.newaxis, np.newaxis]
+    bandas[:, :, 10:] = np.array([3, 3, 3, 14])[:, np.newaxis, np.newaxis]
+    with rio.open(caminho, "w", driver="GTiff", height=10, width=20, count=4, dtype="uint8", crs="EPSG:4326",
+                  transform=from_origin(0, 10, 1, 1)) as raster:
+        raster.write(bandas)
+
+    talhoes = gpd.GeoDataFrame({"id": [1, 2]}, geometry=[shapely.box(1, 1, 9, 9), shapely.box(11, 1, 19, 9)], crs="EPSG:4326")
+    assert preenche_conversao(talhoes, caminho, anos=2000)["conversion_year"].tolist() == [2002, 2003]
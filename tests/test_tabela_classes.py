@@ -0,0 +1,35 @@
+import pytest
+from tabela_classes import CLASSES_TAXONOMIA, CODIGO_DESCONHECIDO, taxonomia_de_nomes
+
+# Nomes dos rasters que os scripts originais não mapeavam e a classe harmonizada escolhida para cada um
+NOMES_ACRESCENTADOS = {
+    "floresta": "NATIVE_VEGETATION", "mangue": "NATIVE_VEGETATION", "floresta alagável (beta)": "NATIVE_VEGETATION",
+    "restinga arbórea": "NATIVE_VEGETATION", "formação natural não florestal": "NATIVE_VEGETATION",
+    "apicum": "NATIVE_VEGETATION", "afloramento rochoso": "NATIVE_VEGETATION", "restinga herbácea": "NATIVE_VEGETATION",
+    "outras formações não florestais": "NATIVE_VEGETATION",
+    "agricultura": "ANNUAL_CROPS", "algodão (beta)": "ANNUAL_CROPS", "outras lavouras temporárias": "ANNUAL_CROPS",
+    "áreas ágricolas sem mapeamento da cultura": "ANNUAL_CROPS",
+    "citrus": "PERENNIAL_CROPS", "dendê (beta)": "PERENNIAL_CROPS", "outras lavouras perenes": "PERENNIAL_CROPS",
+    "área não vegetada": "INFRASTRUCTURE", "área urbanizada": "INFRASTRUCTURE", "mineração": "INFRASTRUCTURE",
+    "agropecuária": "OTHER", "corpo d'água": "OTHER", "aquicultura": "OTHER",
+    "não observado": "NULL", "nodata": "NULL",
+}
+
+
+
+@pytest.mark.parametrize("nome, classe", NOMES_ACRESCENTADOS.items())
+def test_nomes_acrescentados(nome, classe):
+    assert taxonomia_de_nomes([nome]).tolist() == [CLASSES_TAXONOMIA.index(classe)]
+
+
+
+def test_mapeamentos_originais():
+    # Infraestrutura dos analistas numa classe só e as classes do verifica_landcover.py original
+    nomes = ["PUBLIC_INFRASTRUCTURE", "PRIVATE_INFRASTRUCTURE", "outros usos antrópicos", "area_agricola", "pastagem", None]
+    classes = ["INFRASTRUCTURE", "INFRASTRUCTURE", "OTHER", "PERENNIAL_CROPS", "PASTURE", "NULL"]
+    assert taxonomia_de_nomes(nomes).tolist() == [CLASSES_TAXONOMIA.index(classe) for classe in classes]
+
+
+
+def test_nome_fora_da_taxonomia():
+    assert taxonomia_de_nomes(["praia, duna e areal", "inexistente"]).tolist() == [CODIGO_DESCONHECIDO] * 2
@@ -0,0 +1,31 @@
+import geopandas as gpd
+import pandas as pd
+import shapely
+from escrita_resultados import caminho_saida
+from estado_incremental import hash_geometrias
+from verifica_valoracoes import predicoes_saidas
+
+
+
+def _saida(diretorio, origens):
+    geometrias = [shapely.box(i, 0, i + 1, 1) for i in range(3)]
+    gpd.GeoDataFrame({"id": [1, 2, 3], "paved_road": ["NO", "TOUCH_ROAD", "10KM_ROAD"], "origem_paved_road": origens,
+                      "hash_geometria": hash_geometrias(geometrias)},
+                     geometry=geometrias, crs="EPSG:4326").to_file(caminho_saida(str(diretorio), "mapbiomas"), driver="GPKG")
+    return pd.DataFrame({"hash_geometria": hash_geometrias(geometrias)}, index=["1", "2", "3"])
+
+
+
+def test_so_reaproveita_mesma_origem_e_geometria(tmp_path):
+    talhoes = _saida(tmp_path, ["osm|online", "osm|online", "indice|abc"])
+
+    # O talhão 2 mudou de geometria e o talhão 3 foi valorado com outra origem
+    talhoes.loc["2", "hash_geometria"] = "outra"
+    valores = predicoes_saidas(str(tmp_path), "paved_road", "estradas", {"impressao": "osm|online"}, talhoes)
+    assert valores.to_dict() == {"1": "NO"}
+
+
+
+def test_saida_sem_origem(tmp_path):
+    talhoes = _saida(tmp_path, ["osm|online"] * 3)
+    assert predicoes_saidas(str(tmp_path), "irrigation", "irrigacao", {"impressao": "x"}, talhoes) is None
@@ -0,0 +1,101 @@
+import numpy as np
+import shapely
+from instrumentacao import log, etapa, conta
+
+###########################################################################
+# Validação e reparo das geometrias dos talhões na entrada, de uma vez para o lote inteiro (shapely.make_valid vetorizado)
+# Cada talhão recebe um status: VALIDA (sem alteração), REPARADA (make_valid, mantidas só as partes poligonais)
+# ou INVALIDA (nula, vazia ou sem área depois do reparo; a geometria passa a ser nula).
+# As etapas seguintes partem de geometrias válidas: só precisam pular as nulas, sem checagens por linha
+
+COLUNA_STATUS = "status_geometria"
+
+STATUS_VALIDA = "VALIDA"
+STATUS_REPARADA = "REPARADA"
+STATUS_INVALIDA = "INVALIDA"
+
+# Tipos poligonais do shapely (get_type_id)
+_POLIGONO, _MULTIPOLIGONO, _COLECAO = 3, 6, 7
+
+
+
+# Partes poligonais de geometrias reparadas (make_valid pode devolver coleções com linhas e pontos)
+def partes_poligonais(geometrias):
+    """
+    geometrias: array de geometrias shapely
+    Retorna array com a geometria poligonal de cada entrada (None quando não sobra nenhuma área)
+    """
+
+    geometrias = np.asarray(geometrias, dtype=object).copy()
+    tipos = shapely.get_type_id(geometrias)
+
+    # Coleções: partes de até dois níveis (MultiPolygon dentro da coleção), mantidos só os polígonos
+    colecoes = np.flatnonzero(tipos == _COLECAO)
+    if len(colecoes) > 0:
+        partes, origem = shapely.get_parts(geometrias[colecoes], return_index=True)
+        partes, origem_partes = shapely.get_parts(partes, return_index=True)
+        origem = origem[origem_partes]
+        poligonos = shapely.get_type_id(partes) == _POLIGONO
+        geometrias[colecoes] = None
+        if poligonos.any():
+            com_area, indices = np.unique(origem[poligonos], return_inverse=True)
+            geometrias[colecoes[com_area]] = shapely.multipolygons(partes[poligonos], indices=indices)
+
+    # Linhas e pontos não têm área
+    nao_poligonais = ~np.isin(shapely.get_type_id(geometrias), [_POLIGONO, _MULTIPOLIGONO])
+    geometrias[nao_poligonais | shapely.is_empty(geometrias)] = None
+    return geometrias
+
+
+
+# Valida e repara um array de geometrias
+def valida_geometrias(geometrias):
+    """
+    geometrias: array de geometrias shapely (nulas são aceitas)
+    Retorna (array de geometrias válidas ou nulas, array com o status de cada uma)
+    """
+
+    geometrias = np.asarray(geometrias, dtype=object)
+    status = np.full(len(geometrias), STATUS_VALIDA, dtype=object)
+    ausentes = shapely.is_missing(geometrias) | shapely.is_empty(geometrias)
+    invalidas = np.flatnonzero(~ausentes & ~shapely.is_valid(geometrias))
+
+    saida = geometrias.copy()
+    saida[ausentes] = None
+    status[ausentes] = STATUS_INVALIDA
+    if len(invalidas) > 0:
+        reparadas = partes_poligonais(shapely.make_valid(geometrias[invalidas]))
+        saida[invalidas] = reparadas
+        status[invalidas] = np.where(shapely.is_missing(reparadas), STATUS_INVALIDA, STATUS_REPARADA)
+    return saida, status
+
+
+
+# Etapa de ingestão: valida e repara as geometrias de todos os talhões e marca o status de cada um
+def valida_talhoes(gdf_in, coluna_status=COLUNA_STATUS):
+    """
+    gdf_in: GeoDataFrame com os talhões
+    coluna_status: coluna que recebe o status da geometria (string)
+    Retorna uma cópia do gdf com as geometrias reparadas (nulas quando não têm reparo) e a coluna de status
+    """
+
+    with etapa("validacao_geometrias", talhoes=len(gdf_in)):
+        geometrias, status = valida_geometrias(gdf_in.geometry.values)
+        gdf_out = gdf_in.copy()
+        gdf_out[gdf_out.geometry.name] = geometrias
+        gdf_out[coluna_status] = status
+
+    reparadas = int(np.count_nonzero(status == STATUS_REPARADA))
+    sem_reparo = int(np.count_nonzero(status == STATUS_INVALIDA))
+    conta("geometrias_reparadas", reparadas)
+    conta("geometrias_invalidas", sem_reparo)
+    if reparadas or sem_reparo:
+        log(f"Geometrias: {reparadas} reparadas, {sem_reparo} nulas ou sem área (ficam sem geometria)", "AVISO")
+    return gdf_out
+
+
+
+# Máscara dos talhões com geometria (após valida_talhoes, as inválidas sem reparo ficam nulas)
+def tem_geometria(geometrias):
+    geometrias = np.asarray(geometrias, dtype=object)
+    return ~(shapely.is_missing(geometrias) | shapely.is_empty(geometrias))
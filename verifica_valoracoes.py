@@ -0,0 +1,383 @@
+import os
+import sqlite3
+import argparse
+import fiona
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from auto_landcover_tools import preenche_atributos_multiraster, busca_estradas_lote
+from indice_estradas import indice_estradas_padrao, carrega_indice_estradas, classifica_estradas, CAMINHO_INDICE_ESTRADAS
+from cache_histogramas import configura_cache_histogramas, estatisticas_cache_histogramas, DIRETORIO_CACHE_HISTOGRAMAS
+from escrita_resultados import caminho_saida
+from estado_incremental import hash_geometrias
+from agendador_areas import itera_areas
+from validacao_geometrias import valida_talhoes
+from fontes_valoracao import RASTERS_LULC, fontes_processamento, origem_raster, origem_estradas
+from avaliacao import avalia_fontes, imprime_avaliacao, ATRIBUTOS
+from instrumentacao import configura_instrumentacao, log, etapa
+
+###########################################################################
+# Avaliação das valorações contra os analistas (fields_valuation_analistas.geojson) com seleção de fontes e atributos
+# As previsões de cada combinação (atributo, fonte) vêm, nesta ordem, do cache de previsões (mesma entrada e mesma
+# geometria do talhão), das saídas do processa_landcover (mesma origem gravada na saída e mesma geometria) ou são
+# calculadas sobre os talhões dos analistas.
+# Só as combinações e os talhões que faltam são calculados: trocar o raster de irrigação não refaz a busca de estradas.
+
+# Classificação dos analistas
+CAMINHO_ANALISTAS = r"assets\analise_dados\fields_valuation_analistas.geojson"
+
+# Diretório padrão do cache de previsões
+DIRETORIO_CACHE_PREDICOES = "cache_predicoes"
+
+# Fontes (nome na avaliação) dos atributos que não dependem da fonte de land cover
+FONTE_IRRIGACAO = "irrigacao"
+FONTE_ESTRADAS = "estradas"
+
+# Rasters avaliados por padrão quando diferem dos do processamento: a irrigação é avaliada, como no antigo
+# verifica_irrigacao.py, contra o raster final de 2022 (o processamento usa irrigacao_ana_mapbiomas.tif; para avaliar
+# esse raster, e reaproveitar a irrigation das saídas, use --raster irrigacao)
+RASTERS_AVALIACAO = {FONTE_IRRIGACAO: r"assets\irrigacao\processado\irrigacao_ana_mapbiomas_22_final.tif"}
+
+# Lado, em graus, das células que agrupam os talhões quando não há interest_area_id
+TAMANHO_CELULA = 0.25
+
+
+
+##### Combinações e entradas
+
+# Combinações (atributo, fonte) avaliadas
+def combinacoes(fontes, atributos):
+    """
+    fontes: fontes de land cover (mapbiomas, simfaz, agrosatelite)
+    atributos: atributos avaliados (class, irrigation, paved_road)
+    """
+
+    lista = []
+    for atributo in atributos:
+        if atributo == "class":
+            lista += [("class", fonte) for fonte in fontes]
+        elif atributo == "irrigation":
+            lista.append(("irrigation", FONTE_IRRIGACAO))
+        elif atributo == "paved_road":
+            lista.append(("paved_road", FONTE_ESTRADAS))
+        else:
+            raise ValueError(f"Atributo sem valoração conhecida: {atributo}")
+    return lista
+
+
+
+# Entrada usada para prever uma combinação e a sua impressão (chave do cache de previsões)
+def entrada_combinacao(atributo, fonte, rasters=None, indice_estradas=None, diretorio_cache_osm=None):
+    """
+    atributo, fonte: combinação avaliada
+    rasters (opcional): dicionário fonte -> caminho do raster, substituindo os rasters padrão (RASTERS_AVALIACAO e os do processamento)
+    indice_estradas (opcional): caminho do índice de estradas (indice_estradas.py), construído a partir do PostGIS se ainda
+                                não existir; sem ele, as estradas vêm do OSM
+    diretorio_cache_osm (opcional): cache local de estradas do OSM (ver cache_estradas.py)
+    Retorna um dicionário com tipo (raster ou estradas), caminho e impressão (a mesma origem gravada nas saídas do processa_landcover)
+    """
+
+    if atributo == "paved_road":
+        if indice_estradas is not None:
+            return {"tipo": "estradas", "caminho": indice_estradas, "impressao": origem_estradas(indice_estradas_padrao(indice_estradas))}
+        return {"tipo": "estradas", "caminho": None, "impressao": origem_estradas(None, diretorio_cache_osm)}
+
+    caminho = (rasters or {}).get(fonte, RASTERS_AVALIACAO.get(fonte, fontes_processamento()[fonte]))
+    return {"tipo": "raster", "caminho": caminho, "origem_dict": fonte, "impressao": origem_raster(caminho, fonte)}
+
+
+
+##### Cache de previsões (banco SQLite local)
+
+# Abre (ou cria) o cache de previsões
+def abre_cache_predicoes(diretorio=DIRETORIO_CACHE_PREDICOES):
+    os.makedirs(diretorio, exist_ok=True)
+    cache = sqlite3.connect(os.path.join(diretorio, "predicoes.sqlite"))
+    cache.execute("""
+                  CREATE TABLE IF NOT EXISTS predicoes (
+                      atributo TEXT,
+                      fonte TEXT,
+                      impressao TEXT,
+                      id TEXT,
+                      hash_geometria TEXT,
+                      valor TEXT,
+                      PRIMARY KEY (atributo, fonte, impressao, id))
+                  """)
+    cache.commit()
+    return cache
+
+
+
+# Previsões guardadas de uma combinação para os talhões com a mesma geometria
+def busca_predicoes(cache, atributo, fonte, impressao, talhoes):
+    """
+    cache: retorno de abre_cache_predicoes
+    atributo, fonte, impressao: combinação e impressão da entrada (entrada_combinacao)
+    talhoes: DataFrame indexado pelo id (em texto) com a coluna hash_geometria
+    Retorna pd.Series id -> valor só com os talhões encontrados (valores nulos também são previsões)
+    """
+
+    registros = cache.execute("SELECT id, hash_geometria, valor FROM predicoes WHERE atributo = ? AND fonte = ? AND impressao = ?",
+                              (atributo, fonte, impressao)).fetchall()
+    guardadas = pd.DataFrame(registros, columns=["id", "hash_geometria", "valor"], dtype=object).set_index("id")
+    guardadas = guardadas.reindex(talhoes.index)
+    validas = (guardadas["hash_geometria"] == talhoes["hash_geometria"]).values
+    return guardadas["valor"][validas].astype(object).where(guardadas["valor"][validas].notna(), None)
+
+
+
+# Guarda as previsões calculadas de uma combinação
+def grava_predicoes(cache, atributo, fonte, impressao, talhoes, valores):
+    """
+    talhoes: DataFrame indexado pelo id (em texto) com a coluna hash_geometria
+    valores: pd.Series id -> valor previsto (ids de talhoes)
+    """
+
+    hashes = talhoes["hash_geometria"].reindex(valores.index)
+    cache.executemany("INSERT OR REPLACE INTO predicoes VALUES (?, ?, ?, ?, ?, ?)",
+                      [(atributo, fonte, impressao, id_talhao, hash_geometria, None if valor is None or pd.isna(valor) else str(valor))
+                       for id_talhao, hash_geometria, valor in zip(valores.index, hashes.values, valores.values)])
+    cache.commit()
+
+
+
+##### Previsões das saídas do processa_landcover
+
+# Valores de um atributo nas saídas do processa_landcover, dos talhões valorados com a mesma entrada e a mesma geometria
+def predicoes_saidas(diretorio_saidas, atributo, fonte, entrada, talhoes):
+    """
+    diretorio_saidas: diretório dos arquivos saida_script_{fonte}.gpkg (string)
+    atributo, fonte: combinação avaliada
+    entrada: retorno de entrada_combinacao
+    talhoes: DataFrame indexado pelo id (em texto) com a coluna hash_geometria
+    Retorna pd.Series id -> valor (None se não houver saída com a origem gravada)
+    OBS: irrigation e paved_road são iguais em todas as saídas; vale a primeira que existir
+    """
+
+    if diretorio_saidas is None:
+        return None
+    fontes_saida = [fonte] if atributo == "class" else list(RASTERS_LULC)
+    for fonte_saida in fontes_saida:
+        caminho = caminho_saida(diretorio_saidas, fonte_saida)
+        if not os.path.exists(caminho):
+            continue
+
+        # Só valem as linhas geradas com a mesma entrada (origem gravada pelo processa_landcover)
+        camada = fiona.listlayers(caminho)[0]
+        conn = sqlite3.connect(caminho)
+        try:
+            colunas = [coluna[1] for coluna in conn.execute(f'PRAGMA table_info("{camada}")')]
+            if f"origem_{atributo}" not in colunas or "hash_geometria" not in colunas:
+                log(f"Saída {caminho} sem a origem de {atributo}; {atributo} será recalculado", "AVISO")
+                return None
+            registros = conn.execute(f'SELECT "id", "{atributo}", "hash_geometria" FROM "{camada}" WHERE "origem_{atributo}" = ?',
+                                     (entrada["impressao"],)).fetchall()
+        finally:
+            conn.close()
+
+        # Talhões cuja geometria mudou desde o processamento também não valem
+        valores = pd.DataFrame(registros, columns=["id", atributo, "hash_geometria"], dtype=object)
+        valores["id"] = valores["id"].astype(str)
+        valores = valores.drop_duplicates("id", keep="last").set_index("id")
+        valores = valores[(valores["hash_geometria"] == talhoes["hash_geometria"].reindex(valores.index)).values][atributo]
+        return valores.astype(object).where(valores.notna(), None)
+    return None
+
+
+
+##### Cálculo das previsões que faltam
+
+# Coluna que agrupa os talhões (áreas de interesse ou, sem elas, células de TAMANHO_CELULA graus)
+def coluna_grupos(gdf_in):
+    if "interest_area_id" in gdf_in.columns and gdf_in["interest_area_id"].notna().all():
+        return "interest_area_id"
+    centroides = gdf_in.geometry.to_crs("EPSG:4326").centroid
+    gdf_in["celula"] = (np.floor(centroides.x / TAMANHO_CELULA).astype(np.int64).astype(str) + "_" +
+                        np.floor(centroides.y / TAMANHO_CELULA).astype(np.int64).astype(str))
+    return "celula"
+
+
+
+# Calcula as combinações de raster em uma única passada por grupo (talhões rasterizados uma vez para todos os rasters)
+def calcula_rasters(gdf_in, entradas, coluna_area):
+    """
+    gdf_in: GeoDataFrame (wgs84) com id (em texto) e os talhões a calcular
+    entradas: dicionário (atributo, fonte) -> entrada_combinacao dos rasters
+    coluna_area: coluna que agrupa os talhões (coluna_grupos)
+    Retorna dicionário (atributo, fonte) -> pd.Series id -> valor
+    """
+
+    lista_rasters = [{"caminho": entrada["caminho"], "origem_dict": entrada["origem_dict"], "coluna": f"{atributo}__{fonte}",
+                      "coluna_classes_possiveis": None, "coluna_codigo": None}
+                     for (atributo, fonte), entrada in entradas.items()]
+    resultados = []
+    for grupo, talhoes in itera_areas(gdf_in[["id", coluna_area, "geometry"]], coluna_area):
+        log(f"Calculando rasters do grupo {grupo} ({len(talhoes)} talhões)", "DEBUG")
+        resultados.append(preenche_atributos_multiraster(talhoes, lista_rasters))
+    resultados = pd.concat(resultados, ignore_index=True).set_index("id")
+    return {(atributo, fonte): resultados[f"{atributo}__{fonte}"] for atributo, fonte in entradas}
+
+
+
+# Calcula paved_road pelo índice de estradas (por talhão) ou pelo OSM (por área, como no processa_landcover)
+def calcula_estradas(gdf_in, entrada, coluna_area, diretorio_cache_osm=None, offline=False):
+    """
+    gdf_in: GeoDataFrame (wgs84) com id (em texto) e os talhões a calcular (com o OSM, áreas inteiras)
+    entrada: entrada_combinacao de paved_road
+    coluna_area: coluna que agrupa os talhões (coluna_grupos)
+    Retorna pd.Series id -> valor (talhões de clusters com erro ficam de fora)
+    """
+
+    if entrada["caminho"] is not None:
+        return classifica_estradas(gdf_in[["id", "geometry"]], carrega_indice_estradas(entrada["caminho"])).set_index("id")["paved_road"]
+
+    paved_road = busca_estradas_lote(gdf_in, coluna_area, diretorio_cache=diretorio_cache_osm, offline=offline)
+    valores = gdf_in[coluna_area].map(paved_road)
+    valores.index = gdf_in["id"].values
+    return valores[gdf_in[coluna_area].isin(paved_road.index).values]
+
+
+
+##### Avaliação
+
+# Previsões de cada combinação para os talhões dos analistas (reaproveitadas ou calculadas)
+def predicoes_analistas(analistas, fontes, atributos=ATRIBUTOS, rasters=None, indice_estradas=None, diretorio_cache_osm=None, offline=False,
+                        diretorio_saidas="saidas", diretorio_cache=DIRETORIO_CACHE_PREDICOES, recalcula=False):
+    """
+    analistas: GeoDataFrame dos analistas (id, atributos e geometria)
+    fontes, atributos: seleção avaliada (ver combinacoes)
+    rasters, indice_estradas, diretorio_cache_osm: entradas (ver entrada_combinacao)
+    offline: se True, usa apenas o cache local de estradas, sem acessar o OSM (booleano)
+    diretorio_saidas (opcional): saídas do processa_landcover reaproveitadas (string; None não usa)
+    diretorio_cache: diretório do cache de previsões (string)
+    recalcula: se True, ignora o cache e as saídas e calcula tudo de novo (booleano)
+    Retorna dicionário nome da fonte -> DataFrame com id e o(s) atributo(s) previsto(s), pronto para avalia_fontes
+    """
+
+    analistas = valida_talhoes(analistas.to_crs("EPSG:4326"))
+    analistas["id"] = analistas["id"].astype(str)
+    analistas = analistas[~analistas["id"].duplicated(keep="last")].reset_index(drop=True)
+    talhoes = pd.DataFrame({"hash_geometria": hash_geometrias(analistas.geometry)}, index=analistas["id"].values)
+    cache = abre_cache_predicoes(diretorio_cache)
+
+    # Previsões já disponíveis e talhões que faltam em cada combinação
+    predicoes, entradas, faltam = {}, {}, {}
+    for atributo, fonte in combinacoes(fontes, atributos):
+        entrada = entrada_combinacao(atributo, fonte, rasters, indice_estradas, diretorio_cache_osm)
+        valores = pd.Series(dtype=object)
+        n_cache = n_saidas = 0
+        if not recalcula:
+            valores = busca_predicoes(cache, atributo, fonte, entrada["impressao"], talhoes)
+            n_cache = len(valores)
+            saidas = predicoes_saidas(diretorio_saidas, atributo, fonte, entrada, talhoes)
+            if saidas is not None:
+                saidas = saidas[saidas.index.isin(talhoes.index) & ~saidas.index.isin(valores.index)]
+                valores = pd.concat([valores, saidas])
+                n_saidas = len(saidas)
+        predicoes[(atributo, fonte)] = valores
+        entradas[(atributo, fonte)] = entrada
+        faltam[(atributo, fonte)] = ~talhoes.index.isin(valores.index)
+        log(f"{atributo} - {fonte}: {n_cache} talhões do cache, {n_saidas} das saídas, {int(faltam[(atributo, fonte)].sum())} a calcular")
+
+    coluna_area = coluna_grupos(analistas)
+
+    # Rasters: todas as combinações que faltam em uma única passada (cada talhão recebe as que lhe faltam)
+    rasters_faltam = {chave: entrada for chave, entrada in entradas.items() if entrada["tipo"] == "raster" and faltam[chave].any()}
+    if rasters_faltam:
+        configura_cache_histogramas(DIRETORIO_CACHE_HISTOGRAMAS)
+        estatisticas_cache_histogramas(zerar=True)
+        algum = np.logical_or.reduce([faltam[chave] for chave in rasters_faltam])
+        with etapa("previsoes_raster", talhoes=int(algum.sum())):
+            calculadas = calcula_rasters(analistas[algum], rasters_faltam, coluna_area)
+        log(f"Estatísticas do cache de histogramas: {estatisticas_cache_histogramas()}")
+        for chave, valores in calculadas.items():
+            valores = valores[valores.index.isin(talhoes.index[faltam[chave]])]
+            grava_predicoes(cache, *chave, entradas[chave]["impressao"], talhoes, valores)
+            predicoes[chave] = pd.concat([predicoes[chave], valores])
+
+    # Estradas: com o OSM, a classificação é por área, então as áreas com algum talhão faltando são recalculadas inteiras
+    chave = ("paved_road", FONTE_ESTRADAS)
+    if chave in entradas and faltam[chave].any():
+        a_calcular = faltam[chave]
+        if entradas[chave]["caminho"] is None:
+            a_calcular = analistas[coluna_area].isin(analistas[coluna_area][faltam[chave]]).values
+        with etapa("previsoes_estradas", talhoes=int(a_calcular.sum())):
+            valores = calcula_estradas(analistas[a_calcular], entradas[chave], coluna_area, diretorio_cache_osm, offline)
+        grava_predicoes(cache, *chave, entradas[chave]["impressao"], talhoes, valores)
+        predicoes[chave] = pd.concat([predicoes[chave][~predicoes[chave].index.isin(valores.index)], valores])
+
+    cache.close()
+
+    # Uma tabela por fonte, com os atributos previstos por ela
+    tabelas = {}
+    for (atributo, fonte), valores in predicoes.items():
+        tabela = tabelas.setdefault(fonte, pd.DataFrame({"id": analistas["id"].values}))
+        tabela[atributo] = valores.reindex(tabela["id"]).values
+    return tabelas
+
+
+
+# Avalia a seleção de fontes e atributos contra os analistas
+def avalia_valoracoes(fontes, atributos=ATRIBUTOS, caminho_analistas=CAMINHO_ANALISTAS, desconsidera_nulos=True, **kwargs):
+    """
+    fontes, atributos: seleção avaliada (ver combinacoes)
+    caminho_analistas: arquivo com a classificação dos analistas (string)
+    desconsidera_nulos: se True, ignora os talhões que o analista deixou NULL no atributo (booleano)
+    kwargs: opções de predicoes_analistas (rasters, indice_estradas, diretorio_saidas, recalcula, ...)
+    Retorna os DataFrames de avaliacao.avalia_fontes
+    """
+
+    analistas = gpd.read_file(caminho_analistas)
+    previsoes = predicoes_analistas(analistas, fontes, atributos, **kwargs)
+    analistas["id"] = analistas["id"].astype(str)
+    return avalia_fontes(analistas, previsoes, atributos, desconsidera_nulos)
+
+
+
+# Grava as tabelas da avaliação em CSV (resumo, por classe e uma matriz de confusão por atributo e fonte)
+def exporta_avaliacao(avaliacao, diretorio):
+    os.makedirs(diretorio, exist_ok=True)
+    avaliacao["resumo"].to_csv(os.path.join(diretorio, "resumo.csv"))
+    avaliacao["por_classe"].to_csv(os.path.join(diretorio, "por_classe.csv"))
+    for (atributo, fonte), matriz in avaliacao["matrizes"].items():
+        matriz.to_csv(os.path.join(diretorio, f"matriz_{atributo}_{fonte}.csv"))
+
+
+
+# Linha de comando (python verifica_valoracoes.py ou autolandcover evaluate)
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Avalia as valorações contra a classificação dos analistas, reaproveitando as previsões já calculadas")
+    parser.add_argument("--fontes", nargs="+", default=list(RASTERS_LULC), help="fontes de land cover avaliadas em class")
+    parser.add_argument("--atributos", nargs="+", default=ATRIBUTOS, choices=ATRIBUTOS, help="atributos avaliados")
+    parser.add_argument("--analistas", default=CAMINHO_ANALISTAS, help="arquivo com a classificação dos analistas")
+    parser.add_argument("--raster", nargs=2, action="append", metavar=("FONTE", "ARQUIVO"),
+                        help="raster usado no lugar do padrão (fonte: irrigacao, mapbiomas, simfaz ou agrosatelite; "
+                             "o padrão da irrigação é o raster final de 2022, não o do processamento)")
+    parser.add_argument("--indice-estradas", nargs="?", const=CAMINHO_INDICE_ESTRADAS,
+                        help="índice de estradas usado no lugar do OSM (sem arquivo, o índice padrão; se não existir, é construído a partir "
+                             "do PostGIS, como em autolandcover build-road-index)")
+    parser.add_argument("--cache-osm", help="diretório do cache local de estradas do OSM")
+    parser.add_argument("--offline", action="store_true", help="usa apenas o cache local de estradas, sem acessar o OSM")
+    parser.add_argument("--saidas", default="saidas", help="diretório das saídas do processa_landcover reaproveitadas")
+    parser.add_argument("--sem-saidas", action="store_true", help="não reaproveita as saídas do processa_landcover")
+    parser.add_argument("--cache", default=DIRETORIO_CACHE_PREDICOES, help="diretório do cache de previsões")
+    parser.add_argument("--recalcula", action="store_true", help="ignora o cache e as saídas e calcula todas as previsões")
+    parser.add_argument("--inclui-nulos", action="store_true", help="avalia também os talhões que o analista deixou NULL")
+    parser.add_argument("--exporta", help="diretório que recebe as tabelas da avaliação em CSV")
+    parser.add_argument("--log", default="INFO", help="nível mínimo das mensagens (DEBUG, INFO, AVISO ou ERRO)")
+    argumentos = parser.parse_args(argv)
+
+    configura_instrumentacao(argumentos.log)
+    avaliacao = avalia_valoracoes(argumentos.fontes, argumentos.atributos, caminho_analistas=argumentos.analistas,
+                                  desconsidera_nulos=not argumentos.inclui_nulos, rasters=dict(argumentos.raster or []),
+                                  indice_estradas=argumentos.indice_estradas, diretorio_cache_osm=argumentos.cache_osm, offline=argumentos.offline,
+                                  diretorio_saidas=None if argumentos.sem_saidas else argumentos.saidas,
+                                  diretorio_cache=argumentos.cache, recalcula=argumentos.recalcula)
+    imprime_avaliacao(avaliacao)
+    if argumentos.exporta:
+        exporta_avaliacao(avaliacao, argumentos.exporta)
+
+
+
+if __name__ == "__main__":
+    main()